@@ -1,5 +1,6 @@
 import extraction.summarisation_functions as summ_func
 import pandas as pd
+from run_evaluation import run_evaluation, RESULTS_DIR
 from extraction.utils.compare_sets import compare_string_sets, compare_string_sets_sentence_transformers
 import math
 import csv
@@ -96,16 +97,9 @@ def evaluate_location_types(mp_df_full, vp_df_full, misper_id):
     result['try_count'] = try_count
     return result 
 
-def run_eval_location_types(mp_df_full,vp_df_full, misperids):
-    results = []
-    for misper_id in misperids:
-        out_dict = evaluate_location_types(mp_df_full, vp_df_full, misper_id)
-        out_dict['misperid'] = misper_id
-        results.append(out_dict)
-        df = pd.DataFrame(results)
-        df.to_pickle("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/location_types.pkl")
-        df.to_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/location_types.csv")
-    return results
+def run_eval_location_types(mp_df_full,vp_df_full, misperids, workers=1, devices=None):
+    # checkpoints every case, so a rerun after a crash continues where it stopped
+    return run_evaluation(evaluate_location_types, mp_df_full, vp_df_full, misperids, f"{RESULTS_DIR}/location_types", workers=workers, devices=devices)
 
 
 
@@ -200,16 +194,9 @@ def evaluate_locations(mp_df_full, vp_df_full, misper_id):
     result['summ_set'] = location_summ_set
     return result 
 
-def run_eval_locations(mp_df_full,vp_df_full, misperids):
-    results = []
-    for misper_id in misperids:
-        out_dict = evaluate_locations(mp_df_full, vp_df_full, misper_id)
-        out_dict['misperid'] = misper_id
-        results.append(out_dict)
-        df = pd.DataFrame(results)
-        df.to_pickle("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/locations.pkl")
-        df.to_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/locations.csv")
-    return results
+def run_eval_locations(mp_df_full,vp_df_full, misperids, workers=1, devices=None):
+    # checkpoints every case, so a rerun after a crash continues where it stopped
+    return run_evaluation(evaluate_locations, mp_df_full, vp_df_full, misperids, f"{RESULTS_DIR}/locations", workers=workers, devices=devices)
 
 
 
@@ -217,6 +204,8 @@ if __name__=="__main__":
     # print(os.getcwd())
     import torch
     torch.cuda.empty_cache()
+    from extraction.utils.ask_llama31 import warm_up_llama, shutdown_llama
+    warm_up_llama()
     mp_df_full = pd.read_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/DATA/fake/fake_mp_data.csv")
     vp_df_full = pd.read_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/DATA/fake/fake_vp_data.csv")
     vp_df_full.columns = vp_df_full.columns.str.lower()
@@ -233,4 +222,5 @@ if __name__=="__main__":
     # df = pd.DataFrame(result)
     # df.to_pickle("RESULTS/locations.pkl")
     # df.to_csv("RESULTS/locations.csv")
-    
\ No newline at end of file
+    
+    shutdown_llama()
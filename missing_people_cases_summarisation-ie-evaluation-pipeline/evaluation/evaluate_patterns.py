@@ -1,5 +1,6 @@
 import extraction.summarisation_functions as summ_func
 import pandas as pd
+from run_evaluation import run_evaluation, RESULTS_DIR
 from extraction.utils.compare_sets import compare_string_sets_patterns_types
 import math
 import csv
@@ -173,21 +174,16 @@ def evaluate_pattern_types(mp_df_full, vp_df_full, misper_id):
     result['max_cos_to_sentence_tuples'] = max_cos_to_sentence_tuples
     return result 
 
-def run_eval_pattern_types(mp_df_full,vp_df_full, misperids):
-    results = []
-    for misper_id in misperids:
-        out_dict = evaluate_pattern_types(mp_df_full, vp_df_full, misper_id)
-        out_dict['misperid'] = misper_id
-        results.append(out_dict)
-        df = pd.DataFrame(results)
-        df.to_pickle("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/patterns.pkl")
-        df.to_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/patterns.csv")
-    return results
+def run_eval_pattern_types(mp_df_full,vp_df_full, misperids, workers=1, devices=None):
+    # checkpoints every case, so a rerun after a crash continues where it stopped
+    return run_evaluation(evaluate_pattern_types, mp_df_full, vp_df_full, misperids, f"{RESULTS_DIR}/patterns", workers=workers, devices=devices)
 
 if __name__=="__main__":
     # print(os.getcwd())
     import torch
     torch.cuda.empty_cache()
+    from extraction.utils.ask_llama31 import warm_up_llama, shutdown_llama
+    warm_up_llama()
     mp_df_full = pd.read_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/DATA/fake/fake_mp_data.csv")
     vp_df_full = pd.read_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/DATA/fake/fake_vp_data.csv")
     vp_df_full.columns = vp_df_full.columns.str.lower()
@@ -206,4 +202,5 @@ if __name__=="__main__":
     df = pd.DataFrame(result)
     df.to_pickle("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/patterns.pkl")
     df.to_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/patterns.csv")
-    
\ No newline at end of file
+    
+    shutdown_llama()
@@ -1,5 +1,6 @@
 import extraction.summarisation_functions as summ_func
 import pandas as pd
+from run_evaluation import run_evaluation, RESULTS_DIR
 from extraction.utils.compare_sets import compare_string_sets_advanced_pattern_types
 import math
 import csv
@@ -107,21 +108,16 @@ def evaluate_patterns_advanced(mp_df_full, vp_df_full, misper_id):
     result['len_recognized_patterns'] = len(explanation_to_quote.keys())
     return result 
 
-def run_eval_patternadvanced_types(mp_df_full,vp_df_full, misperids):
-    results = []
-    for misper_id in misperids:
-        out_dict = evaluate_patterns_advanced(mp_df_full, vp_df_full, misper_id)
-        out_dict['misperid'] = misper_id
-        results.append(out_dict)
-        df = pd.DataFrame(results)
-        df.to_pickle("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/patterns_advanced.pkl")
-        df.to_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/patterns_advanced.csv")
-    return results
+def run_eval_patternadvanced_types(mp_df_full,vp_df_full, misperids, workers=1, devices=None):
+    # checkpoints every case, so a rerun after a crash continues where it stopped
+    return run_evaluation(evaluate_patterns_advanced, mp_df_full, vp_df_full, misperids, f"{RESULTS_DIR}/patterns_advanced", workers=workers, devices=devices)
 
 if __name__=="__main__":
     # print(os.getcwd())
     import torch
     torch.cuda.empty_cache()
+    from extraction.utils.ask_llama31 import warm_up_llama, shutdown_llama
+    warm_up_llama()
     mp_df_full = pd.read_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/DATA/fake/fake_mp_data.csv")
     vp_df_full = pd.read_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/DATA/fake/fake_vp_data.csv")
     vp_df_full.columns = vp_df_full.columns.str.lower()
@@ -139,4 +135,5 @@ if __name__=="__main__":
     df = pd.DataFrame(result)
     df.to_pickle("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/patterns_advanced.pkl")
     df.to_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/patterns_advanced.csv")
-    
\ No newline at end of file
+    
+    shutdown_llama()
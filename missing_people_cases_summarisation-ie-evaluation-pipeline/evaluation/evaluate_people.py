@@ -1,5 +1,6 @@
 import extraction.summarisation_functions as summ_func
 import pandas as pd
+from run_evaluation import run_evaluation, RESULTS_DIR
 from extraction.utils.compare_sets import compare_string_sets, compare_string_sets_people
 import math
 
@@ -98,21 +99,16 @@ def evaluate_people(mp_df_full, vp_df_full, misper_id):
     return result
     
     
-def run_eval_people(mp_df_full,vp_df_full, misperids):
-    results = []
-    for misper_id in misperids:
-        out_dict = evaluate_people(mp_df_full, vp_df_full, misper_id)
-        out_dict['misperid'] = misper_id
-        results.append(out_dict)
-        df = pd.DataFrame(results)
-        df.to_pickle("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/people.pkl")
-        df.to_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/people.csv")
-    return results
+def run_eval_people(mp_df_full,vp_df_full, misperids, workers=1, devices=None):
+    # checkpoints every case, so a rerun after a crash continues where it stopped
+    return run_evaluation(evaluate_people, mp_df_full, vp_df_full, misperids, f"{RESULTS_DIR}/people", workers=workers, devices=devices)
 
 if __name__=="__main__":
     # print(os.getcwd())
     import torch
     torch.cuda.empty_cache()
+    from extraction.utils.ask_llama31 import warm_up_llama, shutdown_llama
+    warm_up_llama()
     mp_df_full = pd.read_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/DATA/fake/fake_mp_data.csv")
     vp_df_full = pd.read_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/DATA/fake/fake_vp_data.csv")
     vp_df_full.columns = vp_df_full.columns.str.lower()
@@ -129,4 +125,5 @@ if __name__=="__main__":
     df = pd.DataFrame(result)
     df.to_pickle("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/people.pkl")
     df.to_csv("/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS/people.csv")
-    
\ No newline at end of file
+    
+    shutdown_llama()
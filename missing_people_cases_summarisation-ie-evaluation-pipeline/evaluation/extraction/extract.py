@@ -2,7 +2,7 @@ import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.ask_llama31 import ask_open_llama
+from utils.ask_llama31 import ask_open_llama, ask_open_llama_batch, warm_up_llama, shutdown_llama
 # from utils.ask_open_ai import ask_open_ai
 import pandas as pd
 from utils.mappings import mp_column_contexts, twenty_five_mp_questions, vp_column_contexts
@@ -28,7 +28,32 @@ def split_output_people (text):
             people_desc = items
     return people_names_relations, people_desc
 
-def llama31instruct_summary_template_with_reportid(textual_field):
+def ask_batch_with_retries(ask_batch, textual_fields, parse_output, tries=5):
+    """
+    Ask the model about all textual fields at once and re-submit only the
+    fields whose output could not be parsed.
+    
+    Returns:
+    - list: (raw output, parsed output) for every textual field, in order
+    """
+    results = [None] * len(textual_fields)
+    pending = list(range(len(textual_fields)))
+    for i in range(tries):
+        outputs = ask_batch([textual_fields[j] for j in pending])
+        failed = []
+        for j, output in zip(pending, outputs):
+            try:
+                results[j] = (output, parse_output(output))
+            except:
+                failed.append(j)
+        pending = failed
+        if not pending:
+            break
+    if pending:
+        raise ValueError(f"couldn't parse for {tries} iterations")
+    return results
+
+def llama31instruct_summary_template_with_reportid_prompt(textual_field):
     system_prompt = '''You are a helpful assistant whose job is to extract entities from text.'''
     
     
@@ -61,12 +86,25 @@ def llama31instruct_summary_template_with_reportid(textual_field):
     Here is the text:
     {textual_field}
     '''
+    return prompt, system_prompt
+
+
+def llama31instruct_summary_template_with_reportid(textual_field):
+    prompt, system_prompt = llama31instruct_summary_template_with_reportid_prompt(textual_field)
     response = ask_open_llama(prompt=prompt, maxtokens=1000, system_prompt=system_prompt)
     print(response)
     return response
 
 
-def llama31instruct_narrative_of_people(entity_lists):
+def llama31instruct_summary_template_with_reportid_batch(textual_fields):
+    prompts = [llama31instruct_summary_template_with_reportid_prompt(t)[0] for t in textual_fields]
+    _, system_prompt = llama31instruct_summary_template_with_reportid_prompt('')
+    responses = ask_open_llama_batch(prompts=prompts, maxtokens=1000, system_prompt=system_prompt)
+    print(responses)
+    return responses
+
+
+def llama31instruct_narrative_of_people_prompt(entity_lists):
     system_prompt = '''You are a helpful assistant whose job is to summarise police records.'''
     
     prompt = f'''[INST]
@@ -79,14 +117,36 @@ def llama31instruct_narrative_of_people(entity_lists):
     The list of previously extracted entities:
     {entity_lists}
     '''
+    return prompt, system_prompt
+
+
+def llama31instruct_narrative_of_people(entity_lists):
+    prompt, system_prompt = llama31instruct_narrative_of_people_prompt(entity_lists)
     response = ask_open_llama(prompt=prompt, maxtokens=1000, system_prompt=system_prompt)
     print(response)
     return response
 
+
+def llama31instruct_narrative_of_people_batch(entity_lists_per_case):
+    prompts = [llama31instruct_narrative_of_people_prompt(t)[0] for t in entity_lists_per_case]
+    _, system_prompt = llama31instruct_narrative_of_people_prompt('')
+    responses = ask_open_llama_batch(prompts=prompts, maxtokens=1000, system_prompt=system_prompt)
+    print(responses)
+    return responses
+
+
 def people_extraction_pipleine(func_name, mp_df, vp_df):
     misperids = mp_df['misperid'].drop_duplicates().to_list()
     
     misperids = [5433, 8940, 962, 5051, 2280, 51, 9039]
+    
+    # all reports of all cases are submitted together so the model runs on full batches
+    mp_df_cases = mp_df[mp_df['misperid'].isin(misperids)]
+    results = ask_batch_with_retries(llama31instruct_summary_template_with_reportid_batch,
+                                     mp_df_cases['circumstances'].to_list(), split_output_people)
+    results = dict(zip(mp_df_cases.index, results))
+    
+    entity_lists_per_case = []
     for misperid in misperids: 
         print(f"Processing {misperid}")
     
@@ -96,50 +156,44 @@ def people_extraction_pipleine(func_name, mp_df, vp_df):
         names = []  
         people = []
     
-        mp_df_misperid = mp_df[mp_df['misperid']==misperid]
-        vp_df_misperid = vp_df[vp_df['misper_misperid']==misperid]
+        mp_df_misperid = mp_df_cases[mp_df_cases['misperid']==misperid]
         
         for index, row in mp_df_misperid.iterrows():
-            for i in range(5):
-                try:
-                    output = llama31instruct_summary_template_with_reportid(row['circumstances'])
-                    print("SUMMARY\n")
-                    print(row['circumstances'])
-                    print('\n')
-                    print(output)
-                    print("\nEND SUMMARY")
-                    path = f"summaries/fake/{misperid}/assosiation_network/"
-                
-                    people_names_relations, people_desc = split_output_people(output)
-                    print(len(people_desc))
-                    for p in people_names_relations:  
-                        if p.split('(', 1)[0]  not in row['circumstances']:
-                            print("WRONG", p)
-                            continue
-                        with open(path + func_name + '.txt', "a+") as f:
-                            f.write(str(row['reportid']) + ','+ 'people_names_relations' +  ',' + p + '\n')
-                            names.append(p)
-                    for p in people_desc:
-                        if p.split('(', 1)[0] not in row['circumstances']:
-                            print("WRONG", p)
-                            continue  
-                        with open(path + func_name + '.txt', "a+") as f:
-                            people.append(p)
-                            f.write(str(row['reportid']) + ','+ 'people_desc' + ',' + p + '\n')
-                    break
-                except:
-                    if i == 4:
-                        raise ValueError("couldn't parse for 4 iterations")
+            output, (people_names_relations, people_desc) = results[index]
+            print("SUMMARY\n")
+            print(row['circumstances'])
+            print('\n')
+            print(output)
+            print("\nEND SUMMARY")
+            path = f"summaries/fake/{misperid}/assosiation_network/"
+        
+            print(len(people_desc))
+            for p in people_names_relations:  
+                if p.split('(', 1)[0]  not in row['circumstances']:
+                    print("WRONG", p)
+                    continue
+                with open(path + func_name + '.txt', "a+") as f:
+                    f.write(str(row['reportid']) + ','+ 'people_names_relations' +  ',' + p + '\n')
+                    names.append(p)
+            for p in people_desc:
+                if p.split('(', 1)[0] not in row['circumstances']:
+                    print("WRONG", p)
+                    continue  
+                with open(path + func_name + '.txt', "a+") as f:
+                    people.append(p)
+                    f.write(str(row['reportid']) + ','+ 'people_desc' + ',' + p + '\n')
+        entity_lists_per_case.append(names + people)
                     
+    outputs = llama31instruct_narrative_of_people_batch(entity_lists_per_case) 
+    for misperid, output in zip(misperids, outputs):
         path = f"summaries/fake/{misperid}/assosiation_network/"
-        output = llama31instruct_narrative_of_people(names + people) 
         with open(path + func_name + '_narrative' + '.txt', "a+") as f:
             f.write(output)
 
 
 
 ############################ LOCATIONS ############################
-def llama31instruct_summary_template_with_reportid_locations(textual_field):
+def llama31instruct_summary_template_with_reportid_locations_prompt(textual_field):
     system_prompt = '''You are a helpful assistant whose job is to extract entities from text.'''
     
     prompt = f'''[INST]
@@ -172,12 +226,25 @@ def llama31instruct_summary_template_with_reportid_locations(textual_field):
     Here is the textual field:
     {textual_field}
     '''
+    return prompt, system_prompt
+
+
+def llama31instruct_summary_template_with_reportid_locations(textual_field):
+    prompt, system_prompt = llama31instruct_summary_template_with_reportid_locations_prompt(textual_field)
     response = ask_open_llama(prompt=prompt, maxtokens=1000, system_prompt=system_prompt)
     print(response)
     return response
 
 
-def llama31instruct_narrative_of_locations(entity_lists):
+def llama31instruct_summary_template_with_reportid_locations_batch(textual_fields):
+    prompts = [llama31instruct_summary_template_with_reportid_locations_prompt(t)[0] for t in textual_fields]
+    _, system_prompt = llama31instruct_summary_template_with_reportid_locations_prompt('')
+    responses = ask_open_llama_batch(prompts=prompts, maxtokens=1000, system_prompt=system_prompt)
+    print(responses)
+    return responses
+
+
+def llama31instruct_narrative_of_locations_prompt(entity_lists):
     system_prompt = '''You are a helpful assistant whose job is to summarise police records.'''
     
     
@@ -191,10 +258,24 @@ def llama31instruct_narrative_of_locations(entity_lists):
     The list of previously extracted entities:
     {entity_lists}
     '''
+    return prompt, system_prompt
+
+
+def llama31instruct_narrative_of_locations(entity_lists):
+    prompt, system_prompt = llama31instruct_narrative_of_locations_prompt(entity_lists)
     response = ask_open_llama(prompt=prompt, maxtokens=1000, system_prompt=system_prompt)
     print(response)
     return response
 
+
+def llama31instruct_narrative_of_locations_batch(entity_lists_per_case):
+    prompts = [llama31instruct_narrative_of_locations_prompt(t)[0] for t in entity_lists_per_case]
+    _, system_prompt = llama31instruct_narrative_of_locations_prompt('')
+    responses = ask_open_llama_batch(prompts=prompts, maxtokens=1000, system_prompt=system_prompt)
+    print(responses)
+    return responses
+
+
 def split_output_locations (text):
     lines = text.splitlines()
     addresses = []
@@ -213,6 +294,14 @@ def locations_addresses_extraction_pipleine(func_name, mp_df, vp_df):
     misperids = mp_df['misperid'].drop_duplicates().to_list()
 
     misperids = [5433, 8940, 962, 5051, 2280, 51, 9039]
+    
+    # all reports of all cases are submitted together so the model runs on full batches
+    mp_df_cases = mp_df[mp_df['misperid'].isin(misperids)]
+    results = ask_batch_with_retries(llama31instruct_summary_template_with_reportid_locations_batch,
+                                     mp_df_cases['circumstances'].to_list(), split_output_locations)
+    results = dict(zip(mp_df_cases.index, results))
+    
+    entity_lists_per_case = []
     for misperid in misperids: 
         print(f"Processing {misperid}")
     
@@ -220,44 +309,36 @@ def locations_addresses_extraction_pipleine(func_name, mp_df, vp_df):
         if not os.path.exists(f"summaries/fake/{misperid}/locations"):
             os.makedirs(f"summaries/fake/{misperid}/locations")
         
-        names = []  
-        people = []
+        addresses = []  
+        landmarks = []
     
-        mp_df_misperid = mp_df[mp_df['misperid']==misperid]
-        vp_df_misperid = vp_df[vp_df['misper_misperid']==misperid]
+        mp_df_misperid = mp_df_cases[mp_df_cases['misperid']==misperid]
         
         for index, row in mp_df_misperid.iterrows():
-            for i in range(5):
-                try:
-                    output = llama31instruct_summary_template_with_reportid_locations(
-                        row['circumstances']
-                    )
-                    path = f"summaries/fake/{misperid}/locations/"
-                
-                    locations, names_relations, people_desc = split_output_locations(output)
-                    print(len(people_desc))
-                    for p in people_names_relations:  
-                        if p.split('(', 1)[0]  not in row['circumstances']:
-                            print("WRONG", p)
-                            continue
-                        with open(path + func_name + '.txt', "a+") as f:
-                            f.write(str(row['reportid']) + ','+ 'addresses' +  ',' + p + '\n')
-                            names.append(p)
-                    for p in people_desc:
-                        if p.split('(', 1)[0] not in row['circumstances']:
-                            print("WRONG", p)
-                            continue  
-                        with open(path + func_name + '.txt', "a+") as f:
-                            people.append(p)
-                            print("WRITING TO ", path + func_name + '.txt')
-                            f.write(str(row['reportid']) + ','+ 'landmarks_other_locations' + ',' + p + '\n')
-                    break
-                except:
-                    if i == 4:
-                        raise ValueError("couldn't parse for 4 iterations")
+            _, (addresses_report, landmarks_report) = results[index]
+            path = f"summaries/fake/{misperid}/locations/"
+        
+            print(len(landmarks_report))
+            for p in addresses_report:  
+                if p.split('(', 1)[0]  not in row['circumstances']:
+                    print("WRONG", p)
+                    continue
+                with open(path + func_name + '.txt', "a+") as f:
+                    f.write(str(row['reportid']) + ','+ 'addresses' +  ',' + p + '\n')
+                    addresses.append(p)
+            for p in landmarks_report:
+                if p.split('(', 1)[0] not in row['circumstances']:
+                    print("WRONG", p)
+                    continue  
+                with open(path + func_name + '.txt', "a+") as f:
+                    landmarks.append(p)
+                    print("WRITING TO ", path + func_name + '.txt')
+                    f.write(str(row['reportid']) + ','+ 'landmarks_other_locations' + ',' + p + '\n')
+        entity_lists_per_case.append(addresses + landmarks)
                     
+    outputs = llama31instruct_narrative_of_locations_batch(entity_lists_per_case) 
+    for misperid, output in zip(misperids, outputs):
         path = f"summaries/fake/{misperid}/locations/"
-        output = llama31instruct_narrative_of_locations(names + people) 
         with open(path + func_name + '_narrative' + '.txt', "a+") as f:
             f.write(output)
 
@@ -758,6 +839,8 @@ if __name__=="__main__":
     vp_df = pd.read_csv("DATA/fake/fake_vp_data.csv")
     
     vp_df.columns = vp_df.columns.str.lower()
+    
+    warm_up_llama()
 
 
     # locations
@@ -780,3 +863,4 @@ if __name__=="__main__":
     # # make vulnerabilities narrative
     # vulnarabilities_narrative("vul_llama3.1",mp_df, vp_df )
     
+    shutdown_llama()
@@ -1,70 +1,65 @@
-import torch
-torch.cuda.empty_cache()
+from .response_cache import next_cache_key, get_cached_response, store_response
+from .llm_backends import get_backend
 
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-print(torch.version.cuda)
-print(torch.__version__)
-print("CUDA Available:", torch.cuda.is_available())
-if  torch.cuda.get_device_name(0):
-    print("GPU Name:", torch.cuda.get_device_name(0))
-else:
-    print("No GPU")
-    raise ValueError("No GPU available")
+DEFAULT_MODEL = "meta-llama/Meta-Llama-3.1-8B-Instruct"
 
 
-
-# # Fix 1: Use device parameter instead of device_map for pipeline
-# # Fix 2: Add trust_remote_code=True for better compatibility
-# pipe = pipeline(
-#     "text-generation",
-#     model=model_id,
-#     model_kwargs={"torch_dtype": torch.bfloat16},
-#     device=device_index,  # Use device parameter
-#     trust_remote_code=True
-# )
-
-
-
-# # messages = [
-#     {"role": "system", "content": "You are a pirate chatbot who always responds in pirate speak!"},
-#     {"role": "user", "content": "Who are you?"},
-# ]
+def warm_up_llama(models=(DEFAULT_MODEL,)):
+    """
+    Load the given model ids up front so the first prompt does not pay the load time.
+    
+    Models stay resident until shutdown_llama is called, so all
+    llama31instruct_* functions share a single copy of each model.
+    """
+    get_backend().warm_up(models)
 
 
+def shutdown_llama(model=None):
+    """
+    Release one loaded model (or all of them if model is None) and free GPU memory.
+    """
+    get_backend().shutdown(model)
 
-# # Fix 3: Use the same pipeline instance
-# result = pipe("Hey how are you doing today?", max_new_tokens=100)
-# print(result[0]["generated_text"])
 
-def ask_open_llama(prompt, model="meta-llama/Meta-Llama-3.1-8B-Instruct", maxtokens=None, system_prompt="You are a police search advisor whose task is to summarise data.", temperature=0.1):
-    print(torch.__version__)
-    print("CUDA Available:", torch.cuda.is_available())
-    print("GPU Name:", torch.cuda.get_device_name(0) if torch.cuda.is_available() else "No GPU")
+def ask_open_llama(prompt, model=DEFAULT_MODEL, maxtokens=None, system_prompt="You are a police search advisor whose task is to summarise data.", temperature=0.1, use_cache=True):
+    backend = get_backend()
+    use_cache = use_cache and backend.cacheable
+    if use_cache:
+        key = next_cache_key(model, prompt, system_prompt, temperature, maxtokens)
+        response = get_cached_response(key)
+        if response is not None:
+            return response
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    device_index = 0 if device == "cuda" else -1 
-        
-    model_id = model
+    response = backend.generate(prompt, model, maxtokens=maxtokens, system_prompt=system_prompt, temperature=temperature)
+    if use_cache:
+        store_response(key, response)
+    return response
 
-        
-    pipe = pipeline(
-        "text-generation",
-        model=model_id,
-        model_kwargs={"torch_dtype": torch.bfloat16},
-        device=device_index,  # Use device parameter
-        trust_remote_code=True
-    )
 
-    messages = []
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
-    messages.append({"role": "user", "content": prompt})
+def ask_open_llama_batch(prompts, model=DEFAULT_MODEL, maxtokens=None, system_prompt="You are a police search advisor whose task is to summarise data.", temperature=0.1, batch_size=8, max_batch_tokens=16384, use_cache=True):
+    """
+    Batched version of ask_open_llama.
     
-    outputs = pipe(
-        messages,
-        max_new_tokens=maxtokens,
-        temperature=0.1,
-    )
-    print(outputs[0]["generated_text"][-1])
+    Prompts are bucketed by token length so that each batch is padded to a
+    similar length, and answers are returned in the order of prompts.
+    Prompts with a cached response are not sent to the model.
+    """
+    backend = get_backend()
+    use_cache = use_cache and backend.cacheable
+    responses = [None] * len(prompts)
+    keys = [None] * len(prompts)
+    if use_cache:
+        for i, prompt in enumerate(prompts):
+            keys[i] = next_cache_key(model, prompt, system_prompt, temperature, maxtokens)
+            responses[i] = get_cached_response(keys[i])
+    missing = [i for i, response in enumerate(responses) if response is None]
+    if not missing:
+        return responses
 
-    return outputs[0]["generated_text"][-1]['content']
\ No newline at end of file
+    generated = backend.generate_batch([prompts[i] for i in missing], model, maxtokens=maxtokens, system_prompt=system_prompt,
+                                       temperature=temperature, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+    for i, response in zip(missing, generated):
+        responses[i] = response
+        if use_cache:
+            store_response(keys[i], response)
+    return responses
@@ -1,20 +1,16 @@
-import os
-from openai import OpenAI
+from .response_cache import next_cache_key, get_cached_response, store_response
+from .llm_backends import get_backend
 
-from dotenv import load_dotenv
-load_dotenv()
-client =  OpenAI(api_key=os.getenv("OPEN_API_MLMI_KEY"))
+def ask_open_ai(prompt, model="gpt-4o-mini", maxtokens=None, system_prompt="You are a helpful assistant that summarizes data.", use_cache=True):
+    backend = get_backend(default="openai", stand_in_only=True)
+    use_cache = use_cache and backend.cacheable
+    if use_cache:
+        key = next_cache_key(model, prompt, system_prompt, None, maxtokens)
+        response = get_cached_response(key)
+        if response is not None:
+            return response
 
-def ask_open_ai(prompt, model="gpt-4o-mini", maxtokens=None, system_prompt="You are a helpful assistant that summarizes data."):
-    messages = []
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
-    messages.append({"role": "user", "content": prompt})
-    
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        max_tokens=maxtokens
-    )
-    print(response.choices[0].message.content)
-    return response.choices[0].message.content
\ No newline at end of file
+    response = backend.generate(prompt, model, maxtokens=maxtokens, system_prompt=system_prompt)
+    if use_cache:
+        store_response(key, response)
+    return response
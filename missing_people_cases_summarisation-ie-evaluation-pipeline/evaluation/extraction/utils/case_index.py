@@ -0,0 +1,65 @@
+from collections import OrderedDict
+import re
+
+
+from . import serialize
+from .embeddings import get_embedding_service
+from .mappings import vp_column_contexts
+
+# same sentence split the evaluation has always used on the serialized case text
+SENTENCE_SPLIT = r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!)\s'
+MAX_CASES = 256
+
+_indexes = OrderedDict()
+
+
+class CaseSentenceIndex:
+    """
+    Sentences of the serialized circumstances and nominal synopses of one case, split and embedded once.
+    """
+
+    def __init__(self, mp_df, vp_df, model_name="all-MiniLM-L6-v2"):
+        self.text = serialize.mp_serialize_dataframe_for_llm_cirumstancesonly(mp_df) + serialize.vp_serialize_dataframe_for_llm_nominalsynopsisonly(vp_df, vp_column_contexts)
+        self.sentences = re.split(SENTENCE_SPLIT, self.text)
+        self.embedding_service = get_embedding_service(model_name)
+        self.embeddings = self.embedding_service.encode(self.sentences)
+
+    def first_matches(self, texts, threshold):
+        """
+        For every text, the first sentence of the case with cosine similarity >= threshold.
+
+        Parameters:
+        - texts: list of strings to look up
+        - threshold: minimum cosine similarity
+
+        Returns:
+        - list with the matching sentence, or None, for every text
+        """
+        if len(texts) == 0:
+            return []
+        similarity = self.embedding_service.encode(texts) @ self.embeddings.T
+        above = similarity >= threshold
+        first = above.argmax(axis=1)
+        return [self.sentences[j] if above[i, j] else None for i, j in enumerate(first)]
+
+
+def _case_key(mp_df, vp_df):
+    misperid = mp_df['misperid'].iloc[0] if 'misperid' in mp_df.columns and len(mp_df) else None
+    reportids = tuple(mp_df['reportid']) if 'reportid' in mp_df.columns else len(mp_df)
+    vp_ids = tuple(vp_df['vpd_nominalincidentid_pk']) if 'vpd_nominalincidentid_pk' in vp_df.columns else len(vp_df)
+    return (misperid, reportids, vp_ids)
+
+
+def get_case_sentence_index(mp_df, vp_df):
+    """
+    CaseSentenceIndex of the case, built on first use and kept for the most recent MAX_CASES cases.
+    """
+    key = _case_key(mp_df, vp_df)
+    if key in _indexes:
+        _indexes.move_to_end(key)
+        return _indexes[key]
+    index = CaseSentenceIndex(mp_df, vp_df)
+    _indexes[key] = index
+    while len(_indexes) > MAX_CASES:
+        _indexes.popitem(last=False)
+    return index
@@ -1,8 +1,8 @@
 from . import serialize
 from .mappings import mp_column_contexts, vp_column_contexts, twenty_five_mp_questions
 import re
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from .embeddings import get_embedding_service
+from .case_index import get_case_sentence_index
 from nltk.corpus import stopwords
 # import nltk
 import numpy as np
@@ -207,15 +207,20 @@ def compare_string_sets_sentence_transformers(mp_df, vp_df, set_truth, set_summ,
     set_truth = {s.lower().strip() for s in set_truth}
     set_summ =  {s.lower().strip() for s in set_summ}
     
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    partial_matches = []
-    missing_items = []
+    embedding_service = get_embedding_service("all-MiniLM-L6-v2")
 
-    def find_similarity(ent_truth, ent_summ):
-        embeddings_truth = model.encode(ent_truth)
-        ermbeddings_summ = model.encode(ent_in_summ)
-        similarity = cosine_similarity([embeddings_truth], [ermbeddings_summ])
-        return similarity
+    # fixed orders, so that "first match" means the same as when iterating the sets
+    truth_list = list(set_truth)
+    summ_list = list(set_summ)
+    summ_clean_list = [re.sub(r'[^\w\s]', ' ', ent_summ) for ent_summ in summ_list]
+
+    # one batched forward pass for every distinct string, then full cosine similarity matrices
+    texts = list(dict.fromkeys(truth_list + summ_list + summ_clean_list))
+    index = {text: i for i, text in enumerate(texts)}
+    embeddings = embedding_service.encode(texts)
+    emb_truth = embeddings[[index[t] for t in truth_list]]
+    sim_truth_summ = emb_truth @ embeddings[[index[t] for t in summ_list]].T
+    sim_summ_clean_truth = embeddings[[index[t] for t in summ_clean_list]] @ emb_truth.T
     
     positive = 0
     partial = 0
@@ -230,55 +235,39 @@ def compare_string_sets_sentence_transformers(mp_df, vp_df, set_truth, set_summ,
     
     hallucination = 0
     hallucination_list = []
-    for ent in set_truth:
+    for i, ent in enumerate(truth_list):
         if ent in set_summ:
             positive+=1
             exact_matches.append(ent)
             
         else:
-            
-            for ent_in_summ in set_summ:                
-                similarity = find_similarity(ent, ent_summ)
-                
-                if similarity >= threshold_patterns:
-                    partial_list.append((ent, ent_in_summ))
-                    partial +=1
-                    break
+            matches = np.flatnonzero(sim_truth_summ[i] >= threshold_patterns)
+            if len(matches):
+                partial_list.append((ent, summ_list[matches[0]]))
+                partial +=1
             else:
                 missing_list.append(ent)
                 missing+=1
-    for ent_summ in set_summ:
-        ent_summ = re.sub(r'[^\w\s]', ' ', ent_summ)
+
+    for j, ent_summ in enumerate(summ_clean_list):
         if ent_summ not in set_truth:
             
-            found = False
-            for ent in set_truth:
-                similarity = find_similarity(ent, ent_summ)
-                
-                if similarity >= threshold_patterns:
-                    found = True
-                    break
+            found = bool((sim_summ_clean_truth[j] >= threshold_patterns).any())
                 
             if found==False:
                 insert_other +=1
                 insert_other_list.append(ent_summ)
-                
-                serialized = serialize.mp_serialize_dataframe_for_llm_cirumstancesonly(mp_df) + serialize.vp_serialize_dataframe_for_llm_nominalsynopsisonly(vp_df, vp_column_contexts) 
-                serialized_sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!)\s', serialized)
-            
-                found_in_text = False
-                for sentence in serialized_sentences:
-                    similarity =find_similarity(sentence, ent_in_summ)
-                    # print(similarity, ent_in_summ, sentence)
-                    if  similarity >= threshold_sentence:
-                        false_but_in_text +=1
-                        false_but_in_text_list.append((ent_summ, sentence))
-                        found_in_text=True
-                        break
-                    
-                if found_in_text==False:
-                    hallucination +=1
-                    hallucination_list.append(ent_summ)
+
+    # inserted entities close to a sentence of the case are "in text", the rest are hallucinations
+    if insert_other_list:
+        case_index = get_case_sentence_index(mp_df, vp_df)
+        for ent_summ, sentence in zip(insert_other_list, case_index.first_matches(insert_other_list, threshold_sentence)):
+            if sentence is not None:
+                false_but_in_text +=1
+                false_but_in_text_list.append((ent_summ, sentence))
+            else:
+                hallucination +=1
+                hallucination_list.append(ent_summ)
      
                     
     print("setsumm:", set_summ)     
@@ -312,7 +301,7 @@ def compare_string_sets_location_types(mp_df, vp_df, set_truth, set_summ, loc_ty
     set_truth = {re.sub(r'[^\w\s]', ' ',    str(s).lower().strip()) for s in set_truth}
     set_summ =  {re.sub(r'[^\w\s]', ' ',    str(s).lower().strip()) for s in set_summ}
     
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+    embedding_service = get_embedding_service("all-MiniLM-L6-v2")
     partial_matches = []
     missing_items = []
     
@@ -332,10 +321,7 @@ def compare_string_sets_location_types(mp_df, vp_df, set_truth, set_summ, loc_ty
         return overlap, len(overlap), overlap_all_a
     
     def find_similarity(ent_truth, ent_summ):
-        embeddings_truth = model.encode(ent_truth)
-        ermbeddings_summ = model.encode(ent_summ)
-        similarity = cosine_similarity([embeddings_truth], [ermbeddings_summ])
-        return similarity
+        return embedding_service.similarity(ent_truth, ent_summ)
     
     exact_matches = []
     partial_matches = []
@@ -458,7 +444,7 @@ def compare_string_sets_advanced_pattern_types(mp_df, vp_df, set_truth, explanat
     set_truth = {re.sub(r'[^a-zA-Z0-9\s]', ' ',    str(s).lower().strip()) for s in set_truth}
     set_summ =  {re.sub(r'[^a-zA-Z0-9\s]', ' ',    str(s).lower().strip()) for s in set_summ}
     
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+    embedding_service = get_embedding_service("all-MiniLM-L6-v2")
     partial_matches = []
     missing_items = []
     
@@ -478,10 +464,7 @@ def compare_string_sets_advanced_pattern_types(mp_df, vp_df, set_truth, explanat
         return overlap, len(overlap), overlap_all_a
     
     def find_similarity(ent_truth, ent_summ):
-        embeddings_truth = model.encode(ent_truth)
-        ermbeddings_summ = model.encode(ent_summ)
-        similarity = cosine_similarity([embeddings_truth], [ermbeddings_summ])
-        return similarity
+        return embedding_service.similarity(ent_truth, ent_summ)
     
     exact_matches = []
     partial_matches = []
@@ -605,7 +588,7 @@ def compare_string_sets_advanced_pattern_types(mp_df, vp_df, set_truth, explanat
 def compare_string_sets_patterns_types(mp_df, vp_df, set_truth, set_summ, min_word_overlap=1):
     set_truth = {re.sub(r'[^\w\s]', ' ',    str(s).lower().strip()) for s in set_truth}
     set_summ =  {re.sub(r'[^\w\s]', ' ',    str(s).lower().strip()) for s in set_summ}
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+    embedding_service = get_embedding_service("all-MiniLM-L6-v2")
     partial_matches = []
     missing_items = []
     
@@ -625,10 +608,7 @@ def compare_string_sets_patterns_types(mp_df, vp_df, set_truth, set_summ, min_wo
         return overlap, len(overlap), overlap_all_a
     
     def find_similarity(ent_truth, ent_summ):
-        embeddings_truth = model.encode(ent_truth)
-        ermbeddings_summ = model.encode(ent_summ)
-        similarity = cosine_similarity([embeddings_truth], [ermbeddings_summ])
-        return similarity
+        return embedding_service.similarity(ent_truth, ent_summ)
     
     exact_matches = []
     partial_matches = []
@@ -0,0 +1,173 @@
+import atexit
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+# Shared sentence embeddings for the compare_sets functions.
+# EMBEDDING_STORE_PATH (a directory) additionally keeps every embedding on disk
+# as float16, so that later evaluation runs only encode strings they have not seen.
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+STORE_PATH = os.getenv("EMBEDDING_STORE_PATH")
+MAX_CACHED = int(os.getenv("EMBEDDING_CACHE_SIZE", "100000"))
+
+_models = {}
+_services = {}
+
+
+def get_sentence_model(model_name=DEFAULT_MODEL):
+    """
+    Load a SentenceTransformer once per process and reuse it across calls.
+    """
+    if model_name not in _models:
+        from sentence_transformers import SentenceTransformer
+        _models[model_name] = SentenceTransformer(model_name)
+    return _models[model_name]
+
+
+def normalise_text(text):
+    # all-MiniLM-L6-v2 is uncased, so case and repeated whitespace do not change the embedding
+    return " ".join(str(text).lower().split())
+
+
+class EmbeddingService:
+    """
+    Unit length sentence embeddings with an in-memory LRU cache and an optional float16 store on disk.
+
+    Parameters:
+    - model_name: SentenceTransformer model
+    - store_path: directory of the persistent store, or None to keep embeddings in memory only
+    - max_cached: number of embeddings kept in the in-memory cache
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, store_path=None, max_cached=MAX_CACHED):
+        self.model_name = model_name
+        self.max_cached = max_cached
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.store_dir = os.path.join(store_path, model_name.replace("/", "_")) if store_path else None
+        self.store_keys = {}
+        self.store = None
+        self.new_keys = []
+        self.new_embeddings = []
+        if self.store_dir:
+            self._load_store()
+            atexit.register(self.flush)
+
+    def _store_files(self):
+        return os.path.join(self.store_dir, "keys.json"), os.path.join(self.store_dir, "embeddings.npy")
+
+    def _load_store(self):
+        keys_path, embeddings_path = self._store_files()
+        if os.path.exists(keys_path) and os.path.exists(embeddings_path):
+            with open(keys_path, "r") as f:
+                keys = json.load(f)
+            self.store = np.load(embeddings_path, mmap_mode="r")
+            self.store_keys = {key: i for i, key in enumerate(keys)}
+
+    def flush(self):
+        """
+        Append the embeddings computed since the last flush to the persistent store.
+        """
+        if not self.store_dir or not self.new_keys:
+            return
+        os.makedirs(self.store_dir, exist_ok=True)
+        keys_path, embeddings_path = self._store_files()
+
+        # other processes may have flushed in the meantime, so merge with what is on disk now
+        self._load_store()
+        keys = [None] * len(self.store_keys)
+        for key, i in self.store_keys.items():
+            keys[i] = key
+        parts = [np.asarray(self.store)] if self.store is not None else []
+        added = [(key, e) for key, e in zip(self.new_keys, self.new_embeddings) if key not in self.store_keys]
+        if added:
+            keys += [key for key, _ in added]
+            parts.append(np.stack([e for _, e in added]).astype(np.float16))
+
+            tmp_keys, tmp_embeddings = keys_path + f".{os.getpid()}.tmp", embeddings_path + f".{os.getpid()}.tmp.npy"
+            np.save(tmp_embeddings, np.concatenate(parts))
+            with open(tmp_keys, "w") as f:
+                json.dump(keys, f)
+            os.replace(tmp_embeddings, embeddings_path)
+            os.replace(tmp_keys, keys_path)
+            self._load_store()
+
+        self.new_keys = []
+        self.new_embeddings = []
+
+    def _remember(self, key, embedding):
+        self.cache[key] = embedding
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_cached:
+            self.cache.popitem(last=False)
+
+    def _lookup(self, key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if key in self.store_keys:
+            embedding = np.asarray(self.store[self.store_keys[key]], dtype=np.float32)
+            self._remember(key, embedding)
+            return embedding
+        return None
+
+    def encode(self, texts):
+        """
+        Embed texts, encoding only the ones that are not cached, in a single batch.
+
+        Returns:
+        - float32 array of shape (len(texts), dim) with unit length rows, so a dot product is the cosine similarity
+        """
+        keys = [normalise_text(t) for t in texts]
+        found = {}
+        missing = []
+        for key in keys:
+            if key in found:
+                continue
+            embedding = self._lookup(key)
+            if embedding is None:
+                missing.append(key)
+                found[key] = None
+            else:
+                found[key] = embedding
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            model = get_sentence_model(self.model_name)
+            encoded = model.encode(missing, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+            for key, embedding in zip(missing, encoded):
+                found[key] = embedding
+                self._remember(key, embedding)
+                if self.store_dir:
+                    self.new_keys.append(key)
+                    self.new_embeddings.append(embedding)
+
+        if not keys:
+            return np.zeros((0, get_sentence_model(self.model_name).get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def similarity_matrix(self, texts_a, texts_b):
+        """
+        Cosine similarity of every text in texts_a (rows) to every text in texts_b (columns).
+        """
+        if len(texts_a) == 0 or len(texts_b) == 0:
+            return np.zeros((len(texts_a), len(texts_b)), dtype=np.float32)
+        embeddings = self.encode(list(texts_a) + list(texts_b))
+        return embeddings[:len(texts_a)] @ embeddings[len(texts_a):].T
+
+    def similarity(self, text_a, text_b):
+        return float(self.similarity_matrix([text_a], [text_b])[0, 0])
+
+
+def get_embedding_service(model_name=DEFAULT_MODEL):
+    """
+    Process-wide EmbeddingService for the model, shared by all compare_sets functions.
+    """
+    if model_name not in _services:
+        _services[model_name] = EmbeddingService(model_name, store_path=STORE_PATH)
+    return _services[model_name]
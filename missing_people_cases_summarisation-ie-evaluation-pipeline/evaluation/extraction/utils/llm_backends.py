@@ -0,0 +1,313 @@
+import json
+import os
+import re
+
+from .response_cache import request_hash
+
+# Backends that answer the prompts of ask_open_llama / ask_open_ai.
+# LLM_BACKEND (or set_backend) overrides which one is used, e.g. LLM_BACKEND=fake
+# runs the extraction pipelines on CPU without model weights or network access.
+# The OpenAI calls of ask_open_ai only take a stand-in override (fake, recording),
+# so LLM_BACKEND=hf does not send OpenAI model names to the local models.
+
+
+class LLMBackend:
+    name = "base"
+    # responses of this backend may be stored in the shared response cache
+    cacheable = True
+    # answers for any model, so it may also replace the OpenAI backend of ask_open_ai
+    stand_in = False
+
+    def generate(self, prompt, model, maxtokens=None, system_prompt=None, temperature=None):
+        raise NotImplementedError
+
+    def generate_batch(self, prompts, model, maxtokens=None, system_prompt=None, temperature=None, **kwargs):
+        return [self.generate(prompt, model, maxtokens=maxtokens, system_prompt=system_prompt, temperature=temperature) for prompt in prompts]
+
+    def warm_up(self, models):
+        pass
+
+    def shutdown(self, model=None):
+        pass
+
+
+def build_messages(prompt, system_prompt):
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def length_buckets(lengths, batch_size=8, max_batch_tokens=16384):
+    """
+    Group prompt indices into batches of similar length.
+
+    Parameters:
+    - lengths: token length of every prompt
+    - batch_size: maximum number of prompts in a batch
+    - max_batch_tokens: maximum padded size (batch rows * longest prompt) of a batch
+
+    Returns:
+    - list of lists of indices into lengths, shortest prompts first
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    batch = []
+    for i in order:
+        # order is ascending, so lengths[i] is the length the whole batch gets padded to
+        if batch and (len(batch) == batch_size or (len(batch) + 1) * lengths[i] > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class HFLocalBackend(LLMBackend):
+    """
+    Local transformers text-generation pipelines, loaded once per model id and kept resident.
+    """
+    name = "hf"
+
+    def __init__(self):
+        # model id -> loaded text-generation pipeline, shared by every caller in the process
+        self.pipelines = {}
+
+    def get_pipeline(self, model):
+        if model in self.pipelines:
+            return self.pipelines[model]
+
+        import torch
+        from transformers import pipeline
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        device_index = 0 if device == "cuda" else -1
+        print(torch.__version__)
+        print("CUDA Available:", torch.cuda.is_available())
+        print("GPU Name:", torch.cuda.get_device_name(0) if torch.cuda.is_available() else "No GPU")
+        print(f"Loading {model} on {device}")
+
+        pipe = pipeline(
+            "text-generation",
+            model=model,
+            model_kwargs={"torch_dtype": torch.bfloat16},
+            device=device_index,  # Use device parameter
+            trust_remote_code=True
+        )
+        # decoder-only models need left padding (and a pad token) for batched generation
+        pipe.tokenizer.padding_side = "left"
+        if pipe.tokenizer.pad_token_id is None:
+            pipe.tokenizer.pad_token_id = pipe.tokenizer.eos_token_id
+        self.pipelines[model] = pipe
+        return pipe
+
+    def generate(self, prompt, model, maxtokens=None, system_prompt=None, temperature=None):
+        pipe = self.get_pipeline(model)
+        outputs = pipe(
+            build_messages(prompt, system_prompt),
+            max_new_tokens=maxtokens,
+            temperature=temperature,
+        )
+        print(outputs[0]["generated_text"][-1])
+        return outputs[0]["generated_text"][-1]['content']
+
+    def generate_batch(self, prompts, model, maxtokens=None, system_prompt=None, temperature=None, batch_size=8, max_batch_tokens=16384):
+        pipe = self.get_pipeline(model)
+        conversations = [build_messages(prompt, system_prompt) for prompt in prompts]
+        lengths = [len(pipe.tokenizer.apply_chat_template(c, add_generation_prompt=True)) for c in conversations]
+
+        responses = [None] * len(prompts)
+        for batch in length_buckets(lengths, batch_size=batch_size, max_batch_tokens=max_batch_tokens):
+            outputs = pipe(
+                [conversations[i] for i in batch],
+                max_new_tokens=maxtokens,
+                temperature=temperature,
+                batch_size=len(batch),
+            )
+            for i, output in zip(batch, outputs):
+                responses[i] = output[0]["generated_text"][-1]['content']
+        return responses
+
+    def warm_up(self, models):
+        for model in models:
+            self.get_pipeline(model)
+
+    def shutdown(self, model=None):
+        import torch
+
+        models = list(self.pipelines.keys()) if model is None else [model]
+        for m in models:
+            self.pipelines.pop(m, None)
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(self):
+        self.client = None
+
+    def get_client(self):
+        if self.client is None:
+            from openai import OpenAI
+            from dotenv import load_dotenv
+            load_dotenv()
+            self.client = OpenAI(api_key=os.getenv("OPEN_API_MLMI_KEY"))
+        return self.client
+
+    def generate(self, prompt, model, maxtokens=None, system_prompt=None, temperature=None):
+        kwargs = {}
+        if temperature is not None:
+            kwargs['temperature'] = temperature
+        response = self.get_client().chat.completions.create(
+            model=model,
+            messages=build_messages(prompt, system_prompt),
+            max_tokens=maxtokens,
+            **kwargs
+        )
+        print(response.choices[0].message.content)
+        return response.choices[0].message.content
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic stand-in for a model, for offline runs and throughput benchmarks.
+
+    Parameters:
+    - recording: path to a JSON file of {request hash: response}, e.g. written by RecordingBackend
+    - rules: list of (regex, response) tried in order against the prompt; response is a string or a function of the prompt
+    - responses: canned responses returned in turn when nothing else matches
+    - default_response: returned when nothing else matches (string or function of the prompt)
+    """
+    name = "fake"
+    cacheable = False
+    stand_in = True
+
+    def __init__(self, recording=None, rules=(), responses=(), default_response=None):
+        self.recorded = {}
+        if recording:
+            with open(recording, "r") as f:
+                self.recorded = json.load(f)
+        self.rules = [(re.compile(pattern), response) for pattern, response in rules]
+        self.responses = list(responses)
+        self.default_response = default_response
+        self.calls = 0
+
+    def generate(self, prompt, model, maxtokens=None, system_prompt=None, temperature=None):
+        i = self.calls
+        self.calls += 1
+
+        h = request_hash(model, prompt, system_prompt, temperature, maxtokens)
+        if h in self.recorded:
+            return self.recorded[h]
+        for pattern, response in self.rules:
+            if pattern.search(prompt):
+                return response(prompt) if callable(response) else response
+        if self.responses:
+            return self.responses[i % len(self.responses)]
+        if self.default_response is not None:
+            return self.default_response(prompt) if callable(self.default_response) else self.default_response
+        raise KeyError(f"FakeBackend has no response for prompt: {prompt[:100]}")
+
+
+class RecordingBackend(LLMBackend):
+    """
+    Wraps another backend and writes every answer to a JSON file that FakeBackend can replay.
+    """
+    stand_in = True
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.name = f"recording_{backend.name}"
+        self.path = path
+        self.recorded = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.recorded = json.load(f)
+
+    def _record(self, prompt, response, model, maxtokens, system_prompt, temperature):
+        self.recorded[request_hash(model, prompt, system_prompt, temperature, maxtokens)] = response
+
+    def _save(self):
+        with open(self.path, "w") as f:
+            json.dump(self.recorded, f, indent=2)
+
+    def generate(self, prompt, model, maxtokens=None, system_prompt=None, temperature=None):
+        response = self.backend.generate(prompt, model, maxtokens=maxtokens, system_prompt=system_prompt, temperature=temperature)
+        self._record(prompt, response, model, maxtokens, system_prompt, temperature)
+        self._save()
+        return response
+
+    def generate_batch(self, prompts, model, maxtokens=None, system_prompt=None, temperature=None, **kwargs):
+        responses = self.backend.generate_batch(prompts, model, maxtokens=maxtokens, system_prompt=system_prompt, temperature=temperature, **kwargs)
+        for prompt, response in zip(prompts, responses):
+            self._record(prompt, response, model, maxtokens, system_prompt, temperature)
+        self._save()
+        return responses
+
+    def warm_up(self, models):
+        self.backend.warm_up(models)
+
+    def shutdown(self, model=None):
+        self.backend.shutdown(model)
+
+
+# Answers in the output formats the extraction pipelines parse, so that
+# LLM_BACKEND=fake exercises the whole pipeline instead of failing on parsing.
+PIPELINE_FAKE_RULES = [
+    (r"people_names_relations=", "people_names_relations=[]\npeople_desc=[]"),
+    (r"landmarks_other_locations=", "addresses=[]\nlandmarks_other_locations=[]"),
+    (r"person1,person2,relationship,reportid", "MP,unknown,other,0"),
+    (r"report_id,location,location_type,quote", '0,"unknown","Other","unknown","none"'),
+    (r"report_id,\s*explanation,\s*pattern_name,\s*quote", '0,"unknown","unknown pattern","unknown"'),
+    (r"theme name 1", "unknown theme, [0]"),
+    (r"location, reportid", "unknown, 0"),
+]
+
+
+def create_backend(name):
+    if name == "hf":
+        return HFLocalBackend()
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "fake":
+        return FakeBackend(recording=os.getenv("LLM_FAKE_RECORDING"), rules=PIPELINE_FAKE_RULES, default_response="")
+    raise ValueError(f"Unknown LLM backend {name}")
+
+
+_backends = {}
+_override = None
+
+
+def set_backend(backend):
+    """
+    Use the given backend (instance or name) for every ask_* call, or None to go back to the defaults.
+    """
+    global _override
+    _override = create_backend(backend) if isinstance(backend, str) else backend
+
+
+def _named_backend(name):
+    if name not in _backends:
+        _backends[name] = create_backend(name)
+    return _backends[name]
+
+
+def get_backend(default="hf", stand_in_only=False):
+    """
+    Backend for the next call: set_backend, then the LLM_BACKEND variable, then default.
+
+    Parameters:
+    - default: name of the backend used without an override
+    - stand_in_only: only a stand-in backend (e.g. fake) overrides the default, for calls to models
+      that only the default backend serves, like the OpenAI models of ask_open_ai
+    """
+    override = _override
+    if override is None and os.getenv("LLM_BACKEND"):
+        override = _named_backend(os.getenv("LLM_BACKEND"))
+    if override is not None and (override.stand_in or not stand_in_only):
+        return override
+    return _named_backend(default)
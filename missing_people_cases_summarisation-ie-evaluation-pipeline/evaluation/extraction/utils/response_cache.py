@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+
+# Shared on-disk cache of LLM responses, used by ask_open_llama and ask_open_ai.
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_responses.sqlite")
+MAX_CACHE_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+_connection = None
+_connection_pid = None
+# how many times each request has been asked in this process
+_occurrences = Counter()
+
+
+def _get_connection():
+    global _connection, _connection_pid
+    # sqlite connections must not be shared with forked worker processes
+    if _connection is None or _connection_pid != os.getpid():
+        if os.path.dirname(CACHE_PATH):
+            os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        _connection = sqlite3.connect(CACHE_PATH, timeout=60)
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT, size INTEGER, last_used REAL)"
+        )
+        _connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        # running total of the response sizes, so a store does not have to sum the whole table
+        _connection.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER)")
+        _connection.execute("INSERT OR IGNORE INTO cache_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM responses")
+        _connection.commit()
+        _connection_pid = os.getpid()
+    return _connection
+
+
+def request_hash(model, prompt, system_prompt, temperature, maxtokens):
+    """
+    Content hash of everything that determines a model response.
+    """
+    request = json.dumps([model, prompt, system_prompt, temperature, maxtokens])
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+def next_cache_key(model, prompt, system_prompt, temperature, maxtokens):
+    """
+    Cache key for the next time this request is asked in the current process.
+
+    Identical requests asked several times in one run (e.g. the retry loops in
+    the evaluation scripts) get one entry each, so a rerun replays the same
+    sequence of responses instead of repeating the first one.
+    """
+    h = request_hash(model, prompt, system_prompt, temperature, maxtokens)
+    key = f"{h}:{_occurrences[h]}"
+    _occurrences[h] += 1
+    return key
+
+
+def get_cached_response(key):
+    con = _get_connection()
+    row = con.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    con.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+    con.commit()
+    return row[0]
+
+
+def store_response(key, response):
+    con = _get_connection()
+    size = len(key) + len(response.encode("utf-8"))
+    # one write transaction, so the total stays in step with the table when several processes share the cache
+    con.execute("BEGIN IMMEDIATE")
+    replaced = con.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+    con.execute(
+        "INSERT OR REPLACE INTO responses (key, response, size, last_used) VALUES (?, ?, ?, ?)",
+        (key, response, size, time.time()),
+    )
+    con.execute("UPDATE cache_size SET total = total + ? WHERE id = 0", (size - (replaced[0] if replaced else 0),))
+    con.commit()
+    _evict(con)
+
+
+def _evict(con):
+    """
+    Drop the least recently used responses until the cache fits in MAX_CACHE_BYTES.
+    """
+    total = con.execute("SELECT total FROM cache_size WHERE id = 0").fetchone()[0]
+    if total <= MAX_CACHE_BYTES:
+        return
+    con.execute("BEGIN IMMEDIATE")
+    # read again in the write transaction, another process may have evicted meanwhile
+    total = con.execute("SELECT total FROM cache_size WHERE id = 0").fetchone()[0]
+    to_delete = []
+    freed = 0
+    for key, size in con.execute("SELECT key, size FROM responses ORDER BY last_used"):
+        if total - freed <= MAX_CACHE_BYTES:
+            break
+        to_delete.append((key,))
+        freed += size
+    con.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+    con.execute("UPDATE cache_size SET total = total - ? WHERE id = 0", (freed,))
+    con.commit()
+
+
+def clear_cache():
+    con = _get_connection()
+    con.execute("DELETE FROM responses")
+    con.execute("UPDATE cache_size SET total = 0 WHERE id = 0")
+    con.commit()
+    _occurrences.clear()
@@ -1,6 +1,173 @@
-import pandas as pd
 from .mappings import mp_column_contexts, twenty_five_mp_questions
 
+# Column groups of the MP and VP records, in the order they are written to the prompt
+MP_BASIC_INFO = ['misperid', 'forenames', 'surname', 'dob', 'age', 'sex', 'pob', 'occdesc']
+MP_LOCATION_INFO = ['mf_address', 'missing_from', 'TL_address', 'residence_type']
+MP_TIMING_INFO = ['missing_since', 'date_reported_missing', 'day_reported_missing', 'when_traced', 'length_missing_mins']
+MP_RISK_INFO = ['initial_risk_level', 'current_final_risk_level']
+MP_PEOPLE_INFO = ['reported_missing_by']
+
+VP_BASIC_INFO = [r.lower() for r in [ 'VPD_FORENAME','VPD_SURNAME','VPD_KNOWNAS','VPD_MAIDEN_NAME', 'VPD_PERSONGENDER', 'VPD_PLACEOFBIRTH', 'VPD_PERSONETHNICAPPEARANCE', 'VPD_PERSONLANGUAGE', 'VPD_INTERPRETERREQID_FK', 'VPD_SCRA', 
+          'VPD_VPTYPEID_FK']]
+
+VP_RECORD_INFO =  [r.lower() for r in ['VPD_CREATEDON', 'VPD_LASTUPDATEDON', 'VPD_CREATEDON_1', 'VPD_CONSENTNAME','VPD_NOCONSENTREASON','VPD_GPCONSENT', 'VPD_NOGPCONSENTREASON', 'VPD_NOTINFORMEDREASON',  'VPD_THREEPOINTTEST', 'VPD_YOUTHATTITUDE', 'VPD_PARENTATTITUDE', 'VPD_NOMINALSVIEW']]
+
+VP_RISK_INFO =  [r.lower() for r in ['VPD_DISABILITY', 'VPD_DISABILITYDESC', 'VPD_WELLBEINGCOMMENTS', 'VPD_CHILDPROTECTION', 'VPD_REPEATVICTIM', 'VPD_REPEATPERPETRATOR' , 'vpd_serious_and_organised_crime_exploitation', 'vpd_stalking_and_harassment', 
+         'vpd_suicide_concern', 'vpd_violence_used', 'vpd_weapon_used__acra_only_', 'vpd_bullying', 
+         'vpd_child_at_locus', 'vpd_neglect', 'vpd_self_neglect', 'vpd_child_criminal_exploitation__cce_', 
+         'vpd_child_sexual_exploitation__cse_', 'vpd_community_triage_service', 'vpd_distress_brief_intervention__dbi_',
+         'vpd_dsdas', 'vpd_child_victim', 'vpd_child_witnessed', 'vpd_female_genital_mutilation__fgm_', 'vpd_forced_marriage__fm_', 
+         'vpd_gambling', 'vpd_honour_based_abuse__hba_', 'vpd_human_trafficking', 'vpd_looked_after_accommodated_child__laac_',
+         'vpd_missing_person', 'vpd_online_child_sexual_abuse_and_exploitation__ocsae_', 'vpd_pregnancy__unborn_baby_', 
+         'vpd_sexual_harm', 'vpd_elderly', 'vpd_attempted_suicide', 'vpd_financial', 'vpd_sight_loss', 'vpd_physical_disability',
+         'vpd_psychological_harm', 'vpd_self_harm', 'vpd_isolation', 'vpd_hearing_loss', 'vpd_alcohol_consumption', 'vpd_learning_disability',
+         'vpd_communication_needs', 'vpd_mental_health_issues', 'vpd_drug_consumption', 'vpd_other', 'vpd_radicalisation']]
+
+
+class CompiledSerializer:
+    """
+    Prompt layout for one dataframe schema, rendered column by column for all rows at once.
+
+    Each line of a report is either a constant or a prefix followed by a column value, with a mode:
+    - "plain": always written
+    - "notna": skipped when the value is missing
+    - "notna_yes_no": skipped when missing, 0/1 written as No/Yes
+    - "answer": No if the value is 0, otherwise Yes
+    """
+
+    def __init__(self, header, lines):
+        self.header = header
+        self.lines = lines
+
+    def _render_line(self, df, line):
+        if line[0] == "const":
+            return [line[1]] * len(df)
+        _, prefix, col, mode, suffix = line
+        values = df[col].tolist()
+        if mode == "plain":
+            return [f"{prefix}{v}{suffix}" for v in values]
+        if mode == "answer":
+            return [f"{prefix}{'No' if v==0 else 'Yes'}{suffix}" for v in values]
+        notna = df[col].notna().tolist()
+        if mode == "notna":
+            return [f"{prefix}{v}{suffix}" if ok else None for v, ok in zip(values, notna)]
+        return [f"{prefix}{_yes_no(v)}{suffix}" if ok else None for v, ok in zip(values, notna)]
+
+    def render(self, df):
+        """
+        Returns:
+        - list with the text of every report (row)
+        - str: the header followed by all reports
+        """
+        columns = [self._render_line(df, line) for line in self.lines]
+        chunks = ["\n".join(part for part in row if part is not None) for row in zip(*columns)]
+        return chunks, "\n".join([self.header] + chunks)
+
+
+def _yes_no(value):
+    if value in (0,'0'):
+        return 'No'
+    if value in (1,'1'):
+        return 'Yes'
+    return value
+
+
+def _value(prefix, col, mode="plain", suffix=""):
+    return ("value", prefix, col, mode, suffix)
+
+
+def _const(text):
+    return ("const", text)
+
+
+def compile_mp_serializer(columns, column_contexts, question_mapping):
+    lines = [_value("\nREPORT:  ", 'reportid', suffix=":")]
+    lines += [_value(f"  {column_contexts[col]}: ", col) for col in MP_BASIC_INFO]
+    for title, group in [("Location Information:", MP_LOCATION_INFO), ("Timing Information:", MP_TIMING_INFO), ("Risk Assessment:", MP_RISK_INFO)]:
+        if any(col in columns for col in group):
+            lines.append(_const(title))
+            lines += [_value(f"  {column_contexts[col]}: ", col) for col in group]
+    if any(col.lower() in columns for col in MP_PEOPLE_INFO):
+        lines.append(_const("Reported missing by:"))
+        lines += [_value(f"  {column_contexts[col]}: ", col) for col in MP_PEOPLE_INFO]
+
+    lines.append(_value("Circumstances: ", 'circumstances'))
+    lines.append(_value("Return Method: ", 'return_method_desc'))
+
+    # Questions and Answers
+    lines.append(_const("Risk Assessment Questions:"))
+    question_cols = [col for col in columns if col.startswith('q_') and not col.endswith('_explanation')]
+    for q_col in question_cols:
+        lines.append(_value(f"  {question_mapping[q_col]}: ", q_col, "answer"))
+        exp_col = f"{q_col}_explanation"
+        if exp_col in columns:
+            lines.append(_value("    Explanation: ", exp_col, "notna"))
+    return CompiledSerializer("MISSING PERSON RECORDS: ", lines)
+
+
+def compile_vp_serializer(columns, column_contexts):
+    lines = [_value("\nREPORT:  ", 'VPD_NOMINALINCIDENTID_PK'.lower(), suffix=":")]
+    lines += [_value(f"  {column_contexts[col]}: ", col, "notna") for col in VP_BASIC_INFO]
+    has_risks = any(col in columns for col in VP_RISK_INFO)
+    if has_risks:
+        lines.append(_const("Record:"))
+        lines += [_value(f"  {column_contexts[col]}: ", col, "notna_yes_no") for col in VP_RECORD_INFO]
+    lines.append(_value("Description: ", 'VPD_NOMINALSYNOPSIS'.lower()))
+    if has_risks:
+        lines.append(_const("Risks:"))
+        lines += [_value(f"  {column_contexts[col]}: ", col, "notna_yes_no") for col in VP_RISK_INFO]
+    return CompiledSerializer("VULNERABILITY RECORDS: ", lines)
+
+
+# (kind, columns, contents of the mappings) -> CompiledSerializer, the oldest dropped above MAX_COMPILED
+_compiled = {}
+MAX_COMPILED = 32
+
+
+def _get_serializer(kind, df, *mappings):
+    key = (kind, tuple(df.columns)) + tuple(repr(sorted(m.items(), key=repr)) for m in mappings)
+    if key not in _compiled:
+        compile_fn = compile_mp_serializer if kind == "mp" else compile_vp_serializer
+        if len(_compiled) >= MAX_COMPILED:
+            _compiled.pop(next(iter(_compiled)))
+        _compiled[key] = compile_fn(list(df.columns), *mappings)
+    return _compiled[key]
+
+
+def mp_serialize_chunks(df, column_contexts=mp_column_contexts, question_mapping=twenty_five_mp_questions):
+    """
+    Serialize a MP dataframe report by report.
+
+    Parameters:
+    - df: pandas DataFrame
+    - column_contexts: descriptions of the columns
+    - question_mapping: 25 questions at the end
+
+    Returns:
+    - list of str: one chunk per report
+    - str: Formatted string suitable for LLM input for MP data
+    """
+    if len(df) == 0:
+        return [], "MISSING PERSON RECORDS: "
+    return _get_serializer("mp", df, column_contexts, question_mapping).render(df)
+
+
+def vp_serialize_chunks(df, column_contexts):
+    """
+    Serialize a VP dataframe report by report.
+
+    Parameters:
+    - df: pandas DataFrame
+    - column_contexts: descriptions of the columns
+
+    Returns:
+    - list of str: one chunk per report
+    - str: Formatted string suitable for LLM input for VP data
+    """
+    if len(df) == 0:
+        return [], "VULNERABILITY RECORDS: "
+    return _get_serializer("vp", df, column_contexts).render(df)
+
 
 def mp_serialize_dataframe_for_llm(df, column_contexts, question_mapping):
     """
@@ -14,141 +181,14 @@ def mp_serialize_dataframe_for_llm(df, column_contexts, question_mapping):
     Returns:
     - str: Formatted string suitable for LLM input for MP data
     """
-    for i in range(1, 26):
-        q_col = f'q_{i}'
-        q_exp_col = f'q_{i}_explanation'
-        if q_col in df.columns:
-            column_contexts[q_col] = question_mapping[f'q_{i}']
-            column_contexts[q_exp_col] = f"Explanation: {i}"
-    
-    
-    output_parts = []
-    output_parts.append("MISSING PERSON RECORDS: ")
-    
-    basic_info =  ['misperid', 'forenames', 'surname', 'dob', 'age', 'sex', 'pob', 'occdesc']
-    location_info = ['mf_address', 'missing_from', 'TL_address', 'residence_type']
-    timing_info = ['missing_since', 'date_reported_missing', 'day_reported_missing', 'when_traced', 'length_missing_mins']
-    risk_info = ['initial_risk_level', 'current_final_risk_level']
-    people_info = ['reported_missing_by']
-
-    for _, row in df.iterrows():
-        output_parts.append(f"\nREPORT:  {row['reportid']}:")
-        
-        for col in basic_info:
-            output_parts.append(f"  {column_contexts[col]}: {row[col]}")
-        
-        if any(col in df.columns for col in location_info):
-            output_parts.append("Location Information:")
-            for col in location_info:
-                output_parts.append(f"  {column_contexts[col]}: {row[col]}")
-        
-        # Timing Information
-        if any(col in df.columns for col in timing_info):
-            output_parts.append("Timing Information:")
-            for col in timing_info:
-                output_parts.append(f"  {column_contexts[col]}: {row[col]}")
-        
-        # Risk Assessment
-        if any(col in df.columns for col in risk_info):
-            output_parts.append("Risk Assessment:")
-            for col in risk_info:
-                output_parts.append(f"  {column_contexts[col]}: {row[col]}")
-        
-        # Reported missing by
-        if any(col.lower() in df.columns for col in people_info):
-            output_parts.append("Reported missing by:")
-            for col in people_info:
-                output_parts.append(f"  {column_contexts[col]}: {row[col]}")
-                    
-        # Circumstances and Return Method
-        output_parts.append(f"Circumstances: {row['circumstances']}")
-        output_parts.append(f"Return Method: {row['return_method_desc']}")
-        
-        # Questions and Answers 
-        question_cols = [col for col in df.columns if col.startswith('q_') and not col.endswith('_explanation')]
-        output_parts.append("Risk Assessment Questions:")
-        for q_col in question_cols:
-            q_text = question_mapping[q_col]
-            answer = "No" if row[q_col]==0 else "Yes"
-            output_parts.append(f"  {q_text}: {answer}")
-                
-                
-            exp_col = f"{q_col}_explanation"
-            if exp_col in df.columns and pd.notna(row[exp_col]):
-                output_parts.append(f"    Explanation: {row[exp_col]}")
-    
-    return "\n".join(output_parts)
+    return mp_serialize_chunks(df, column_contexts, question_mapping)[1]
 
 def vp_serialize_dataframe_for_llm(df, column_contexts):
-    # VP Column Context Groupings
-
-    output_parts = []
-    output_parts.append("VULNERABILITY RECORDS: ")
-    
-    basic_info = [r.lower() for r in [ 'VPD_FORENAME','VPD_SURNAME','VPD_KNOWNAS','VPD_MAIDEN_NAME', 'VPD_PERSONGENDER', 'VPD_PLACEOFBIRTH', 'VPD_PERSONETHNICAPPEARANCE', 'VPD_PERSONLANGUAGE', 'VPD_INTERPRETERREQID_FK', 'VPD_SCRA', 
-                  'VPD_VPTYPEID_FK']]
-        
-    record_info =  [r.lower() for r in ['VPD_CREATEDON', 'VPD_LASTUPDATEDON', 'VPD_CREATEDON_1', 'VPD_CONSENTNAME','VPD_NOCONSENTREASON','VPD_GPCONSENT', 'VPD_NOGPCONSENTREASON', 'VPD_NOTINFORMEDREASON',  'VPD_THREEPOINTTEST', 'VPD_YOUTHATTITUDE', 'VPD_PARENTATTITUDE', 'VPD_NOMINALSVIEW']]
-
-    risk_info =  [r.lower() for r in ['VPD_DISABILITY', 'VPD_DISABILITYDESC', 'VPD_WELLBEINGCOMMENTS', 'VPD_CHILDPROTECTION', 'VPD_REPEATVICTIM', 'VPD_REPEATPERPETRATOR' , 'vpd_serious_and_organised_crime_exploitation', 'vpd_stalking_and_harassment', 
-                 'vpd_suicide_concern', 'vpd_violence_used', 'vpd_weapon_used__acra_only_', 'vpd_bullying', 
-                 'vpd_child_at_locus', 'vpd_neglect', 'vpd_self_neglect', 'vpd_child_criminal_exploitation__cce_', 
-                 'vpd_child_sexual_exploitation__cse_', 'vpd_community_triage_service', 'vpd_distress_brief_intervention__dbi_',
-                 'vpd_dsdas', 'vpd_child_victim', 'vpd_child_witnessed', 'vpd_female_genital_mutilation__fgm_', 'vpd_forced_marriage__fm_', 
-                 'vpd_gambling', 'vpd_honour_based_abuse__hba_', 'vpd_human_trafficking', 'vpd_looked_after_accommodated_child__laac_',
-                 'vpd_missing_person', 'vpd_online_child_sexual_abuse_and_exploitation__ocsae_', 'vpd_pregnancy__unborn_baby_', 
-                 'vpd_sexual_harm', 'vpd_elderly', 'vpd_attempted_suicide', 'vpd_financial', 'vpd_sight_loss', 'vpd_physical_disability',
-                 'vpd_psychological_harm', 'vpd_self_harm', 'vpd_isolation', 'vpd_hearing_loss', 'vpd_alcohol_consumption', 'vpd_learning_disability',
-                 'vpd_communication_needs', 'vpd_mental_health_issues', 'vpd_drug_consumption', 'vpd_other', 'vpd_radicalisation']]    
-    # risk_info = [r.lower() for r in risk_info]
-    # basic_info = [r.lower() for r in basic_info]
-    # record_info = [r.lower() for r in record_info]
-    
-    for _, row in df.iterrows():
-        output_parts.append(f"\nREPORT:  {row['VPD_NOMINALINCIDENTID_PK'.lower()]}:")
-        
-        # Basic info
-        for col in basic_info:
-            if pd.notna(row[col]):
-                output_parts.append(f"  {column_contexts[col]}: {row[col]}")
-        
-        # Record info
-        if any(col in df.columns for col in risk_info):
-            output_parts.append("Record:")
-            for col in record_info:
-                if pd.notna(row[col]):
-                    if row[col] in (0,'0'):
-                        output_parts.append(f"  {column_contexts[col]}: {'No'}")
-                    elif row[col] in (1,'1'):
-                        output_parts.append(f"  {column_contexts[col]}: {'Yes'}")
-                    else:
-                        output_parts.append(f"  {column_contexts[col]}: {row[col]}")
-            
-        
-        # Synopsis and Return Method
-        output_parts.append(f"Description: {row['VPD_NOMINALSYNOPSIS'.lower()]}")
-        
-        # General risk
-        if any(col in df.columns for col in risk_info):
-            output_parts.append("Risks:")
-            for col in risk_info:
-                if pd.notna(row[col]):
-                    if row[col] in (0,'0'):
-                        output_parts.append(f"  {column_contexts[col]}: {'No'}")
-                    elif row[col] in (1,'1'):
-                        output_parts.append(f"  {column_contexts[col]}: {'Yes'}")
-                    else:
-                        output_parts.append(f"  {column_contexts[col]}: {row[col]}")
-    return "\n".join(output_parts)
+    return vp_serialize_chunks(df, column_contexts)[1]
 
 
 def mp_serialize_dataframe_just_circumstances(df):
-    output_parts = []
-    for _, row in df.iterrows():
-    
-        output_parts.append(f"ID {row['reportid']}: {row['circumstances']}")
-        
-        
+    output_parts = [f"ID {reportid}: {circumstances}" for reportid, circumstances in zip(df['reportid'].tolist(), df['circumstances'].tolist())] if len(df) else []
     return "\n".join(output_parts)
 
 
@@ -156,10 +196,10 @@ def mp_serialize_dataframe_just_circumstances(df):
 def mp_serialize_dataframe_for_llm_cirumstancesonly(df):
     output_parts = []
     output_parts.append("MISSING PERSON RECORDS: ")
-
-    for _, row in df.iterrows():
-        output_parts.append(f"\nREPORT:  {row['reportid']}:")
-        output_parts.append(f"Circumstances: {row['circumstances']}")
+    if len(df):
+        for reportid, circumstances in zip(df['reportid'].tolist(), df['circumstances'].tolist()):
+            output_parts.append(f"\nREPORT:  {reportid}:")
+            output_parts.append(f"Circumstances: {circumstances}")
     
     return "\n".join(output_parts)
 
@@ -169,8 +209,9 @@ def vp_serialize_dataframe_for_llm_nominalsynopsisonly(df, column_contexts):
     output_parts = []
     output_parts.append("VULNERABILITY RECORDS: ")
     
-    for _, row in df.iterrows():
-        output_parts.append(f"\nREPORT:  {row['VPD_NOMINALINCIDENTID_PK'.lower()]}:")
+    if len(df):
+        for pk, synopsis in zip(df['VPD_NOMINALINCIDENTID_PK'.lower()].tolist(), df['VPD_NOMINALSYNOPSIS'.lower()].tolist()):
+            output_parts.append(f"\nREPORT:  {pk}:")
 
-        output_parts.append(f"Description: {row['VPD_NOMINALSYNOPSIS'.lower()]}")
+            output_parts.append(f"Description: {synopsis}")
     return "\n".join(output_parts)
\ No newline at end of file
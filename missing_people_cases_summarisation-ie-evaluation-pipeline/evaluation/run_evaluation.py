@@ -0,0 +1,191 @@
+import argparse
+import glob
+import importlib
+import multiprocessing
+import os
+import pickle
+import traceback
+
+import pandas as pd
+
+# Runs one of the evaluate_* functions over many cases, optionally on a pool of
+# worker processes, and checkpoints every case so an interrupted run can resume.
+
+RESULTS_DIR = "/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/RESULTS"
+DATA_DIR = "/home/pzl22/rds/hpc-work/llama-work/missing_people_cases_summarisation/DATA/fake"
+
+# evaluation name -> (evaluate function "module:function", results file name)
+EVALUATIONS = {
+    "people": ("evaluate_people:evaluate_people", "people"),
+    "locations": ("evaluate_location:evaluate_locations", "locations"),
+    "location_types": ("evaluate_location_types:evaluate_location_types", "location_types"),
+    "patterns": ("evaluate_patterns:evaluate_pattern_types", "patterns"),
+    "patterns_advanced": ("evaluate_patterns_advanced:evaluate_patterns_advanced", "patterns_advanced"),
+}
+
+
+def _checkpoint_dir(results_path):
+    return f"{results_path}_cases"
+
+
+def _case_file(results_path, misper_id, suffix="pkl"):
+    return os.path.join(_checkpoint_dir(results_path), f"{misper_id}.{suffix}")
+
+
+def completed_cases(results_path):
+    """
+    misperids (as strings) that already have a checkpointed result.
+    """
+    return {os.path.basename(p)[:-len(".pkl")] for p in glob.glob(os.path.join(_checkpoint_dir(results_path), "*.pkl"))}
+
+
+def load_results(results_path, misperids):
+    """
+    Checkpointed results of misperids, in the order of misperids, skipping cases without a result.
+    """
+    results = []
+    for misper_id in misperids:
+        path = _case_file(results_path, misper_id)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                results.append(pickle.load(f))
+    return results
+
+
+def write_results(results_path, misperids):
+    results = load_results(results_path, misperids)
+    df = pd.DataFrame(results)
+    df.to_pickle(f"{results_path}.pkl")
+    df.to_csv(f"{results_path}.csv")
+    return results
+
+
+def evaluate_case(evaluate_fn, mp_df_full, vp_df_full, misper_id, results_path):
+    """
+    Evaluate one case and checkpoint the result; a failure is written next to the checkpoints instead of raised.
+
+    Returns:
+    - (misper_id, True) if the case has a result, (misper_id, False) if it failed
+    """
+    try:
+        out_dict = evaluate_fn(mp_df_full, vp_df_full, misper_id)
+        out_dict['misperid'] = misper_id
+    except Exception:
+        print(f"Evaluation of {misper_id} failed")
+        traceback.print_exc()
+        with open(_case_file(results_path, misper_id, "failed.txt"), "w") as f:
+            f.write(traceback.format_exc())
+        return misper_id, False
+
+    # write then rename, so a crash never leaves a half written checkpoint behind
+    path = _case_file(results_path, misper_id)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(out_dict, f)
+    os.replace(path + ".tmp", path)
+    if os.path.exists(_case_file(results_path, misper_id, "failed.txt")):
+        os.remove(_case_file(results_path, misper_id, "failed.txt"))
+    return misper_id, True
+
+
+def _import_function(name):
+    module_name, function_name = name.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+# state of a pool worker, set by _init_worker
+_worker = {}
+
+
+def _init_worker(evaluate_name, mp_df_full, vp_df_full, results_path, devices):
+    # pin the worker to one GPU before torch is imported by the evaluation modules
+    if devices is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(devices.get())
+    from extraction.utils.ask_llama31 import warm_up_llama
+    warm_up_llama()
+    _worker.update(
+        evaluate_fn=_import_function(evaluate_name),
+        mp_df_full=mp_df_full,
+        vp_df_full=vp_df_full,
+        results_path=results_path,
+    )
+
+
+def _evaluate_in_worker(misper_id):
+    return evaluate_case(_worker['evaluate_fn'], _worker['mp_df_full'], _worker['vp_df_full'], misper_id, _worker['results_path'])
+
+
+def run_evaluation(evaluate_fn, mp_df_full, vp_df_full, misperids, results_path, workers=1, devices=None):
+    """
+    Evaluate every case of misperids, skipping the ones checkpointed by an earlier run.
+
+    Parameters:
+    - evaluate_fn: evaluate_* function, or its "module:function" name (required when workers > 1)
+    - mp_df_full, vp_df_full: full MP and VP data
+    - misperids: cases to evaluate
+    - results_path: results file path without extension; per-case checkpoints go to results_path + "_cases/"
+    - workers: number of worker processes, each with its own model; 1 evaluates in this process
+    - devices: GPU ids handed out to the workers one each (e.g. ["0", "1"]), or None to leave CUDA_VISIBLE_DEVICES alone
+
+    Returns:
+    - list of result dicts of the cases with a result, in the order of misperids
+    """
+    os.makedirs(_checkpoint_dir(results_path), exist_ok=True)
+    done = completed_cases(results_path)
+    todo = [misper_id for misper_id in misperids if str(misper_id) not in done]
+    print(f"{len(misperids) - len(todo)} cases already evaluated, {len(todo)} to go")
+
+    failed = []
+    if workers <= 1:
+        if isinstance(evaluate_fn, str):
+            evaluate_fn = _import_function(evaluate_fn)
+        for misper_id in todo:
+            _, ok = evaluate_case(evaluate_fn, mp_df_full, vp_df_full, misper_id, results_path)
+            if not ok:
+                failed.append(misper_id)
+            write_results(results_path, misperids)
+    else:
+        if not isinstance(evaluate_fn, str):
+            evaluate_fn = f"{evaluate_fn.__module__}:{evaluate_fn.__name__}"
+        # CUDA cannot be re-initialised in a forked child
+        context = multiprocessing.get_context("spawn")
+        device_queue = None
+        if devices:
+            device_queue = context.Manager().Queue()
+            for i in range(workers):
+                device_queue.put(devices[i % len(devices)])
+        with context.Pool(workers, initializer=_init_worker, initargs=(evaluate_fn, mp_df_full, vp_df_full, results_path, device_queue)) as pool:
+            for misper_id, ok in pool.imap_unordered(_evaluate_in_worker, todo):
+                if not ok:
+                    failed.append(misper_id)
+                write_results(results_path, misperids)
+
+    if failed:
+        print(f"{len(failed)} cases failed and will be retried on the next run: {failed}")
+    return write_results(results_path, misperids)
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Evaluate many cases in parallel with resumable per-case checkpoints.")
+    parser.add_argument("evaluation", choices=sorted(EVALUATIONS.keys()))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--devices", default=None, help="comma separated GPU ids, one per worker, e.g. 0,1")
+    parser.add_argument("--start", type=int, default=0, help="skip the first START cases in misperid order")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    mp_df_full = pd.read_csv(os.path.join(args.data_dir, "fake_mp_data.csv"))
+    vp_df_full = pd.read_csv(os.path.join(args.data_dir, "fake_vp_data.csv"))
+    vp_df_full.columns = vp_df_full.columns.str.lower()
+
+    misperids = sorted(mp_df_full['misperid'].drop_duplicates().to_list())[args.start:]
+
+    evaluate_name, results_name = EVALUATIONS[args.evaluation]
+    devices = args.devices.split(",") if args.devices else None
+    if args.workers <= 1:
+        from extraction.utils.ask_llama31 import warm_up_llama
+        warm_up_llama()
+    run_evaluation(evaluate_name, mp_df_full, vp_df_full, misperids, os.path.join(args.results_dir, results_name), workers=args.workers, devices=devices)
+    if args.workers <= 1:
+        from extraction.utils.ask_llama31 import shutdown_llama
+        shutdown_llama()
@@ -4,18 +4,22 @@ import pandas as pd
 import dash
 from dash import dcc, html, Input, Output, callback, State, ALL
 import plotly.express as px
-from collections import Counter, defaultdict
+from collections import Counter
 from urllib.parse import urlparse
 from rule_based.risk_questions_dicts import vpd_mapping
 from datetime import datetime, timedelta
 from utils.formatting import format_minutes
 from rule_based.create_rule_based_summary import CreateSummary, ReadCsvFiles
+from utils.case_store import load_frame
+from utils.render_cache import case_render_cache
+from src.case_data import load_case_data, case_frames
+from utils.lazy_sections import lazy_section, register_section, register_lazy_callbacks
 import os
 from src.map_functions import create_summ_mp_missing_from_found_locations_map
 from src.basic_info import create_person_overview
 from src.patterns_overview import patterns_section
-from src.locations_table import create_summ_mp_missing_from_found_locations_table
-from flask import request
+from src.locations_table import create_summ_mp_missing_from_found_locations_table, create_summ_mp_home_locations
+from utils.auth import require_password
 from src.helper_reports import create_question_card
 
 app = dash.Dash(__name__, suppress_callback_exceptions=True, external_stylesheets=['/assets/styles.css'])
@@ -27,84 +31,18 @@ dcc.Location(id='url', refresh=False)
 
 
 # Simple password protection
-@server.before_request
-def require_password():
-    auth = request.authorization
-    username = os.environ.get('AUTH_USERNAME', 'adsssmin')
-    password = os.environ.get('AUTH_PASSWORD', 'secret123')
-    
-    print(f"Using username: {username}")
-    print(f"Using password: {password}")
-    
-    if not auth or auth.username != username or auth.password != password:
-        return ('Please enter username and password', 401, {
-            'WWW-Authenticate': 'Basic realm="Protected Site"'
-        })
+server.before_request(require_password)
 
 
 # Data loading
-df_mp = pd.read_csv('DATA/mp_new_geolocations.csv')
-
-df_mp['dob'] = pd.to_datetime(df_mp['dob'])
-df_mp['missing_since'] = pd.to_datetime(df_mp['missing_since'])
-df_mp['date_reported_missing'] = pd.to_datetime(df_mp['date_reported_missing'])
-df_mp['whentraced'] = pd.to_datetime(df_mp['whentraced'])
-df_mp.loc[:, 'source'] = 'mp'
-df_vp = pd.read_csv('DATA/vp_new.csv')
-df_vp.rename(columns={"VPD_NOMINALINCIDENTID_PK": "reportid"}, inplace=True)
-df_vp.columns = df_vp.columns.str.replace('.', '_', regex=False).str.lower()
-
-df_phys = pd.read_csv('DATA/phys.csv')
-df_chr = pd.read_csv('DATA/chr_.csv')
+# parsed once into the shared case store (utils/case_store.py), which reloads a frame when its CSV changes,
+# so pages look the frames up with load_frame on every request; shared frames, do not modify in place
 read_csv_files = ReadCsvFiles()
-qs_comments_df = read_csv_files.qs_comments_df
-
-dict_dfs = {"mp": df_mp, "vp": df_vp, "phys": df_phys, "chr": df_chr}
 
+# report type in /report/<type>/<reportid> -> dataset of the case store
+REPORT_DATASETS = {"mp": "mp_geolocations", "vp": "vp_new", "phys": "phys_raw", "chr": "chr_raw"}
 
 
-def create_summ_mp_home_locations(mp_df_misperid):
-    """Create a compact home addresses display"""
-    if mp_df_misperid.empty:
-        return html.Div([
-            html.Div([
-                html.H4("Home Addresses", className="compact-section-title"),
-                html.P("No address data", className="no-data-compact")
-            ], className="compact-section empty-section")
-        ])
-    
-    # Get unique addresses
-    unique_addresses = mp_df_misperid['ha_address'].dropna().unique()
-    
-    address_duration = mp_df_misperid.groupby('ha_address')['missing_since'].agg(['min', 'max'])
-    address_duration['first_date'] = address_duration['min'].dt.strftime('%d-%m-%Y')
-    address_duration['last_date'] = address_duration['max'].dt.strftime('%d-%m-%Y')
-    address_duration = address_duration[['first_date', 'last_date']]
-    address_duration = address_duration.reset_index()
-    
-    print("WWWW", address_duration)
-    # Create compact address chips
-    address_chips = []
-    
-    for id, row in address_duration.iterrows(): 
-        address_chips.append(
-            html.Details([
-                html.Summary([
-                    html.Span(row['ha_address'], className="entity-name-large"),
-                    html.Span(str(row['first_date'] + " to " + str(row['last_date'])), className="comment-text-medium"),
-                ], className="home-address-prominent"),
-            ], className="home-address-prominent")
-        )
-           
-    content = html.Div(address_chips)
-    
-    return html.Div([
-        html.Div([
-            html.H4("Home Addresses", className="compact-section-title"),
-            html.Span(f"{len(unique_addresses)}", className="item-count-small")
-        ], className="compact-section-header"),
-        html.Div(content, className="address-chips-container")
-    ], className="compact-section")
 
 def create_mp_risk_questions_summary(mp_df_misperid):  
     binary_columns = [f'q_{i}' for i in range(1, 26)]
@@ -355,7 +293,7 @@ def create_pattern_quotes(case_id):
 
 def report_page(type, reportid):
     try:
-        df = dict_dfs[type]
+        df = load_frame(REPORT_DATASETS[type])
         row = df[df['reportid'] == int(reportid)].squeeze()
     except (ValueError, KeyError):
         return html.Div("Invalid report.", className="error-card")
@@ -421,102 +359,6 @@ def report_page(type, reportid):
 #         html.Div(comment, className="question-comment") if comment != 'No explanation provided' else None     
 #     ], className="question-card")
 
-def remove_leading_stop_words(text):
-    stop_words = ['the', 'a', 'an', 'and', 'or', 'of', 'in', 'to', 'for', 'with', 'by', 'at', 'on', 'from', 'as']
-    words = text.split()
-    while words and words[0].lower() in [sw.lower() for sw in stop_words]:
-        words.pop(0)
-    return ' '.join(words)
-
-def is_relevant(entity, irrelevant_list):
-    entity = remove_leading_stop_words(entity)
-    return not any(entity.lower().startswith(prefix.lower()) for prefix in irrelevant_list)
-
-def process_entities(file):
-    df = pd.read_csv(file, names=['id', 'type', 'value'])
-    irrelevant_entities = ['MP', 'nan']
-    
-    names_dict = defaultdict(list)
-    desc_dict = defaultdict(list)
-    
-    for _, row in df.iterrows():
-        if row['type'] == 'people_names_relations':
-            names_dict[row['value']].append(row['id'])
-        elif row['type'] == 'people_desc':
-            desc_dict[row['value']].append(row['id'])
-    
-    # Filter and sort
-    names_dict = {k: v for k, v in names_dict.items() if is_relevant(str(k), irrelevant_entities)}
-    desc_dict = {k: v for k, v in desc_dict.items() if is_relevant(str(k), irrelevant_entities)}
-    
-    names_summary = sorted([(entity, len(ids), ids) for entity, ids in names_dict.items()], 
-                          key=lambda x: x[1], reverse=True)
-    desc_summary = sorted([(entity, len(ids), ids) for entity, ids in desc_dict.items()], 
-                         key=lambda x: x[1], reverse=True)
-    
-    return names_summary, desc_summary
-
-def process_entities_locations(file):
-    df = pd.read_csv(file, names=['id', 'type', 'value'])
-    irrelevant_entities = ['MP', 'nan']
-    
-    addresses_dict = defaultdict(list)
-    locations_dict = defaultdict(list)
-    
-    for _, row in df.iterrows():
-        if row['type'] == 'addresses':
-            addresses_dict[row['value']].append(row['id'])
-        elif row['type'] == 'landmarks_other_locations':
-            locations_dict[row['value']].append(row['id'])
-    
-    # Filter and sort
-    addresses_dict = {k: v for k, v in addresses_dict.items() if is_relevant(str(k), irrelevant_entities)}
-    locations_dict = {k: v for k, v in locations_dict.items() if is_relevant(str(k), irrelevant_entities)}
-    
-    addresses_summary = sorted([(entity, len(ids), ids) for entity, ids in addresses_dict.items()], 
-                          key=lambda x: x[1], reverse=True)
-    locations_summary = sorted([(entity, len(ids), ids) for entity, ids in locations_dict.items()], 
-                         key=lambda x: x[1], reverse=True)
-    
-    return addresses_summary, locations_summary
-
-def load_case_data(case_id):
-    folder_path = f"NEW/{str(case_id)}/assosiation_network"
-    entities_path = os.path.join(folder_path, 'people_llama3.1_both.txt')
-    if not os.path.exists(folder_path):
-        names = []
-        descriptions = []
-    else:
-        names, descriptions = process_entities(entities_path)
-    narrative_path = os.path.join(folder_path, 'people_llama3.1_both_narrative.txt')
-    narrative_people = ""
-    if os.path.exists(narrative_path):
-        with open(narrative_path, 'r', encoding='utf-8') as f:
-            narrative_people = f.read()
-    
-    folder_path = f"NEW/{str(case_id)}/vul"
-    narrative_path = os.path.join(folder_path, 'vul_llama3.1_narrative.txt')
-    narrative_vul = ""
-    if os.path.exists(narrative_path):
-        with open(narrative_path, 'r', encoding='utf-8') as f:
-            narrative_vul = f.read()
-    
-    folder_path = f"NEW/{str(case_id)}/locations"
-    entities_path = os.path.join(folder_path, 'locations3.1_both.txt')
-    if not os.path.exists(folder_path):
-        addresses = []
-        locations = []
-    else:
-        addresses, locations = process_entities_locations(entities_path)
-    
-    narrative_path = os.path.join(folder_path, 'locations3.1_both_narrative.txt')
-    narrative_locations = ""
-    if os.path.exists(narrative_path):
-        with open(narrative_path, 'r', encoding='utf-8') as f:
-            narrative_locations = f.read()
-
-    return narrative_people, names, descriptions,narrative_locations,  addresses, locations, narrative_vul
-
 def create_entity_section_large(entities, title, icon, max_items=12):
     """Create larger entity section with clickable cells that reveal report tags"""
     if not entities:
@@ -659,153 +501,112 @@ def create_simple_pattern(icon, label, value):
     ], className="stat-chip-horizontal stat-chip-simple")
 
     
-def summary_page(case_id):
-    try:
-        df_mp_misperid = df_mp[df_mp['misperid']==int(case_id)]
-        df_vp_misperid = df_vp[df_vp['misper_misperid']==int(case_id)]
+def build_patterns_section(case_id):
+    df_mp_misperid, df_vp_misperid = case_frames(case_id)
+    return patterns_section(df_mp_misperid, df_vp_misperid, case_id, includenarrative=True)
+
+
+def build_people_section(case_id):
+    narrative_people, names, descriptions, _, _, _, _ = load_case_data(case_id)
+    return [
+        # Overview card
+        html.Div([
+            html.Div([
+                html.H4("🤖"),
+                html.P(narrative_people if narrative_people.strip() else "No narrative available.", 
+                       className="narrative-text")
+            ], className="card-content")
+        ], className="overview-card"),
         
-        narrative_people, names, descriptions, narrative_locations, addresses, locations, narrative_vul = load_case_data(case_id)
+        # Entity sections - now larger
+        html.Div([
+            create_entity_section_large(names, "People & Relations", "🤖"),
+            create_entity_section_large(descriptions, "Other Entities", "🤖")
+        ], className="entities-container-large")
+    ]
+
+
+def build_vulnerabilities_section(case_id):
+    df_mp_misperid, df_vp_misperid = case_frames(case_id)
+    narrative_vul = load_case_data(case_id)[6]
+    return [
+        html.Div([
+            html.Div([
+                html.H4("🤖"),
+                html.P(narrative_vul if narrative_vul.strip() else "No narrative available.", 
+                       className="narrative-text")
+            ], className="card-content" )
+        ], className="overview-card"),
         
-        if narrative_people is None:
-            return html.Div([
-                html.Div([
-                    html.H1("Case Not Found", className="error-title"),
-                    html.P(f"Case {case_id} could not be loaded", className="error-message"),
-                    dcc.Link("← Back to Home", href="/", className="btn btn-primary")
-                ], className="error-container")
-            ], className="error-page")
-            
-        if narrative_locations is None:
-            return html.Div([
-                html.Div([
-                    html.H1("Case Not Found", className="error-title"),
-                    html.P(f"Case {case_id} could not be loaded", className="error-message"),
-                    dcc.Link("← Back to Home", href="/", className="btn btn-primary")
-                ], className="error-container")
-            ], className="error-page")
+        create_vp_risk_questions_summary(df_vp_misperid),
+        create_mp_risk_questions_summary(df_mp_misperid),
+    ]
+
+
+def build_locations_section(case_id):
+    df_mp_misperid, _ = case_frames(case_id)
+    _, _, _, narrative_locations, addresses, locations, _ = load_case_data(case_id)
+    return [
+        # Overview card
+        html.Div([
+            html.Div([
+                html.H4("🤖"),
+                html.P(narrative_locations if narrative_locations.strip() else "No narrative available.", 
+                       className="narrative-text")
+            ], className="card-content")
+        ], className="overview-card"),
         
-        if narrative_vul is None:
-            return html.Div([
-                html.Div([
-                    html.H1("Case Not Found", className="error-title"),
-                    html.P(f"Case {case_id} could not be loaded", className="error-message"),
-                    dcc.Link("← Back to Home", href="/", className="btn btn-primary")
-                ], className="error-container")
-            ], className="error-page")
+        # Location sections - prominent missing/found table at top
+        create_summ_mp_home_locations(df_mp_misperid),
+        create_summ_mp_missing_from_found_locations_table(df_mp_misperid),
         
-        return html.Div([
-            # Header
+        html.Div([
+            create_entity_section_large(addresses, "Other mentioned addresses", "🤖"),
+            create_entity_section_large(locations, "Other mentioned locations", "🤖")
+        ], className="entities-container-large")
+    ]
+
+
+def render_summary_page(case_id):
+    # only the header and overview are built here, the sections load when they are expanded
+    df_mp_misperid, _ = case_frames(case_id)
+    
+    return html.Div([
+        # Header
+        html.Div([
+            html.H1(f"Case {case_id}", className="case-title"),
             html.Div([
-                html.H1(f"Case {case_id}", className="case-title"),
-                html.Div([
-                    html.Span("Association Network Analysis", className="subtitle"),
-                    dcc.Link("← Home", href="/", className="btn btn-outline btn-sm")
-                ], className="header-actions")
-            ], className="page-header"),
+                html.Span("Association Network Analysis", className="subtitle"),
+                dcc.Link("← Home", href="/", className="btn btn-outline btn-sm")
+            ], className="header-actions")
+        ], className="page-header"),
+    
+        # Main content in single column layout
+        html.Div([
+            create_person_overview(df_mp_misperid, ['reportid', 'forenames', 'surname', 'ha_address', 'residence_type','label', 'sex', 'dob', 'pob', 'occdesc']),
+            lazy_section("patterns", case_id, "Patterns"),
+            lazy_section("people", case_id, "People & Relations", icon="🤖"),
+            lazy_section("vulnerabilities", case_id, "Vulnerabilities"),
+            lazy_section("locations", case_id, "Location Information", header_class="column-header-locations"),
+        ], className="main-content-single-column")
         
-            # Main content in single column layout
-            html.Div([
-                create_person_overview(df_mp_misperid, ['reportid', 'forenames', 'surname', 'ha_address', 'residence_type','label', 'sex', 'dob', 'pob', 'occdesc']),
-                # Patterns Section
-                
-                html.Details([
-                    html.Summary([
-                        html.Div([
-                            html.H2("Patterns", className="column-title-main")
-                        ], className="dropdown-summary-content"),
-                        html.Span("▼", className="dropdown-arrow")
-                    ], className="column-header-people dropdown-summary"),
-                    html.Div([
-                    patterns_section(df_mp_misperid, df_vp_misperid, case_id, includenarrative=True),
+    ], className="summary-page-single")
 
-                    ], className="dropdown-content")
-                ], className="dropdown-section", open=False),
-            
-                
-                # People & Relations
-                html.Details([
-                    html.Summary([
-                        html.Div([
-                            html.H2("🤖"),
-                            html.H2("People & Relations", className="column-title-main")
-                        ], className="dropdown-summary-content"),
-                        html.Span("▼", className="dropdown-arrow")
-                    ], className="column-header-people dropdown-summary"),
-                    html.Div([
-                        # Overview card
-                        html.Div([
-                            html.Div([
-                                html.H4("🤖"),
-                                html.P(narrative_people if narrative_people.strip() else "No narrative available.", 
-                                       className="narrative-text")
-                            ], className="card-content")
-                        ], className="overview-card"),
-                        
-                        # Entity sections - now larger
-                        html.Div([
-                            create_entity_section_large(names, "People & Relations", "🤖"),
-                            create_entity_section_large(descriptions, "Other Entities", "🤖")
-                        ], className="entities-container-large")
-                    ], className="dropdown-content")
-                ], className="dropdown-section", open=False),
-                
-                # Vulnerabilities
-                html.Details([
-                    html.Summary([
-                        html.Div([
-                            html.H2("Vulnerabilities", className="column-title-main")
-                        ], className="dropdown-summary-content"),
-                        html.Span("▼", className="dropdown-arrow")
-                    ], className="column-header-people dropdown-summary"),
-                    html.Div([
-                        html.Div([
-                            html.Div([
-                                html.H4("🤖"),
-                                html.P(narrative_vul if narrative_vul.strip() else "No narrative available.", 
-                                       className="narrative-text")
-                            ], className="card-content" )
-                        ], className="overview-card"),
-                        
-                        
-                        
-                        create_vp_risk_questions_summary(df_vp_misperid),
-                        create_mp_risk_questions_summary(df_mp_misperid),
-                    ], className="dropdown-content")
-                ], className="dropdown-section", open=False),
-
-                # Location Information
-                html.Details([
-                    html.Summary([
-                        html.Div([
-                            html.H2("Location Information", className="column-title-main")
-                        ], className="dropdown-summary-content"),
-                        html.Span("▼", className="dropdown-arrow")
-                    ], className="column-header-locations dropdown-summary"),
-                    html.Div([
-                        # Overview card
-                        html.Div([
-                            html.Div([
-                                html.H4("🤖"),
-                                html.P(narrative_locations if narrative_locations.strip() else "No narrative available.", 
-                                       className="narrative-text")
-                            ], className="card-content")
-                        ], className="overview-card"),
-                        
-                        # Location sections - prominent missing/found table at top
-                        create_summ_mp_home_locations(df_mp_misperid),
-                        create_summ_mp_missing_from_found_locations_table(df_mp_misperid),
-                        
-                        html.Div([
-                            create_entity_section_large(addresses, "Other mentioned addresses", "🤖"),
-                            create_entity_section_large(locations, "Other mentioned locations", "🤖")
-                        ], className="entities-container-large")
-                    ], className="dropdown-content")
-                ], className="dropdown-section", open=False)
-                
-            ], className="main-content-single-column")
-            
-        ], className="summary-page-single")
-        
+
+summary_cache = case_render_cache(render_summary_page, "page")
+for section_name, build_section_fn in [
+    ("patterns", build_patterns_section),
+    ("people", build_people_section),
+    ("vulnerabilities", build_vulnerabilities_section),
+    ("locations", build_locations_section),
+]:
+    register_section(section_name, case_render_cache(build_section_fn, f"{section_name} section").get)
+
+
+def summary_page(case_id):
+    summary_cache.start_prewarming()
+    try:
+        return summary_cache.get(case_id)
     except Exception as e:
         return html.Div([
             html.Div([
@@ -849,6 +650,8 @@ app.layout = html.Div([
     html.Div(id='page-content')
 ])
 
+register_lazy_callbacks(app)
+
 @app.callback(
     Output('page-content', 'children'),
     [Input('url', 'pathname')]
@@ -0,0 +1,97 @@
+import importlib
+import dash
+from dash import dcc, html, Input, Output, State
+from utils.auth import require_password
+from utils.lazy_sections import register_lazy_callbacks
+
+# One Dash app serving all concept dashboards, instead of one server per concept.
+# The concepts' page builders are used as they are and share the process-wide
+# data (utils/case_store.py) and render caches (utils/render_cache.py).
+# /<concept>/... selects a concept; the links inside the pages (/, /summary_people/<id>,
+# /report/<type>/<id>) stay within the selected concept.
+
+# route name -> (module with the concept's pages, title)
+CONCEPTS = {
+    "app": ("app", "Association Network"),
+    "concept2": ("app_concept2", "Concept 2"),
+    "concept3": ("app_concept3", "Concept 3"),
+    "combined": ("app_concept_combined", "Combined"),
+}
+DEFAULT_CONCEPT = "app"
+
+
+def concept_bar(current):
+    """
+    Links switching between the concepts, the current one highlighted.
+    """
+    return html.Div([
+        dcc.Link(title, href=f"/{name}", className="btn btn-primary btn-sm" if name == current else "btn btn-outline btn-sm")
+        for name, (_, title) in CONCEPTS.items()
+    ], className="header-actions")
+
+
+def create_dashboard():
+    """
+    Dash app with every concept of CONCEPTS as a route.
+
+    Returns:
+    - dash.Dash app; its Flask server is app.server
+    """
+    # the concept modules load the shared data and register their lazy sections on import
+    modules = {name: importlib.import_module(module) for name, (module, _) in CONCEPTS.items()}
+
+    app = dash.Dash(__name__, suppress_callback_exceptions=True, external_stylesheets=['/assets/styles.css'])
+    app.server.before_request(require_password)
+
+    app.layout = html.Div([
+        dcc.Location(id='url', refresh=False),
+        # concept of the links inside the pages, kept per browser tab
+        dcc.Store(id='concept', storage_type='session'),
+        html.Div(id='page-content')
+    ])
+
+    register_lazy_callbacks(app)
+
+    @app.callback(
+        Output('page-content', 'children'),
+        Output('concept', 'data'),
+        Input('url', 'pathname'),
+        State('concept', 'data'),
+    )
+    def display_page(pathname, concept):
+        parts = [part for part in (pathname or "/").split("/") if part]
+        if parts and parts[0] in CONCEPTS:
+            concept = parts.pop(0)
+        if concept not in CONCEPTS:
+            concept = DEFAULT_CONCEPT
+        module = modules[concept]
+
+        if not parts:
+            page = module.home_page()
+        elif parts[0] == "summary_people" and len(parts) >= 2:
+            page = module.summary_page(parts[1])
+        elif parts[0] == "report" and len(parts) == 3:
+            page = module.report_page(parts[1], parts[2])
+        else:
+            page = html.Div("404 - Page Not Found", className="error-card")
+        return html.Div([concept_bar(concept), page]), concept
+
+    @app.callback(
+        Output('url', 'pathname'),
+        [Input('load-button', 'n_clicks')],
+        [State('case-id-input', 'value')]
+    )
+    def navigate_to_summary(n_clicks, case_id):
+        if n_clicks and case_id:
+            return f'/summary_people/{case_id}'
+        return dash.no_update
+
+    app.index_string = modules[DEFAULT_CONCEPT].app.index_string
+    return app
+
+
+app = create_dashboard()
+server = app.server
+
+if __name__ == '__main__':
+    app.run(debug=True, port=8051)
@@ -0,0 +1,14 @@
+import multiprocessing
+import os
+
+# gunicorn settings of the dashboards, see wsgi.py
+
+wsgi_app = "wsgi:create_app()"
+bind = os.getenv("DASH_BIND", "0.0.0.0:8051")
+workers = int(os.getenv("DASH_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("DASH_THREADS", "4"))
+# load the data once in the master before forking the workers
+preload_app = True
+# summary pages of long cases can take a while to build
+timeout = int(os.getenv("DASH_TIMEOUT", "120"))
+accesslog = "-"
@@ -2,6 +2,7 @@ import pandas as pd
 from rule_based.risk_questions_dicts import vpd_mapping, risk_assessment_questions
 from datetime import datetime
 from dash import html, dcc
+from utils.case_store import load_frame, case_rows
 
 @pd.api.extensions.register_dataframe_accessor("clean")
 class CleanAccessor:
@@ -37,54 +38,22 @@ class ReadCsvFiles:
         self.risk_questions_dict = risk_assessment_questions
         self.vpd_statements_dict = vpd_mapping
 
+    # the frames come from the shared case store, so they are parsed once per process
+    # and shared between instances; do not modify them in place
     def read_mp_df(self):
-        mp_df = pd.read_csv('./DATA/mp.csv', encoding='utf-8')
-        mp_df = mp_df.clean.lowercase_headers().clean.strip_strings()
-
-        mp_df['dob'] = pd.to_datetime(mp_df['dob'])
-        mp_df['missing_since'] = pd.to_datetime(mp_df['missing_since'])
-        mp_df['date_reported_missing'] = pd.to_datetime(mp_df['date_reported_missing'])
-        mp_df['whentraced'] = pd.to_datetime(mp_df['whentraced'])
-        mp_df.loc[:, 'source'] = 'mp'
-        
-        return mp_df
+        return load_frame("mp")
 
     def read_vpd_df(self):
-        vp_df = pd.read_csv('./DATA/vp.csv', encoding='utf-8')
-        vp_df = vp_df.clean.lowercase_headers().clean.strip_strings()
-        vp_df.loc[:, 'source'] = 'vp'
-        print(vp_df['vpd_lastupdatedon_1'][0])
-        vp_df['vpd_createdon'] = pd.to_datetime(
-            vp_df['vpd_createdon'].str.replace('Z\[UTC\]', '', regex=True), format='mixed'
-        )
-        vp_df['vpd_createdon_1'] = pd.to_datetime(
-            vp_df['vpd_createdon_1'].str.replace('Z\[UTC\]', '', regex=True), format='mixed'
-        )
-        vp_df['vpd_lastupdatedon_1'] = pd.to_datetime(
-            vp_df['vpd_lastupdatedon_1'].str.replace('Z\[UTC\]', '', regex=True), format='mixed'
-        )
-    
-        vp_df.loc[:, 'source'] = 'vp'
-        return vp_df
+        return load_frame("vp")
     
     def read_chr_df(self):
-        chr_df = pd.read_csv('./DATA/chr_.csv')
-        chr_df.clean.lowercase_headers().clean.strip_strings()
-        chr_df['contactdate'] = pd.to_datetime(
-            chr_df['contactdate'], format='mixed'
-        )
-        return chr_df
+        return load_frame("chr")
     
     def read_phys_df(self):
-        phys_df = pd.read_csv('./DATA/phys.csv')
-        phys_df.clean.lowercase_headers().clean.strip_strings()
-
-        return phys_df
+        return load_frame("phys")
     
     def read_qs_comments_df(self):
-        qs_comments_df =  pd.read_csv('./DATA/qs_comments.csv')
-        qs_comments_df.clean.lowercase_headers().clean.strip_strings()
-        return qs_comments_df
+        return load_frame("qs_comments")
         
 
 
@@ -94,25 +63,26 @@ class CreateSummary:
         self.summ_file = open('summary_' + str(misperid)+'.txt', "w+")
         
         self.misperid = misperid
-        self.mp_df_misperid = self.extract_for_misperid(self.csv_files.mp_df, 'misperid', misperid)
+        self.mp_df_misperid = self.extract_for_misperid("mp", 'misperid', misperid)
         self.mp_df_misperid.sort_values(by="missing_since",  ascending=False, inplace=True)
 
-        self.vp_df_misperid = self.extract_for_misperid(self.csv_files.vp_df, 'misper_misperid', misperid)
+        self.vp_df_misperid = self.extract_for_misperid("vp", 'misper_misperid', misperid)
         self.vp_df_misperid.sort_values(by="vpd_createdon",   ascending=False, inplace=True)
 
-        self.phys_df_misperid = self.extract_for_misperid(self.csv_files.phys_df, 'misperid', misperid)
-        self.qs_comments_df_misperid = self.extract_for_misperid(self.csv_files.qs_comments_df, 'misperid', misperid)
+        self.phys_df_misperid = self.extract_for_misperid("phys", 'misperid', misperid)
+        self.qs_comments_df_misperid = self.extract_for_misperid("qs_comments", 'misperid', misperid)
         
         if len(self.vp_df_misperid['vpd_nominalid_fk'].drop_duplicates()) > 1:
             raise ValueError("Wrong extraction - duplicates in vp dataframe.")
         nominalid_fk = self.vp_df_misperid['vpd_nominalid_fk'].drop_duplicates().to_list()[0]
         
-        self.chr_df_misperid = self.extract_for_misperid(self.csv_files.chr_df, 'nominalid_fk', nominalid_fk)
+        self.chr_df_misperid = self.extract_for_misperid("chr", 'nominalid_fk', nominalid_fk)
 
         
-    def extract_for_misperid(self, df, col, val):
+    def extract_for_misperid(self, name, col, val):
+        # case slice from the per-person index of the case store instead of a full table scan
         try:
-            return df[df[col]==val]
+            return case_rows(name, col, val)
         except:
             raise ValueError("Wrong column of value passed.")
         
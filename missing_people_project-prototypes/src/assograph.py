@@ -6,11 +6,11 @@ import numpy as np
 import networkx as nx
 from collections import defaultdict, Counter
 import json
-import math
 from utils.date_from_report_id import date_from_reportid
+from utils.graph_layout import separate_overlapping_nodes, layout_cache
 
 
-def create_association_network_graph(overview, df, config=None):
+def create_association_network_graph(overview, df, config=None, case_id=None):
     """
     Creates an interactive network graph visualization from relationship data.
     
@@ -33,6 +33,11 @@ def create_association_network_graph(overview, df, config=None):
             - 'show_labels': Boolean, whether to show node labels (default: True)
             - 'edge_color_by': 'type', 'weight' (default: 'type')
             - 'filter_min_degree': Minimum node degree to include (default: 1)
+            - 'large_graph_threshold': Node count above which WebGL traces, a single edge trace
+              and labels for only the 'max_labels' best connected nodes are used (default: 150)
+            - 'collapse_threshold': Node count above which every community is drawn as one node (default: 400)
+        
+        case_id: Case of the graph, its layout is stored with the case's layouts (optional)
     
     Returns:
         html.Details component containing the network graph and statistics
@@ -67,7 +72,11 @@ def create_association_network_graph(overview, df, config=None):
         'edge_color_by': 'type',
         'filter_min_degree': 1,
         'node_size_range': [80, 140],  # Slightly smaller nodes to reduce overlap
-        'edge_width_range': [2, 6]     # Thinner edges
+        'edge_width_range': [2, 6],    # Thinner edges
+        'large_graph_threshold': 150,  # Above this many nodes: WebGL traces and fewer labels
+        'collapse_threshold': 400,     # Above this many nodes: one node per community
+        'max_labels': 40,              # Labels shown in a large graph, best connected nodes first
+        'large_node_size_range': [10, 40]
     }
     
     if config:
@@ -201,39 +210,9 @@ def create_association_network_graph(overview, df, config=None):
             ], className="locations-dropdown-content")
         ], className="locations-section-prominent", open=True)
     
-    # Calculate layout positions with improved spacing parameters
-    num_nodes = len(G.nodes())
-    
-    if config['layout'] == 'spring':
-        # Improved spring layout with better spacing
-        # k controls the optimal distance between nodes
-        k = max(5, num_nodes * 0.5)  # Adaptive spacing based on number of nodes
-        pos = nx.spring_layout(
-            G, 
-            k=k,                    # Optimal distance between nodes
-            iterations=200,         # More iterations for better convergence
-            seed=42,
-            scale=3.0              # Larger scale for more spread
-        )
-    elif config['layout'] == 'circular':
-        pos = nx.circular_layout(G, scale=3.5)  # Increased scale
-    elif config['layout'] == 'kamada_kawai':
-        try:
-            pos = nx.kamada_kawai_layout(G, scale=3.0)
-        except:
-            # Fallback to spring if kamada_kawai fails
-            pos = nx.spring_layout(G, k=5, iterations=200, seed=42, scale=3.0)
-    else:  # random
-        pos = nx.random_layout(G, seed=42)
-        # Scale up random positions
-        pos = {node: (coord[0] * 4, coord[1] * 4) for node, coord in pos.items()}
-    
-    # Post-process positions to reduce overlaps using force-directed adjustment
-    pos = adjust_positions_for_overlap(pos, G, min_distance=0.3)
-    
-    # Calculate node metrics
-    degree_centrality = nx.degree_centrality(G)
-    betweenness_centrality = nx.betweenness_centrality(G)
+    # Layout positions, reused from the case's layout cache when the graph was laid out before
+    pos = layout_cache.get(G, lambda G: compute_layout(G, config['layout']), case_id=case_id, name=f"association_{config['layout']}",
+                           incremental=config['layout'] in ('spring', 'kamada_kawai'))
     
     # Detect communities
     try:
@@ -245,6 +224,24 @@ def create_association_network_graph(overview, df, config=None):
     except:
         community_map = {node: 0 for node in G.nodes()}
     
+    # Large graphs are drawn with WebGL traces, fewer labels and, above collapse_threshold, one node per community
+    large_graph = len(G.nodes()) > config['large_graph_threshold']
+    if large_graph and len(G.nodes()) > config['collapse_threshold']:
+        G_plot, pos_plot, community_map = collapse_communities(G, pos, community_map)
+        config['color_by'] = 'community'
+    else:
+        G_plot, pos_plot = G, pos
+    if large_graph:
+        config['node_size_range'] = config['large_node_size_range']
+    Scatter = go.Scattergl if large_graph else go.Scatter
+    
+    # Labels only for the best connected nodes of a large graph
+    degrees = dict(G_plot.degree())
+    max_degree = max(degrees.values()) if degrees and max(degrees.values()) > 0 else 1
+    labelled_nodes = set(G_plot.nodes())
+    if large_graph:
+        labelled_nodes = set(sorted(G_plot.nodes(), key=lambda node: degrees[node], reverse=True)[:config['max_labels']])
+    
     # Prepare node data
     node_x = []
     node_y = []
@@ -267,13 +264,13 @@ def create_association_network_graph(overview, df, config=None):
     degree_colors = px.colors.sequential.Plasma
     community_colors = px.colors.qualitative.Set3
     
-    for node in G.nodes():
-        x, y = pos[node]
+    for node in G_plot.nodes():
+        x, y = pos_plot[node]
         node_x.append(x)
         node_y.append(y)
         
         # Node label with improved line breaks
-        label = G.nodes[node].get('label', node)
+        label = G_plot.nodes[node].get('label', node)
         # Intelligent label splitting for better readability
         if len(label) > 20:
             words = label.split()
@@ -292,12 +289,12 @@ def create_association_network_graph(overview, df, config=None):
                 mid = len(words) // 2
                 label = ' '.join(words[:mid]) + '<br>' + ' '.join(words[mid:])
         
-        node_text.append(label if config['show_labels'] else '')
+        node_text.append(label if config['show_labels'] and node in labelled_nodes else '')
         
         # Node hover info
-        degree = G.degree(node)
-        node_type = G.nodes[node].get('type', 'unknown')
-        node_reportid = G.nodes[node].get('reportid', 'N/A')
+        degree = degrees[node]
+        node_type = G_plot.nodes[node].get('type', 'unknown')
+        node_reportid = G_plot.nodes[node].get('reportid', 'N/A')
         
         # Handle multiple report IDs
         if isinstance(node_reportid, str) and ',' in node_reportid:
@@ -305,26 +302,30 @@ def create_association_network_graph(overview, df, config=None):
         else:
             reportid_display = f"Report ID: {node_reportid}"
         
-        neighbors = list(G.neighbors(node))
-        neighbor_labels = [G.nodes[n].get('label', n) for n in neighbors[:5]]
+        neighbors = list(G_plot.neighbors(node))
+        neighbor_labels = [G_plot.nodes[n].get('label', n) for n in neighbors[:5]]
         neighbor_text = ", ".join(neighbor_labels)
         if len(neighbors) > 5:
             neighbor_text += f" (and {len(neighbors) - 5} more)"
         
-        info = f"<b>{G.nodes[node].get('label', node)}</b><br>"
+        info = f"<b>{G_plot.nodes[node].get('label', node)}</b><br>"
         info += f"ID: {node}<br>"
         info += f"Type: {node_type}<br>"
         info += f"{reportid_display}<br>"
         info += f"Connections: {degree}<br>"
         info += f"Connected to: {neighbor_text}"
+        members = G_plot.nodes[node].get('members')
+        if members:
+            member_text = ", ".join(str(G.nodes[member].get('label', member)) for member in members[:10])
+            if len(members) > 10:
+                member_text += f" (and {len(members) - 10} more)"
+            info += f"<br>Members: {member_text}"
         node_info.append(info)
         
         # Node color
         if config['color_by'] == 'type':
-            node_type = G.nodes[node].get('type', 'unknown')
             node_colors.append(type_colors.get(node_type, type_colors['unknown']))
         elif config['color_by'] == 'degree':
-            max_degree = max(dict(G.degree()).values())
             color_idx = int((degree / max_degree) * (len(degree_colors) - 1))
             node_colors.append(degree_colors[color_idx])
         else:  # community
@@ -332,12 +333,11 @@ def create_association_network_graph(overview, df, config=None):
             node_colors.append(community_colors[comm_idx])
         
         # Node size
-        if config['node_size_column'] and config['node_size_column'] in df.columns:
-            # Use specified column for sizing (would need additional logic)
-            size = config['node_size_range'][0] + (degree / max(dict(G.degree()).values())) * (config['node_size_range'][1] - config['node_size_range'][0])
+        if members:
+            # Community super-nodes by the number of people in them
+            size = config['node_size_range'][0] + min(1, len(members) / 50) * (config['node_size_range'][1] - config['node_size_range'][0])
         else:
-            # Size by degree
-            max_degree = max(dict(G.degree()).values()) if G.nodes() else 1
+            # Size by degree (also when node_size_column is given, which would need additional logic)
             size = config['node_size_range'][0] + (degree / max_degree) * (config['node_size_range'][1] - config['node_size_range'][0])
         node_sizes.append(size)
     
@@ -370,9 +370,11 @@ def create_association_network_graph(overview, df, config=None):
         'sighting': '#F39C12'
     }
     
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
+    max_weight = max([G_plot.edges[e].get('weight', 1) for e in G_plot.edges()], default=1)
+    
+    for edge in G_plot.edges():
+        x0, y0 = pos_plot[edge[0]]
+        x1, y1 = pos_plot[edge[1]]
         
         edge_x.extend([x0, x1, None])
         edge_y.extend([y0, y1, None])
@@ -390,7 +392,7 @@ def create_association_network_graph(overview, df, config=None):
         edge_labels_y.append(mid_y)
         
         # Edge info and label
-        edge_data = G.edges[edge]
+        edge_data = G_plot.edges[edge]
         relationship = edge_data.get('relationship', 'connected')
         weight = edge_data.get('weight', 1)
         source_label = edge_data.get('source_label', edge[0])
@@ -413,7 +415,6 @@ def create_association_network_graph(overview, df, config=None):
         
         # Edge color
         if config['edge_color_by'] == 'weight':
-            max_weight = max([G.edges[e].get('weight', 1) for e in G.edges()])
             color_intensity = weight / max_weight
             edge_colors.append(f'rgba(100, 100, 100, {0.2 + 0.6 * color_intensity})')
         else:  # by type
@@ -425,59 +426,80 @@ def create_association_network_graph(overview, df, config=None):
             edge_colors.append(color)
         
         # Edge width
-        max_weight = max([G.edges[e].get('weight', 1) for e in G.edges()])
         width = config['edge_width_range'][0] + (weight / max_weight) * (config['edge_width_range'][1] - config['edge_width_range'][0])
         edge_widths.append(width)
     
     # Create the plot
     fig = go.Figure()
     
-    # Add edges with improved styling
-    for i in range(0, len(edge_x), 3):
-        if i + 1 < len(edge_x):
-            fig.add_trace(go.Scatter(
-                x=edge_x[i:i+2],
-                y=edge_y[i:i+2],
-                mode='lines',
-                line=dict(width=edge_widths[i//3], color=edge_colors[i//3]),
-                hoverinfo='skip',
-                showlegend=False
-            ))
-    
-    # Add edge labels with improved styling and reduced size
-    fig.add_trace(go.Scatter(
-        x=edge_labels_x,
-        y=edge_labels_y,
-        mode='text',
-        text=edge_labels_text,
-        textfont=dict(size=15, color='#34495e', family='Inter'),
-        textposition="middle center",
-        hovertemplate='%{hovertext}<extra></extra>',
-        hovertext=edge_labels_hover,
-        showlegend=False,
-        name='Relationships',
-        opacity=1  # Slightly transparent to reduce visual clutter
-    ))
+    if large_graph:
+        # All edges in one trace, the segments separated by None
+        fig.add_trace(go.Scattergl(
+            x=edge_x,
+            y=edge_y,
+            mode='lines',
+            line=dict(width=1, color='rgba(150, 150, 150, 0.5)'),
+            hoverinfo='skip',
+            showlegend=False
+        ))
+        # Edge hover info at the edge midpoints, without the labels
+        fig.add_trace(go.Scattergl(
+            x=edge_labels_x,
+            y=edge_labels_y,
+            mode='markers',
+            marker=dict(size=6, color='rgba(0, 0, 0, 0)'),
+            hovertemplate='%{hovertext}<extra></extra>',
+            hovertext=edge_labels_hover,
+            showlegend=False,
+            name='Relationships'
+        ))
+    else:
+        # Add edges with improved styling
+        for i in range(0, len(edge_x), 3):
+            if i + 1 < len(edge_x):
+                fig.add_trace(go.Scatter(
+                    x=edge_x[i:i+2],
+                    y=edge_y[i:i+2],
+                    mode='lines',
+                    line=dict(width=edge_widths[i//3], color=edge_colors[i//3]),
+                    hoverinfo='skip',
+                    showlegend=False
+                ))
+        
+        # Add edge labels with improved styling and reduced size
+        fig.add_trace(go.Scatter(
+            x=edge_labels_x,
+            y=edge_labels_y,
+            mode='text',
+            text=edge_labels_text,
+            textfont=dict(size=15, color='#34495e', family='Inter'),
+            textposition="middle center",
+            hovertemplate='%{hovertext}<extra></extra>',
+            hovertext=edge_labels_hover,
+            showlegend=False,
+            name='Relationships',
+            opacity=1  # Slightly transparent to reduce visual clutter
+        ))
     
     # Add nodes with improved styling
-    fig.add_trace(go.Scatter(
+    fig.add_trace(Scatter(
         x=node_x,
         y=node_y,
         mode='markers+text' if config['show_labels'] else 'markers',
         marker=dict(
             size=node_sizes,
             color=node_colors,
-            line=dict(width=3, color='white'),  # Thinner border
+            line=dict(width=1 if large_graph else 3, color='white'),  # Thinner border
             sizemode='diameter',
             opacity=0.95
         ),
         text=node_text,
-        textposition="middle center",
-        textfont=dict(size=12, color='white', family='Inter, system-ui, -apple-system, sans-serif'),
+        textposition="top center" if large_graph else "middle center",
+        textfont=dict(size=12, color='#2c3e50' if large_graph else 'white', family='Inter, system-ui, -apple-system, sans-serif'),
         hovertemplate='%{hovertext}<extra></extra>',
         hovertext=node_info,
         name='Network Nodes',
-        customdata=[{'node_id': node, 'neighbors': list(G.neighbors(node))} for node in G.nodes()]
+        customdata=[{'node_id': node, 'neighbors': list(G_plot.neighbors(node))} for node in G_plot.nodes()]
     ))
     
     # Update layout with enhanced styling and better spacing
@@ -600,6 +622,101 @@ def create_association_network_graph(overview, df, config=None):
     ], style={'width': '100%', 'maxWidth': 'none', 'margin': '0'})
 
 
+def collapse_communities(G, pos, community_map):
+    """
+    Graph with one node per community, placed at the centre of its members.
+    
+    Args:
+        G: NetworkX graph
+        pos: Dictionary of node positions
+        community_map: Dictionary of node -> community index
+    
+    Returns:
+        (graph of the communities, their positions, dictionary of community node -> community index)
+    """
+    members = defaultdict(list)
+    for node in G.nodes():
+        members[community_map.get(node, 0)].append(node)
+    
+    C = nx.Graph()
+    collapsed_pos = {}
+    collapsed_map = {}
+    for community, nodes in members.items():
+        # best connected members first
+        nodes = sorted(nodes, key=lambda node: G.degree(node), reverse=True)
+        name = f"community_{community}"
+        reportids = sorted({str(G.nodes[node].get('reportid', 'N/A')) for node in nodes})
+        C.add_node(
+            name,
+            label=f"Community {community + 1} ({len(nodes)})",
+            type='community',
+            reportid=", ".join(reportids[:10]) + (f" (and {len(reportids) - 10} more)" if len(reportids) > 10 else ""),
+            members=nodes
+        )
+        collapsed_pos[name] = tuple(np.mean([pos[node] for node in nodes], axis=0))
+        collapsed_map[name] = community
+    
+    # edges between communities, weighted by the number of relations between their members
+    relations = Counter()
+    for u, v in G.edges():
+        cu, cv = community_map.get(u, 0), community_map.get(v, 0)
+        if cu != cv:
+            relations[tuple(sorted((cu, cv)))] += 1
+    for (cu, cv), count in relations.items():
+        C.add_edge(
+            f"community_{cu}", f"community_{cv}",
+            relationship='connected',
+            weight=count,
+            source_label=C.nodes[f"community_{cu}"]['label'],
+            target_label=C.nodes[f"community_{cv}"]['label'],
+            reportid='N/A'
+        )
+    return C, collapsed_pos, collapsed_map
+
+
+def compute_layout(G, layout='spring'):
+    """
+    Node positions of the association graph, spread out to reduce overlaps.
+    
+    Args:
+        G: NetworkX graph
+        layout: 'spring', 'circular', 'kamada_kawai' or 'random'
+    
+    Returns:
+        Dictionary of node positions
+    """
+    num_nodes = len(G.nodes())
+    
+    if layout == 'spring':
+        # Improved spring layout with better spacing
+        # k controls the optimal distance between nodes
+        k = max(5, num_nodes * 0.5)  # Adaptive spacing based on number of nodes
+        pos = nx.spring_layout(
+            G, 
+            k=k,                    # Optimal distance between nodes
+            iterations=200,         # More iterations for better convergence
+            seed=42,
+            scale=3.0              # Larger scale for more spread
+        )
+    elif layout == 'circular':
+        pos = nx.circular_layout(G, scale=3.5)  # Increased scale
+    elif layout == 'kamada_kawai':
+        try:
+            pos = nx.kamada_kawai_layout(G, scale=3.0)
+        except:
+            # Fallback to spring if kamada_kawai fails
+            pos = nx.spring_layout(G, k=5, iterations=200, seed=42, scale=3.0)
+    else:  # random
+        pos = nx.random_layout(G, seed=42)
+        # Scale up random positions
+        pos = {node: (coord[0] * 4, coord[1] * 4) for node, coord in pos.items()}
+    
+    # Post-process positions to reduce overlaps using force-directed adjustment
+    pos = adjust_positions_for_overlap(pos, G, min_distance=0.3)
+    
+    return pos
+
+
 def adjust_positions_for_overlap(pos, G, min_distance=0.3):
     """
     Adjust node positions to minimize overlaps using a simple force-directed approach.
@@ -612,35 +729,4 @@ def adjust_positions_for_overlap(pos, G, min_distance=0.3):
     Returns:
         Dictionary of adjusted positions
     """
-    adjusted_pos = pos.copy()
-    nodes = list(G.nodes())
-    
-    # Simple overlap reduction algorithm
-    for iteration in range(50):  # Limited iterations to prevent infinite loops
-        moved = False
-        for i, node1 in enumerate(nodes):
-            for j, node2 in enumerate(nodes[i+1:], i+1):
-                x1, y1 = adjusted_pos[node1]
-                x2, y2 = adjusted_pos[node2]
-                
-                # Calculate distance between nodes
-                dx = x2 - x1
-                dy = y2 - y1
-                distance = math.sqrt(dx*dx + dy*dy)
-                
-                # If nodes are too close, push them apart
-                if distance < min_distance and distance > 0:
-                    # Calculate repulsion force
-                    force = (min_distance - distance) / distance
-                    push_x = dx * force * 0.1
-                    push_y = dy * force * 0.1
-                    
-                    # Move nodes apart
-                    adjusted_pos[node1] = (x1 - push_x, y1 - push_y)
-                    adjusted_pos[node2] = (x2 + push_x, y2 + push_y)
-                    moved = True
-        
-        if not moved:
-            break
-    
-    return adjusted_pos
+    return separate_overlapping_nodes(pos, G.nodes(), min_distance=min_distance)
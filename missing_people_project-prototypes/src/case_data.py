@@ -0,0 +1,187 @@
+import os
+import pandas as pd
+from utils import case_store
+from utils.case_store import case_rows
+
+# Case data shared by the dashboards: the case's rows of the shared data and the
+# LLM outputs under NEW/<case_id>.
+
+
+def remove_leading_stop_words(text):
+    stop_words = ['the', 'a', 'an', 'and', 'or', 'of', 'in', 'to', 'for', 'with', 'by', 'at', 'on', 'from', 'as']
+    words = text.split()
+    while words and words[0].lower() in [sw.lower() for sw in stop_words]:
+        words.pop(0)
+    return ' '.join(words)
+
+def is_relevant(entity, irrelevant_list):
+    entity = remove_leading_stop_words(entity)
+    return not any(entity.lower().startswith(prefix.lower()) for prefix in irrelevant_list)
+
+# LLM entity output of a case -> (folder in NEW/<case_id>, file, entity types shown)
+ENTITY_FILES = {
+    "people": ("assosiation_network", "people_llama3.1_both.txt", ["people_names_relations", "people_desc"]),
+    "locations": ("locations", "locations3.1_both.txt", ["addresses", "landmarks_other_locations"]),
+}
+IRRELEVANT_ENTITIES = ['MP', 'nan']
+# compiled entity tables, next to the other derived data of the case store
+ENTITY_TABLE_DIR = os.path.join(case_store.STORE_DIR, "entities")
+
+
+def aggregate_entities(df, types):
+    """
+    Entity table of LLM entity rows: one row per relevant (type, entity), most mentioned first.
+
+    Parameters:
+    - df: DataFrame with columns id (report id), type and value (entity), as in the *_both.txt files
+    - types: entity types to keep
+
+    Returns:
+    - DataFrame with columns type, entity, count and reportids (list, in file order); ties keep file order
+    """
+    df = df[df['type'].isin(types)]
+    if df.empty:
+        return pd.DataFrame({'type': [], 'entity': [], 'count': [], 'reportids': []})
+    grouped = df.groupby(['type', 'value'], sort=False, dropna=False)['id']
+    table = pd.DataFrame({'count': grouped.size(), 'reportids': grouped.agg(list)}).reset_index()
+    table = table.rename(columns={'value': 'entity'})
+    # relevance depends on the entity text only, so it is checked once per entity rather than per row
+    relevant = [is_relevant(str(entity), IRRELEVANT_ENTITIES) for entity in table['entity'].tolist()]
+    table = table[relevant]
+    return table.sort_values('count', ascending=False, kind='stable').reset_index(drop=True)[['type', 'entity', 'count', 'reportids']]
+
+
+def entity_summary(table, entity_type):
+    """
+    (entity, count, report ids) of one entity type of an entity table, as the entity sections take them.
+    """
+    rows = table[table['type'] == entity_type]
+    return list(zip(rows['entity'].tolist(), rows['count'].tolist(), rows['reportids'].tolist()))
+
+
+def read_entity_file(file):
+    df = pd.read_csv(file, names=['id', 'type', 'value'])
+    df['id'] = df['id'].astype(object)
+    return df
+
+
+def process_entities(file):
+    table = aggregate_entities(read_entity_file(file), ENTITY_FILES["people"][2])
+    return entity_summary(table, 'people_names_relations'), entity_summary(table, 'people_desc')
+
+
+def process_entities_locations(file):
+    table = aggregate_entities(read_entity_file(file), ENTITY_FILES["locations"][2])
+    return entity_summary(table, 'addresses'), entity_summary(table, 'landmarks_other_locations')
+
+
+def _entity_sources(case_id):
+    # source -> (entity file, its mtime) for the sources whose folder exists
+    sources = {}
+    for source, (folder, file_name, _) in ENTITY_FILES.items():
+        folder_path = f"NEW/{str(case_id)}/{folder}"
+        if os.path.exists(folder_path):
+            entities_path = os.path.join(folder_path, file_name)
+            sources[source] = (entities_path, os.path.getmtime(entities_path) if os.path.exists(entities_path) else None)
+    return sources
+
+
+def _entity_table_path(case_id):
+    # the case id comes from the page and names a file, it must not lead out of ENTITY_TABLE_DIR or NEW/
+    case_id = str(case_id)
+    if case_id in ("", ".", "..") or os.path.basename(case_id) != case_id:
+        raise ValueError(f"Invalid case id: {case_id!r}")
+    return os.path.join(ENTITY_TABLE_DIR, f"{case_id}.pkl")
+
+
+def build_entity_table(case_id, sources=None):
+    """
+    Compile the LLM entity files of a case into one entity table and store it under ENTITY_TABLE_DIR.
+
+    Returns:
+    - DataFrame with columns source ("people" or "locations"), type, entity, count and reportids
+    """
+    path = _entity_table_path(case_id)
+    sources = sources if sources is not None else _entity_sources(case_id)
+    tables = [
+        aggregate_entities(read_entity_file(entities_path), ENTITY_FILES[source][2]).assign(source=source)
+        for source, (entities_path, _) in sources.items()
+    ]
+    table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=['type', 'entity', 'count', 'reportids', 'source'])
+    table = table[['source', 'type', 'entity', 'count', 'reportids']]
+
+    os.makedirs(ENTITY_TABLE_DIR, exist_ok=True)
+    pd.to_pickle({'sources': sources, 'table': table}, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return table
+
+
+def load_entity_table(case_id):
+    """
+    Entity table of a case, compiled again only when its entity files changed since it was stored.
+    """
+    path = _entity_table_path(case_id)
+    sources = _entity_sources(case_id)
+    if os.path.exists(path):
+        stored = pd.read_pickle(path)
+        if stored['sources'] == sources:
+            return stored['table']
+    return build_entity_table(case_id, sources)
+
+
+def build_entity_tables(case_ids=None):
+    """
+    Offline stage: compile the entity tables of all cases in NEW/ (or of case_ids) that are missing or out of date.
+    """
+    case_ids = case_ids if case_ids is not None else sorted(os.listdir("NEW")) if os.path.exists("NEW") else []
+    for case_id in case_ids:
+        try:
+            load_entity_table(case_id)
+        except Exception as e:
+            print(f"Entity table of case {case_id} failed: {e}")
+    print(f"Entity tables of {len(case_ids)} cases up to date in {ENTITY_TABLE_DIR}")
+
+
+def load_case_data(case_id):
+    # entity sections come from the compiled entity table, not the raw LLM output
+    entity_table = load_entity_table(case_id)
+    people = entity_table[entity_table['source'] == 'people']
+    names = entity_summary(people, 'people_names_relations')
+    descriptions = entity_summary(people, 'people_desc')
+    
+    folder_path = f"NEW/{str(case_id)}/assosiation_network"
+    narrative_path = os.path.join(folder_path, 'people_llama3.1_both_narrative.txt')
+    narrative_people = ""
+    if os.path.exists(narrative_path):
+        with open(narrative_path, 'r', encoding='utf-8') as f:
+            narrative_people = f.read()
+    
+    folder_path = f"NEW/{str(case_id)}/vul"
+    narrative_path = os.path.join(folder_path, 'vul_llama3.1_narrative.txt')
+    narrative_vul = ""
+    if os.path.exists(narrative_path):
+        with open(narrative_path, 'r', encoding='utf-8') as f:
+            narrative_vul = f.read()
+    
+    folder_path = f"NEW/{str(case_id)}/locations"
+    locations_table = entity_table[entity_table['source'] == 'locations']
+    addresses = entity_summary(locations_table, 'addresses')
+    locations = entity_summary(locations_table, 'landmarks_other_locations')
+    
+    narrative_path = os.path.join(folder_path, 'locations3.1_both_narrative.txt')
+    narrative_locations = ""
+    if os.path.exists(narrative_path):
+        with open(narrative_path, 'r', encoding='utf-8') as f:
+            narrative_locations = f.read()
+
+    return narrative_people, names, descriptions,narrative_locations,  addresses, locations, narrative_vul
+
+def case_frames(case_id):
+    df_mp_misperid = case_rows("mp_geolocations", 'misperid', int(case_id))
+    df_vp_misperid = case_rows("vp_new", 'misper_misperid', int(case_id))
+    return df_mp_misperid, df_vp_misperid
+
+
+if __name__ == "__main__":
+    # run from the project folder: python -m src.case_data
+    build_entity_tables()
@@ -0,0 +1,290 @@
+import argparse
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from utils import case_store
+from utils.geocoding import normalise_address
+from src.case_data import load_entity_table, is_relevant, remove_leading_stop_words, IRRELEVANT_ENTITIES
+
+# Index of the people and places mentioned across all cases, to find the other
+# missing persons that share an associate or an address with a case without
+# reading every case folder.
+#
+# Entities are keyed by their kind and normalised text, e.g. "address:12 high street
+# glasgow g1 1aa". The case x entity incidence matrix is stored as CSR arrays in both
+# directions (case -> entities, entity -> cases) as .npy files under INDEX_DIR, which
+# are loaded memory-mapped, so the gunicorn workers share one copy.
+
+# bump when entity_key changes, so the stored index is rebuilt
+INDEX_VERSION = 2
+INDEX_DIR = os.path.join(case_store.STORE_DIR, f"case_index.v{INDEX_VERSION}")
+INDEX_ARRAYS = ["cases", "entities", "labels", "case_indptr", "case_entities", "case_mentions", "entity_indptr", "entity_cases"]
+
+# entity table type -> kind of entity
+ENTITY_KINDS = {
+    "people_names_relations": "person",
+    "addresses": "address",
+    "landmarks_other_locations": "place",
+}
+# address columns of the MP reports
+MP_ADDRESS_COLUMNS = ["mf_address", "tl_address", "ha_address"]
+# titles dropped from the front of a person's name
+HONORIFICS = ["mr", "mrs", "ms", "miss", "dr"]
+
+_index = None
+# (index_dir, mtime of its last written array) of the loaded index
+_index_version = None
+
+
+def entity_key(kind, text):
+    """
+    Key of an entity: its kind and its text lowercased, without punctuation, leading stop words or a
+    trailing "(relation)", and for a person without a leading title, so "Mr. John Smith (uncle)" and
+    "john smith" are the same person.
+    """
+    text = re.sub(r"\([^)]*\)\s*$", "", str(text))
+    words = normalise_address(remove_leading_stop_words(text)).split()
+    while kind == "person" and len(words) > 1 and words[0] in HONORIFICS:
+        words.pop(0)
+    return f"{kind}:{' '.join(words)}"
+
+
+def _case_mentions():
+    # (case id, entity key, label) of every mention, from the entity tables, the association graphs and the MP reports
+    mentions = []
+    case_ids = sorted(os.listdir("NEW")) if os.path.exists("NEW") else []
+    for case_id in case_ids:
+        try:
+            table = load_entity_table(case_id)
+        except Exception as e:
+            # the association graph of the case is still read below
+            print(f"Entities of case {case_id} skipped: {e}")
+        else:
+            for entity_type, entity, count in zip(table['type'].tolist(), table['entity'].tolist(), table['count'].tolist()):
+                if entity_type in ENTITY_KINDS:
+                    mentions.extend([(case_id, entity_key(ENTITY_KINDS[entity_type], entity), entity)] * int(count))
+
+        graph_path = f"NEW/{case_id}/assosiation_network/graph_network.csv"
+        if os.path.exists(graph_path):
+            graph = pd.read_csv(graph_path)
+            for end in ["source", "target"]:
+                if end not in graph.columns:
+                    continue
+                labels = graph[f"{end}_label"] if f"{end}_label" in graph.columns else graph[end]
+                types = graph[f"{end}_type"] if f"{end}_type" in graph.columns else pd.Series("person", index=graph.index)
+                for label, node_type in zip(labels.dropna().tolist(), types[labels.notna()].tolist()):
+                    kind = "place" if "location" in str(node_type) else "person"
+                    mentions.append((case_id, entity_key(kind, label), label))
+
+    if os.path.exists(case_store.DATASETS["mp_geolocations"][0]):
+        df_mp = case_store.load_frame("mp_geolocations")
+        for column in [column for column in MP_ADDRESS_COLUMNS if column in df_mp.columns]:
+            rows = df_mp[['misperid', column]].dropna()
+            # case ids as the NEW/<case_id> folders name them
+            case_ids = rows['misperid'].astype('int64').astype(str)
+            mentions.extend(
+                (case_id, entity_key("address", address), address)
+                for case_id, address in zip(case_ids.tolist(), rows[column].tolist())
+            )
+
+    return pd.DataFrame(mentions, columns=['case', 'key', 'label']).astype(str)
+
+
+def build_case_index(index_dir=INDEX_DIR):
+    """
+    Offline stage: build the cross-case entity index from every case and store it under index_dir.
+
+    Returns:
+    - dictionary of the index arrays, see INDEX_ARRAYS
+    """
+    start = time.time()
+    mentions = _case_mentions()
+    # drop empty keys and entities like "MP" or "nan"
+    relevant = [bool(key.split(":", 1)[1]) and is_relevant(key.split(":", 1)[1], IRRELEVANT_ENTITIES) for key in mentions['key'].tolist()]
+    mentions = mentions[np.array(relevant, dtype=bool)]
+
+    cases, case_codes = np.unique(mentions['case'].to_numpy(dtype=str), return_inverse=True)
+    entities, entity_codes = np.unique(mentions['key'].to_numpy(dtype=str), return_inverse=True)
+    # label of an entity: its most frequent spelling
+    labels = mentions.assign(code=entity_codes).groupby(['code', 'label']).size().reset_index(name='n')
+    labels = labels.sort_values(['code', 'n'], ascending=[True, False], kind='stable').drop_duplicates('code')
+    labels = labels['label'].astype(str).to_numpy(dtype=str)
+
+    # one (case, entity) pair per distinct mention, with the number of mentions
+    pairs, mentions_per_pair = np.unique(case_codes.astype(np.int64) * len(entities) + entity_codes, return_counts=True)
+    pair_cases, pair_entities = pairs // len(entities), pairs % len(entities)
+
+    index = {
+        "cases": cases,
+        "entities": entities,
+        "labels": labels,
+        # pairs are sorted by case, then entity
+        "case_indptr": np.concatenate([[0], np.cumsum(np.bincount(pair_cases, minlength=len(cases)))]).astype(np.int64),
+        "case_entities": pair_entities.astype(np.int32),
+        "case_mentions": mentions_per_pair.astype(np.int32),
+    }
+    by_entity = np.argsort(pair_entities, kind="stable")
+    index["entity_indptr"] = np.concatenate([[0], np.cumsum(np.bincount(pair_entities, minlength=len(entities)))]).astype(np.int64)
+    index["entity_cases"] = pair_cases[by_entity].astype(np.int32)
+
+    os.makedirs(index_dir, exist_ok=True)
+    for name in INDEX_ARRAYS:
+        np.save(os.path.join(index_dir, f"{name}.tmp.npy"), index[name])
+    for name in INDEX_ARRAYS:
+        os.replace(os.path.join(index_dir, f"{name}.tmp.npy"), os.path.join(index_dir, f"{name}.npy"))
+    print(f"Case index of {len(cases)} cases and {len(entities)} entities built in {time.time() - start:.1f}s")
+    return index
+
+
+def _source_paths():
+    paths = [case_store.DATASETS["mp_geolocations"][0]]
+    for case_id in sorted(os.listdir("NEW")) if os.path.exists("NEW") else []:
+        paths.append(os.path.join(case_store.STORE_DIR, "entities", f"{case_id}.pkl"))
+        paths.append(f"NEW/{case_id}/assosiation_network/graph_network.csv")
+    return [path for path in paths if os.path.exists(path)]
+
+
+def case_index_outdated(index_dir=INDEX_DIR):
+    """
+    Whether the index is missing, or older than an entity table, association graph or the MP data.
+    """
+    index_path = os.path.join(index_dir, f"{INDEX_ARRAYS[-1]}.npy")
+    if not os.path.exists(index_path):
+        return True
+    built = os.path.getmtime(index_path)
+    return any(os.path.getmtime(path) > built for path in _source_paths())
+
+
+def load_case_index(index_dir=INDEX_DIR):
+    """
+    The stored case index, memory-mapped; built first when missing, and loaded again once it was rebuilt
+    (e.g. by python -m src.case_index build or another process).
+    """
+    global _index, _index_version
+    index_path = os.path.join(index_dir, f"{INDEX_ARRAYS[-1]}.npy")
+    if not os.path.exists(index_path):
+        build_case_index(index_dir)
+    # the last array is replaced last by build_case_index
+    version = (index_dir, os.path.getmtime(index_path))
+    if _index is None or _index_version != version:
+        _index = {name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r") for name in INDEX_ARRAYS}
+        _index_version = version
+    return _index
+
+
+def clear_case_index():
+    """
+    Forget the loaded index, e.g. after it was rebuilt.
+    """
+    global _index, _index_version
+    _index = None
+    _index_version = None
+
+
+def _position(values, value):
+    # position of value in the sorted array values, or None
+    i = int(np.searchsorted(values, value))
+    return i if i < len(values) and values[i] == value else None
+
+
+def cases_with_entity(kind, text, index=None):
+    """
+    Cases that mention an entity.
+
+    Parameters:
+    - kind: "person", "address" or "place"
+    - text: the entity as written, it is normalised like the indexed entities
+
+    Returns:
+    - list of case ids
+    """
+    index = index or load_case_index()
+    entity = _position(index["entities"], entity_key(kind, text))
+    if entity is None:
+        return []
+    cases = index["entity_cases"][index["entity_indptr"][entity]:index["entity_indptr"][entity + 1]]
+    return index["cases"][cases].tolist()
+
+
+def shared_entities(case_id, kinds=None, index=None):
+    """
+    Entities of a case that other cases mention too.
+
+    Parameters:
+    - case_id: case to look up
+    - kinds: entity kinds to include, e.g. ["person", "address"]; all by default
+
+    Returns:
+    - DataFrame with columns kind, entity (label), mentions (in this case) and cases (list of the other case ids),
+      the entities shared with the most cases first
+    """
+    index = index or load_case_index()
+    columns = ['kind', 'entity', 'mentions', 'cases']
+    case = _position(index["cases"], str(case_id))
+    if case is None:
+        return pd.DataFrame(columns=columns)
+
+    start, stop = index["case_indptr"][case], index["case_indptr"][case + 1]
+    entities = np.asarray(index["case_entities"][start:stop])
+    mentions = np.asarray(index["case_mentions"][start:stop])
+    # entities mentioned in more than this case
+    shared = np.diff(index["entity_indptr"])[entities] > 1
+    rows = []
+    for entity, count in zip(entities[shared].tolist(), mentions[shared].tolist()):
+        if kinds is not None and index["entities"][entity].split(":", 1)[0] not in kinds:
+            continue
+        others = index["entity_cases"][index["entity_indptr"][entity]:index["entity_indptr"][entity + 1]]
+        rows.append((
+            str(index["entities"][entity]).split(":", 1)[0],
+            str(index["labels"][entity]),
+            count,
+            [str(other) for other in index["cases"][others[others != case]].tolist()],
+        ))
+    table = pd.DataFrame(rows, columns=columns)
+    return table.sort_values('cases', key=lambda cases: cases.str.len(), ascending=False, kind='stable').reset_index(drop=True)
+
+
+def related_cases(case_id, kinds=None, index=None, top=10):
+    """
+    Other cases ranked by the entities they share with a case; entities that many cases mention count less.
+
+    Returns:
+    - list of (case id, score, number of shared entities), highest score first
+    """
+    index = index or load_case_index()
+    case = _position(index["cases"], str(case_id))
+    if case is None:
+        return []
+
+    entities = np.asarray(index["case_entities"][index["case_indptr"][case]:index["case_indptr"][case + 1]])
+    if kinds is not None:
+        entity_kinds = np.array([str(key).split(":", 1)[0] for key in index["entities"][entities].tolist()])
+        entities = entities[np.isin(entity_kinds, kinds)]
+    entity_indptr = np.asarray(index["entity_indptr"])
+    sizes = entity_indptr[entities + 1] - entity_indptr[entities]
+    # every case of every entity, with the entity's weight
+    positions = np.repeat(entity_indptr[entities], sizes) + (np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes))
+    other_cases = np.asarray(index["entity_cases"])[positions]
+    weights = np.repeat(1.0 / sizes, sizes)
+
+    scores = np.bincount(other_cases, weights, len(index["cases"]))
+    shared = np.bincount(other_cases, minlength=len(index["cases"]))
+    scores[case] = 0
+    ranked = np.argsort(-scores, kind="stable")[:top]
+    return [(str(index["cases"][other]), float(scores[other]), int(shared[other])) for other in ranked if scores[other] > 0]
+
+
+if __name__ == "__main__":
+    # run from the project folder: python -m src.case_index build | python -m src.case_index query <case_id>
+    parser = argparse.ArgumentParser(description="Cross-case index of the people and places of the cases.")
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("case_id", nargs="?")
+    args = parser.parse_args()
+    if args.command == "build":
+        build_case_index()
+    else:
+        print(shared_entities(args.case_id).to_string())
+        for other, score, shared in related_cases(args.case_id):
+            print(f"Case {other}: {shared} shared entities (score {score:.2f})")
@@ -5,7 +5,6 @@ from dash import html, dcc
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from collections import defaultdict, Counter
 from src.pattern_tiles import create_pattern_dashboard
 from utils.date_from_report_id import date_from_reportid
 # from create_custom_patterns_vis import create_theme_analysis_summary
@@ -90,39 +89,78 @@ def create_summ_mp_timeline_visualization(overview, df, llm_themes, patterns_das
             'width': '100%'
         })
     
+    def parse_datetimes(values):
+        """
+        Parse a column of datetimes in one vectorised pass.
+        Only the values it cannot parse go through parse_datetime_safely.
+        """
+        # positional index, df may repeat index labels
+        values = values.reset_index(drop=True)
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+        
+        values = values.astype(object)
+        missing = values.isna() | (values == '')
+        # as parse_datetime_safely: stripped, with the Z (UTC) indicator removed
+        text = values[~missing].map(str).str.strip().str.replace(r'Z$', '', regex=True)
+        # ISO 8601 is unambiguous, so this parses those values as the per-value parsing does;
+        # other layouts, e.g. day/month ones, are left to parse_datetime_safely
+        try:
+            parsed = pd.to_datetime(text, format='ISO8601', errors='coerce')
+        except (ValueError, TypeError):
+            parsed = pd.Series(pd.NaT, index=text.index)
+        if not pd.api.types.is_datetime64_any_dtype(parsed):
+            # e.g. mixed timezones
+            parsed = pd.Series(pd.NaT, index=text.index)
+        
+        failed = parsed.isna()
+        if failed.any():
+            parsed = parsed.astype(object)
+            parsed[failed] = [parse_datetime_safely(value) for value in values[~missing][failed].tolist()]
+            try:
+                parsed = pd.to_datetime(parsed)
+            except (ValueError, TypeError):
+                pass
+        return parsed.reindex(values.index)
+    
     # Parse datetime data and collect valid entries
-    valid_datetimes = []
+    columns = ['date', 'hour', 'report_id', 'day_week', 'length_missing_mins', 'return_method_desc']
+    valid_datetimes = pd.DataFrame(columns=columns)
     invalid_datetimes = []
     
-    for idx in range(len(df)):
-        if 'date_reported_missing' in df.columns and idx < len(df['date_reported_missing']):
-            dt_str = df['date_reported_missing'].iloc[idx]
-            reporid = df['reportid'].iloc[idx] if 'reportid' in df.columns and idx < len(df['reportid']) else f"Row {idx + 1}"
-            
-            # Get additional data
-            day_week = df['day_reported_missing'].iloc[idx] if 'day_reported_missing' in df.columns and idx < len(df['day_reported_missing']) else None
-            length_missing_mins = df['length_missing_mins'].iloc[idx] if 'length_missing_mins' in df.columns and idx < len(df['length_missing_mins']) else None
-            return_method_desc = df['return_method_desc'].iloc[idx] if 'return_method_desc' in df.columns and idx < len(df['return_method_desc']) else None
-            
-            parsed_dt = parse_datetime_safely(dt_str)
-            if parsed_dt:
-                valid_datetimes.append({
-                    'datetime': parsed_dt,
-                    'date': parsed_dt.date(),
-                    'time': parsed_dt.time(),
-                    'hour': parsed_dt.hour,
-                    'minute': parsed_dt.minute,
-                    'report_id': str(reporid),
-                    'original_string': str(dt_str),
-                    'day_week': day_week,
-                    'length_missing_mins': length_missing_mins,
-                    'return_method_desc': return_method_desc
-                })
-            else:
-                invalid_datetimes.append({
-                    'report_id': str(reporid),
-                    'original_string': str(dt_str) if dt_str else 'Empty/None'
-                })
+    if 'date_reported_missing' in df.columns:
+        raw = df['date_reported_missing']
+        parsed = parse_datetimes(raw)
+        valid = parsed.notna().to_numpy(dtype=bool)
+        report_ids = df['reportid'].map(str) if 'reportid' in df.columns else pd.Series([f"Row {idx + 1}" for idx in range(len(df))], index=df.index)
+        
+        parsed = parsed[valid]
+        if pd.api.types.is_datetime64_any_dtype(parsed):
+            dates, hours = parsed.dt.date, parsed.dt.hour
+        else:
+            dates, hours = parsed.map(lambda dt: dt.date()), parsed.map(lambda dt: dt.hour)
+        
+        # Get additional data
+        def column(name):
+            return df[name][valid].to_numpy(dtype=object) if name in df.columns else np.full(len(parsed), None, dtype=object)
+        
+        valid_datetimes = pd.DataFrame({
+            'date': dates.to_numpy(dtype=object),
+            'hour': hours.to_numpy(dtype=np.int64),
+            'report_id': report_ids[valid].to_numpy(dtype=object),
+            'day_week': column('day_reported_missing'),
+            'length_missing_mins': column('length_missing_mins'),
+            'return_method_desc': column('return_method_desc'),
+        }, columns=columns)
+        
+        invalid_datetimes = [
+            {'report_id': report_id, 'original_string': str(dt_str) if dt_str else 'Empty/None'}
+            for report_id, dt_str in zip(report_ids[~valid].tolist(), raw[~valid].tolist())
+        ]
+    
+    def is_given(values):
+        # values that are neither None nor empty, as the sections filter them
+        return values.map(lambda value: value is not None and value != '').to_numpy(dtype=bool)
     
     # Calculate statistics
     total_reports = len(df)
@@ -150,12 +188,10 @@ def create_summ_mp_timeline_visualization(overview, df, llm_themes, patterns_das
     
     # SECTION 1: Date Timeline
     def create_date_timeline():
-        date_counts = Counter([entry['date'] for entry in valid_datetimes])
-        dates = sorted(date_counts.keys())
-        date_report_mapping = defaultdict(list)
-        
-        for entry in valid_datetimes:
-            date_report_mapping[entry['date']].append(entry['report_id'])
+        by_date = valid_datetimes.groupby('date', sort=True)['report_id']
+        date_counts = by_date.size()
+        dates = date_counts.index.tolist()
+        date_report_mapping = by_date.agg(list)
         
         fig = go.Figure()
         
@@ -213,15 +249,12 @@ def create_summ_mp_timeline_visualization(overview, df, llm_themes, patterns_das
     
     # SECTION 2: Time of Day Distribution
     def create_time_of_day():
-        hour_counts = Counter([entry['hour'] for entry in valid_datetimes])
-        hour_report_mapping = defaultdict(list)
-        
-        for entry in valid_datetimes:
-            hour_report_mapping[entry['hour']].append(entry['report_id'])
+        hour_counts = np.bincount(valid_datetimes['hour'].to_numpy(dtype=np.int64), minlength=24)
+        hour_report_mapping = valid_datetimes.groupby('hour')['report_id'].agg(list)
         
         # Create data for all 24 hours
         hours = list(range(24))
-        hour_values = [hour_counts.get(hour, 0) for hour in hours]
+        hour_values = hour_counts.tolist()
         
         # Convert hours to theta (degrees) - 360 degrees / 24 hours = 15 degrees per hour
         theta_values = [hour * 15 for hour in hours]
@@ -241,7 +274,7 @@ def create_summ_mp_timeline_visualization(overview, df, llm_themes, patterns_das
         # Create hover text
         hover_text = []
         for hour in hours:
-            count = hour_counts.get(hour, 0)
+            count = hour_values[hour]
             if count > 0:
                 report_ids = hour_report_mapping[hour][:5]
                 ids_text = ", ".join(report_ids)
@@ -300,24 +333,16 @@ def create_summ_mp_timeline_visualization(overview, df, llm_themes, patterns_das
     # SECTION 3: Day of Week Distribution
     def create_day_of_week():
         # Get day of week data
-        day_week_data = []
-        for entry in valid_datetimes:
-            if entry['day_week'] is not None and entry['day_week'] != '':
-                day_week_data.append({
-                    'day': entry['day_week'],
-                    'report_id': entry['report_id']
-                })
-        
-        if not day_week_data:
+        day_week_data = valid_datetimes[is_given(valid_datetimes['day_week'])]
+        
+        if day_week_data.empty:
             return html.Div([
                 html.P("No day of week data available", style={'textAlign': 'center', 'color': '#666', 'padding': '20px'})
             ])
         
-        day_counts = Counter([item['day'] for item in day_week_data])
-        day_report_mapping = defaultdict(list)
-        
-        for item in day_week_data:
-            day_report_mapping[item['day']].append(item['report_id'])
+        by_day = day_week_data.groupby('day_week', sort=False)['report_id']
+        day_counts = by_day.size()
+        day_report_mapping = by_day.agg(list)
         
         # Order days properly
         day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -366,31 +391,20 @@ def create_summ_mp_timeline_visualization(overview, df, llm_themes, patterns_das
     # SECTION 4: Length Over Time
     def create_length_over_time():
         # Get length data
-        length_data = []
-        for entry in valid_datetimes:
-            if entry['length_missing_mins'] is not None and entry['length_missing_mins'] != '':
-                try:
-                    length_val = float(entry['length_missing_mins'])
-                    if not np.isnan(length_val):
-                        length_data.append({
-                            'date': entry['date'],
-                            'length': length_val,
-                            'report_id': entry['report_id']
-                        })
-                except (ValueError, TypeError):
-                    continue
-        
-        if not length_data:
+        length_data = valid_datetimes.assign(length=pd.to_numeric(valid_datetimes['length_missing_mins'], errors='coerce'))
+        length_data = length_data[length_data['length'].notna()]
+        
+        if length_data.empty:
             return html.Div([
                 html.P("No length data available", style={'textAlign': 'center', 'color': '#666', 'padding': '20px'})
             ])
         
         # Sort by date
-        length_data.sort(key=lambda x: x['date'])
+        length_data = length_data.sort_values('date', kind='stable')
         
-        dates = [item['date'] for item in length_data]
-        lengths = [item['length'] for item in length_data]
-        report_ids = [item['report_id'] for item in length_data]
+        dates = length_data['date'].tolist()
+        lengths = length_data['length'].astype(float).tolist()
+        report_ids = length_data['report_id'].tolist()
         
         # Create hover text with human-readable time format
         hover_text = []
@@ -445,29 +459,22 @@ def create_summ_mp_timeline_visualization(overview, df, llm_themes, patterns_das
     # SECTION 5: Return Method Distribution (NEW PIE CHART)
     def create_return_method_pie():
         # Get return method data
-        return_method_data = []
-        for entry in valid_datetimes:
-            if entry['return_method_desc'] is not None and entry['return_method_desc'] != '':
-                return_method_data.append({
-                    'method': str(entry['return_method_desc']).strip(),
-                    'report_id': entry['report_id']
-                })
-        
-        if not return_method_data:
+        return_method_data = valid_datetimes[is_given(valid_datetimes['return_method_desc'])]
+        return_method_data = return_method_data.assign(method=return_method_data['return_method_desc'].map(str).str.strip())
+        
+        if return_method_data.empty:
             return html.Div([
                 html.P("No return method data available", style={'textAlign': 'center', 'color': '#666', 'padding': '20px'})
             ])
         
-        method_counts = Counter([item['method'] for item in return_method_data])
-        method_report_mapping = defaultdict(list)
-        
-        for item in return_method_data:
-            method_report_mapping[item['method']].append(item['report_id'])
+        by_method = return_method_data.groupby('method', sort=False)['report_id']
+        method_counts = by_method.size()
+        method_report_mapping = by_method.agg(list)
         
         # Sort methods by count (descending)
-        sorted_methods = sorted(method_counts.items(), key=lambda x: x[1], reverse=True)
-        methods = [item[0] for item in sorted_methods]
-        method_values = [item[1] for item in sorted_methods]
+        sorted_methods = method_counts.sort_values(ascending=False, kind='stable')
+        methods = sorted_methods.index.tolist()
+        method_values = sorted_methods.tolist()
         
         # Create hover text
         hover_text = []
@@ -608,9 +615,9 @@ def create_summ_mp_timeline_visualization(overview, df, llm_themes, patterns_das
         )
     
     # Calculate summary statistics
-    if valid_datetimes:
-        earliest_date = min(entry['date'] for entry in valid_datetimes)
-        latest_date = max(entry['date'] for entry in valid_datetimes)
+    if not valid_datetimes.empty:
+        earliest_date = min(valid_datetimes['date'])
+        latest_date = max(valid_datetimes['date'])
         date_range = (latest_date - earliest_date).days
     else:
         earliest_date = latest_date = None
@@ -247,4 +247,48 @@ tbody tr:hover {
 a:hover {
     text-decoration: underline !important;
 }
-"""
\ No newline at end of file
+"""
+
+
+def create_summ_mp_home_locations(mp_df_misperid):
+    """Create a compact home addresses display"""
+    if mp_df_misperid.empty:
+        return html.Div([
+            html.Div([
+                html.H4("Home Addresses", className="compact-section-title"),
+                html.P("No address data", className="no-data-compact")
+            ], className="compact-section empty-section")
+        ])
+    
+    # Get unique addresses
+    unique_addresses = mp_df_misperid['ha_address'].dropna().unique()
+    
+    address_duration = mp_df_misperid.groupby('ha_address')['missing_since'].agg(['min', 'max'])
+    address_duration['first_date'] = address_duration['min'].dt.strftime('%d-%m-%Y')
+    address_duration['last_date'] = address_duration['max'].dt.strftime('%d-%m-%Y')
+    address_duration = address_duration[['first_date', 'last_date']]
+    address_duration = address_duration.reset_index()
+    
+    print("WWWW", address_duration)
+    # Create compact address chips
+    address_chips = []
+    
+    for id, row in address_duration.iterrows(): 
+        address_chips.append(
+            html.Details([
+                html.Summary([
+                    html.Span(row['ha_address'], className="entity-name-large"),
+                    html.Span(str(row['first_date'] + " to " + str(row['last_date'])), className="comment-text-medium"),
+                ], className="home-address-prominent"),
+            ], className="home-address-prominent")
+        )
+           
+    content = html.Div(address_chips)
+    
+    return html.Div([
+        html.Div([
+            html.H4("Home Addresses", className="compact-section-title"),
+            html.Span(f"{len(unique_addresses)}", className="item-count-small")
+        ], className="compact-section-header"),
+        html.Div(content, className="address-chips-container")
+    ], className="compact-section")
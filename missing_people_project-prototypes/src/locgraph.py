@@ -4,6 +4,7 @@ import plotly.express as px
 from dash import html, dcc
 import networkx as nx
 import numpy as np
+from utils.graph_layout import separate_overlapping_nodes, layout_cache
 
 def layout_disjoint_components(G, connected_components):
     """
@@ -67,52 +68,59 @@ def adjust_positions_to_reduce_overlaps(G, pos, min_distance=0.3):
     """
     Adjust node positions to reduce overlaps using a simple force-based approach.
     """
-    import copy
-    pos_adjusted = copy.deepcopy(pos)
-    nodes = list(G.nodes())
-    
-    # Apply repulsive forces to separate overlapping nodes
-    for iteration in range(50):  # Multiple iterations for better separation
-        forces = {node: np.array([0.0, 0.0]) for node in nodes}
+    return separate_overlapping_nodes(pos, G.nodes(), min_distance=min_distance)
+
+def compute_layout(G):
+    """
+    Node positions of the network graph; disjoint components are laid out separately.
+    """
+    # Find connected components (disjoint subgraphs)
+    connected_components = list(nx.connected_components(G.to_undirected()))
+
+    # If there's only one component, use the original layout
+    if len(connected_components) == 1:
+        # Get node positions using improved layout algorithm
+        # Try multiple layout algorithms and choose the best one
+        try:
+            # First try hierarchical layout if the graph has clear hierarchy
+            if nx.is_directed_acyclic_graph(G):
+                pos = nx.nx_agraph.graphviz_layout(G, prog='dot')
+            else:
+                # Use spring layout with optimized parameters for minimal overlap
+                pos = nx.spring_layout(G, 
+                                     k=5,  # Increased from 3 - more space between nodes
+                                     iterations=100,  # Increased from 50 - better convergence
+                                     weight='weight',  # Use edge weights if available
+                                     scale=2,  # Larger scale for more spread
+                                     center=(0, 0),
+                                     dim=2,
+                                     seed=42)  # Fixed seed for reproducible layouts
+        except:
+            # Fallback to basic spring layout if graphviz is not available
+            pos = nx.spring_layout(G, 
+                                 k=5, 
+                                 iterations=100, 
+                                 weight='weight', 
+                                 scale=2,
+                                 seed=42)
         
-        for i, node1 in enumerate(nodes):
-            for j, node2 in enumerate(nodes):
-                if i >= j:
-                    continue
-                
-                # Calculate distance between nodes
-                pos1 = np.array(pos_adjusted[node1])
-                pos2 = np.array(pos_adjusted[node2])
-                diff = pos1 - pos2
-                distance = np.linalg.norm(diff)
-                
-                # If nodes are too close, apply repulsive force
-                if distance < min_distance and distance > 0:
-                    # Normalize direction vector
-                    direction = diff / distance
-                    # Apply force proportional to overlap
-                    force_magnitude = (min_distance - distance) * 0.1
-                    force = direction * force_magnitude
-                    
-                    forces[node1] += force
-                    forces[node2] -= force
+        # Post-process positions to reduce overlaps further
+        pos = adjust_positions_to_reduce_overlaps(G, pos)
         
-        # Apply forces to positions
-        for node in nodes:
-            pos_adjusted[node] = (
-                pos_adjusted[node][0] + forces[node][0],
-                pos_adjusted[node][1] + forces[node][1]
-            )
+    else:
+        # Layout disjoint components separately
+        pos = layout_disjoint_components(G, connected_components)
     
-    return pos_adjusted
+    return pos
 
-def create_network_graph_from_csv(csv_file_path, graph_title="Network Graph"):
+def create_network_graph_from_csv(csv_file_path, graph_title="Network Graph", case_id=None):
     """
     Takes a CSV file with network data and returns a Dash HTML div containing a directed network graph.
     
     Parameters:
     csv_file_path (str): Path to the CSV file
     graph_title (str): Title for the graph
+    case_id (str): Case of the graph, its layout is stored with the case's layouts (optional)
     
     Returns:
     dash.html.Div: HTML div containing the network graph
@@ -163,39 +171,8 @@ def create_network_graph_from_csv(csv_file_path, graph_title="Network Graph"):
     # Find connected components (disjoint subgraphs)
     connected_components = list(nx.connected_components(G.to_undirected()))
     
-    # If there's only one component, use the original layout
-    if len(connected_components) == 1:
-        # Get node positions using improved layout algorithm
-        # Try multiple layout algorithms and choose the best one
-        try:
-            # First try hierarchical layout if the graph has clear hierarchy
-            if nx.is_directed_acyclic_graph(G):
-                pos = nx.nx_agraph.graphviz_layout(G, prog='dot')
-            else:
-                # Use spring layout with optimized parameters for minimal overlap
-                pos = nx.spring_layout(G, 
-                                     k=5,  # Increased from 3 - more space between nodes
-                                     iterations=100,  # Increased from 50 - better convergence
-                                     weight='weight',  # Use edge weights if available
-                                     scale=2,  # Larger scale for more spread
-                                     center=(0, 0),
-                                     dim=2,
-                                     seed=42)  # Fixed seed for reproducible layouts
-        except:
-            # Fallback to basic spring layout if graphviz is not available
-            pos = nx.spring_layout(G, 
-                                 k=5, 
-                                 iterations=100, 
-                                 weight='weight', 
-                                 scale=2,
-                                 seed=42)
-        
-        # Post-process positions to reduce overlaps further
-        pos = adjust_positions_to_reduce_overlaps(G, pos)
-        
-    else:
-        # Layout disjoint components separately
-        pos = layout_disjoint_components(G, connected_components)
+    # Layout positions, reused from the case's layout cache when the graph was laid out before
+    pos = layout_cache.get(G, compute_layout, case_id=case_id, name="locations")
     
     # Extract node coordinates
     node_x = [pos[node][0] for node in G.nodes()]
@@ -2,9 +2,183 @@ import dash_leaflet as dl
 from dash import html, dcc
 import pandas as pd
 import numpy as np
-import ast
-from collections import defaultdict
 from utils.date_from_report_id import date_from_reportid
+from utils.geocoding import parse_coordinates
+
+# UK approximate bounds: lat: 49.9 to 60.9, lon: -8.2 to 1.8
+UK_LAT = (49.9, 60.9)
+UK_LON = (-8.2, 1.8)
+
+# kind of location -> (coordinates column, address column, address list name)
+LOCATION_KINDS = {
+    "missing": ("missing_from_latlong", "mf_address", "Missing From"),
+    "found": ("tl_latlong", "tl_address", "Found At"),
+    "home": ("home_latlong", "ha_address", "Home Address"),
+}
+
+
+def within_uk(lon, lat):
+    """
+    Boolean mask of the coordinate arrays inside the UK bounds; False where a coordinate is NaN.
+    """
+    return (lat >= UK_LAT[0]) & (lat <= UK_LAT[1]) & (lon >= UK_LON[0]) & (lon <= UK_LON[1])
+
+
+def location_arrays(df, coordinates_column):
+    """
+    (lon, lat) float arrays of a *_latlong column, taken from the columns parsed when the data was loaded if present.
+    """
+    prefix = coordinates_column[:-len("_latlong")]
+    if f"{prefix}_lon" in df.columns and f"{prefix}_lat" in df.columns:
+        return df[f"{prefix}_lon"].to_numpy(dtype=float), df[f"{prefix}_lat"].to_numpy(dtype=float)
+    return parse_coordinates(df[coordinates_column])
+
+
+def get_optimal_map_center_and_zoom(lats, lons):
+    """
+    Calculate optimal center and zoom level for the map based on location distribution.
+    """
+    if len(lats) == 0:
+        # Default to UK center if no valid locations
+        return [54.5, -2.5], 6
+    
+    # Calculate bounds
+    min_lat, max_lat = float(lats.min()), float(lats.max())
+    min_lon, max_lon = float(lons.min()), float(lons.max())
+    
+    # Calculate center
+    center_lat = (min_lat + max_lat) / 2
+    center_lon = (min_lon + max_lon) / 2
+    
+    # Calculate span to determine zoom level
+    lat_span = max_lat - min_lat
+    lon_span = max_lon - min_lon
+    max_span = max(lat_span, lon_span)
+    
+    # Determine zoom level based on span
+    if max_span > 8:  # Very large area (multiple countries)
+        zoom = 5
+    elif max_span > 4:  # Large area (entire UK)
+        zoom = 6
+    elif max_span > 2:  # Regional area
+        zoom = 7
+    elif max_span > 1:  # City/county level
+        zoom = 8
+    elif max_span > 0.5:  # City area
+        zoom = 9
+    elif max_span > 0.1:  # Local area
+        zoom = 11
+    elif max_span > 0.05:  # Neighborhood
+        zoom = 12
+    else:  # Very local area
+        zoom = 13
+    
+    # Add some padding by reducing zoom slightly for better view
+    zoom = max(zoom - 1, 5)  # Minimum zoom of 5
+    
+    return [center_lat, center_lon], zoom
+
+
+def _ordered_lists(tokens, keys, column):
+    # list of the column's values per location key, in event order
+    if tokens.empty:
+        return {}
+    return {key: values for key, values in tokens.groupby(keys, sort=False)[column].agg(list).items()}
+
+
+def aggregate_locations(df):
+    """
+    Plotted locations of the reports, with the addresses and connections the map shows.
+
+    Parameters:
+    - df: MP reports with the *_latlong and address columns of LOCATION_KINDS and reportid
+
+    Returns:
+    - locations: DataFrame with one row per location (lat, lon rounded to 6 decimals) in order of first appearance,
+      with the counts missing, found and home and the tooltip lists missing_reportids, found_reportids and home_reportids
+    - plottable_addresses, unplottable_addresses: address list name -> list of address dicts
+    - connections: (missing location, traced location, report id) of the reports with both plotted
+    - lats, lons: arrays of every plotted coordinate, unrounded
+    """
+    n = len(df)
+    reportids = df['reportid'].astype(str).to_numpy() if 'reportid' in df.columns else np.array([f"Row {idx + 1}" for idx in range(n)], dtype=object)
+    
+    plottable_addresses = {name: [] for _, _, name in LOCATION_KINDS.values()}
+    unplottable_addresses = {name: [] for _, _, name in LOCATION_KINDS.values()}
+    events = []
+    coordinates = {}
+    plotted_lats, plotted_lons = [np.empty(0)], [np.empty(0)]
+    
+    for order, (kind, (coordinates_column, address_column, name)) in enumerate(LOCATION_KINDS.items()):
+        if coordinates_column not in df.columns:
+            continue
+        lon, lat = location_arrays(df, coordinates_column)
+        # outside the UK (or not geocoded) counts as not plotted
+        valid = within_uk(lon, lat)
+        coordinates[kind] = (lon, lat, valid)
+        addresses = df[address_column].to_numpy(dtype=object) if address_column in df.columns else np.full(n, "Unknown Address", dtype=object)
+        listed = np.array([bool(address) for address in addresses], dtype=bool)
+        
+        plottable_addresses[name] = [
+            {'address': addresses[idx], 'report_id': reportids[idx], 'coordinates': f"{lat[idx]:.6f}, {lon[idx]:.6f}"}
+            for idx in np.flatnonzero(valid & listed)
+        ]
+        unplottable_addresses[name] = [
+            {'address': addresses[idx], 'report_id': reportids[idx]}
+            for idx in np.flatnonzero(~valid & listed)
+        ]
+        
+        rows = np.flatnonzero(valid)
+        plotted_lats.append(lat[rows])
+        plotted_lons.append(lon[rows])
+        events.append(pd.DataFrame({
+            'row': rows,
+            'order': order,
+            'kind': kind,
+            # Round to avoid slight coordinate differences
+            'lat': np.round(lat[rows], 6),
+            'lon': np.round(lon[rows], 6),
+            'address': addresses[rows],
+            'reportid': reportids[rows],
+        }))
+    
+    keys = ['lat', 'lon']
+    events = pd.concat(events, ignore_index=True) if events else pd.DataFrame(columns=['row', 'order', 'kind', 'lat', 'lon', 'address', 'reportid'])
+    # the order the reports list them in: report by report, missing from before traced before home
+    events = events.sort_values(['row', 'order'], kind='stable').reset_index(drop=True)
+    
+    locations = events.drop_duplicates(keys)[keys].reset_index(drop=True)
+    counts = events.groupby(keys + ['kind'], sort=False).size().unstack(fill_value=0)
+    for kind in LOCATION_KINDS:
+        column = counts[kind] if kind in counts.columns else pd.Series(dtype=int)
+        locations[kind] = [int(column.get(key, 0)) for key in zip(locations['lat'], locations['lon'])]
+    
+    # tooltip lists, as the reports are read in order:
+    # missing -> its address (once per location); missing and found -> the report id, after the found address (once)
+    missing = events[events['kind'] == 'missing'].drop_duplicates(keys + ['address'])
+    found = events[events['kind'] == 'found']
+    tokens = pd.concat([
+        events[events['kind'].isin(['missing', 'found'])].assign(token=lambda e: e['reportid'], step=1),
+        found.drop_duplicates(keys + ['address']).assign(token=lambda e: e['address'], step=0),
+    ]).sort_values(['row', 'order', 'step'], kind='stable')
+    home = events[events['kind'] == 'home']
+    for column, lists in [
+        ('missing_reportids', _ordered_lists(missing, keys, 'address')),
+        ('found_reportids', _ordered_lists(tokens, keys, 'token')),
+        ('home_reportids', _ordered_lists(home, keys, 'reportid')),
+    ]:
+        locations[column] = [lists.get(key, []) for key in zip(locations['lat'], locations['lon'])]
+    
+    connections = []
+    if 'missing' in coordinates and 'found' in coordinates:
+        missing_lon, missing_lat, missing_valid = coordinates['missing']
+        found_lon, found_lat, found_valid = coordinates['found']
+        connections = [
+            ([float(missing_lat[idx]), float(missing_lon[idx])], [float(found_lat[idx]), float(found_lon[idx])], reportids[idx])
+            for idx in np.flatnonzero(missing_valid & found_valid)
+        ]
+    
+    return locations, plottable_addresses, unplottable_addresses, connections, np.concatenate(plotted_lats), np.concatenate(plotted_lons)
 
 
 def create_summ_mp_missing_from_found_locations_map(df, locations):
@@ -25,77 +199,6 @@ def create_summ_mp_missing_from_found_locations_map(df, locations):
     
     print("MMMMMM", locations)
     
-    def is_within_uk(lat, lon):
-        """
-        Check if coordinates are within UK boundaries.
-        UK approximate boundaries:
-        - Latitude: 49.5 to 61.0 (includes Shetland Islands)
-        - Longitude: -8.5 to 2.0 (includes Northern Ireland and eastern England)
-        """
-        if lat is None or lon is None:
-            return False
-        return 49.5 <= lat <= 61.0 and -8.5 <= lon <= 2.0
-    
-    def get_optimal_map_center_and_zoom(valid_locations):
-        """
-        Calculate optimal center and zoom level for the map based on location distribution.
-        """
-        if not valid_locations:
-            # Default to UK center if no valid locations
-            return [54.5, -2.5], 6
-        
-        # Extract lat/lon arrays
-        lats = [loc[0] for loc in valid_locations]
-        lons = [loc[1] for loc in valid_locations]
-        
-        # Calculate bounds
-        min_lat, max_lat = min(lats), max(lats)
-        min_lon, max_lon = min(lons), max(lons)
-        
-        # Calculate center
-        center_lat = (min_lat + max_lat) / 2
-        center_lon = (min_lon + max_lon) / 2
-        
-        # Calculate span to determine zoom level
-        lat_span = max_lat - min_lat
-        lon_span = max_lon - min_lon
-        max_span = max(lat_span, lon_span)
-        
-        # Determine zoom level based on span
-        if max_span > 8:  # Very large area (multiple countries)
-            zoom = 5
-        elif max_span > 4:  # Large area (entire UK)
-            zoom = 6
-        elif max_span > 2:  # Regional area
-            zoom = 7
-        elif max_span > 1:  # City/county level
-            zoom = 8
-        elif max_span > 0.5:  # City area
-            zoom = 9
-        elif max_span > 0.1:  # Local area
-            zoom = 11
-        elif max_span > 0.05:  # Neighborhood
-            zoom = 12
-        else:  # Very local area
-            zoom = 13
-        
-        # Add some padding by reducing zoom slightly for better view
-        zoom = max(zoom - 1, 5)  # Minimum zoom of 5
-        
-        return [center_lat, center_lon], zoom
-    
-    # Track location frequencies, types, and report IDs
-    location_data = defaultdict(lambda: {'missing': 0, 'found': 0, 'home': 0, 'missing_reportids': [], 'found_reportids': [], 'home_reportids': []})
-    polylines = []
-    valid_locations = []
-    
-    # Track unplottable and plottable addresses
-    unplottable_addresses = {
-        'Missing From': [],
-        'Found At': [],
-        'Home Address': [],
-        
-    }
     other_addresses = {
         'Other': []
     }
@@ -104,211 +207,31 @@ def create_summ_mp_missing_from_found_locations_map(df, locations):
         'address': l[0],
         'report_id': l[2][0] if l[2][0] else None
     })
-    plottable_addresses = {
-        'Missing From': [],
-        'Found At': [],
-        'Home Address': []
-    }
     
+    # one pass over the coordinate columns instead of report by report
+    location_data, plottable_addresses, unplottable_addresses, connections, lats, lons = aggregate_locations(df)
     
-    # First pass: count occurrences of each location and collect report IDs
-    for idx in range(len(df)):
-        missing_location = None
-        tl_location = None
-        
-        # Get report ID for this row
-        reporid = df['reportid'].iloc[idx] if 'reportid' in df.columns and idx < len(df['reportid']) else f"Row {idx + 1}"
-        
-        # Process missing_from_latlong
-        if 'missing_from_latlong' in df.columns and idx < len(df['missing_from_latlong']):
-            location_str = df['missing_from_latlong'].iloc[idx]
-            mf_address = df['mf_address'].iloc[idx] if 'mf_address' in df.columns and idx < len(df['mf_address']) else "Unknown Address"
-            
-            if location_str and location_str != '[None, None]':
-                try:
-                    location = check_valid_loc(ast.literal_eval(location_str))
-                    if location is not None and location != [None, None] and len(location) == 2:
-                        lon, lat = location
-                        if lon is not None and lat is not None:
-                            missing_location = [lat, lon]
-                            # Round to avoid slight coordinate differences
-                            coord_key = (round(lat, 6), round(lon, 6))
-                            location_data[coord_key]['missing'] += 1
-
-                            if mf_address not in location_data[coord_key]['missing_reportids']:
-                                location_data[coord_key]['missing_reportids'].append(mf_address)
-                            location_data[coord_key]['found_reportids'].append(str(reporid))
-
-                            valid_locations.append([lat, lon])
-                            
-                            # Add to plottable addresses
-                            if mf_address:
-                                plottable_addresses['Missing From'].append({
-                                    'address': mf_address,
-                                    'report_id': str(reporid),
-                                    'coordinates': f"{lat:.6f}, {lon:.6f}"
-                                })
-                        else:
-                            # Coordinates are None - address couldn't be plotted
-                            if mf_address:
-                                unplottable_addresses['Missing From'].append({
-                                    'address': mf_address,
-                                    'report_id': str(reporid)
-                                })
-                    else:
-                        # Invalid location - address couldn't be plotted
-                        if mf_address:
-                            unplottable_addresses['Missing From'].append({
-                                'address': mf_address,
-                                'report_id': str(reporid)
-                            })
-                except (ValueError, SyntaxError):
-                    # Failed to parse location - address couldn't be plotted
-                    if mf_address:
-                        unplottable_addresses['Missing From'].append({
-                            'address': mf_address,
-                            'report_id': str(reporid)
-                        })
-            else:
-                # No location string - address couldn't be plotted
-                if mf_address:
-                    unplottable_addresses['Missing From'].append({
-                        'address': mf_address,
-                        'report_id': str(reporid)
-                    })
-        
-        # Process tl_latlong
-        if 'tl_latlong' in df.columns and idx < len(df['tl_latlong']):
-            location_str = df['tl_latlong'].iloc[idx]
-            tl_address = df['tl_address'].iloc[idx] if 'tl_address' in df.columns and idx < len(df['tl_address']) else "Unknown Address"
-            
-            if location_str and location_str != '[None, None]':
-                try:
-                    location = check_valid_loc(ast.literal_eval(location_str))
-                    if location is not None and location != [None, None] and len(location) == 2:
-                        lon, lat = location
-                        if lon is not None and lat is not None:
-                            tl_location = [lat, lon]
-                            # Round to avoid slight coordinate differences
-                            coord_key = (round(lat, 6), round(lon, 6))
-                            location_data[coord_key]['found'] += 1
-                            
-                            if tl_address not in location_data[coord_key]['found_reportids']:
-                                location_data[coord_key]['found_reportids'].append(tl_address)
-                            location_data[coord_key]['found_reportids'].append(str(reporid))
-                            
-                            valid_locations.append([lat, lon])
-                            
-                            # Add to plottable addresses
-                            if tl_address:
-                                plottable_addresses['Found At'].append({
-                                    'address': tl_address,
-                                    'report_id': str(reporid),
-                                    'coordinates': f"{lat:.6f}, {lon:.6f}"
-                                })
-                        else:
-                            # Coordinates are None - address couldn't be plotted
-                            if tl_address :
-                                unplottable_addresses['Found At'].append({
-                                    'address': tl_address,
-                                    'report_id': str(reporid)
-                                })
-                    else:
-                        # Invalid location - address couldn't be plotted
-                        if tl_address:
-                            unplottable_addresses['Found At'].append({
-                                'address': tl_address,
-                                'report_id': str(reporid)
-                            })
-                except (ValueError, SyntaxError):
-                    # Failed to parse location - address couldn't be plotted
-                    if tl_address:
-                        unplottable_addresses['Found At'].append({
-                            'address': tl_address,
-                            'report_id': str(reporid)
-                        })
-            else:
-                # No location string - address couldn't be plotted
-                if tl_address:
-                    unplottable_addresses['Found At'].append({
-                        'address': tl_address,
-                        'report_id': str(reporid)
-                    })
-        
-        # Process home_latlong
-        if 'home_latlong' in df.columns and idx < len(df['home_latlong']):
-            location_str = df['home_latlong'].iloc[idx]
-            ha_address = df['ha_address'].iloc[idx] if 'ha_address' in df.columns and idx < len(df['ha_address']) else "Unknown Address"
-            
-            if location_str and location_str != '[None, None]':
-                try:
-                    location = check_valid_loc(ast.literal_eval(location_str))
-                    if location is not None and location != [None, None] and len(location) == 2:
-                        lon, lat = location
-                        if lon is not None and lat is not None:
-                            home_location = [lat, lon]
-                            # Round to avoid slight coordinate differences
-                            coord_key = (round(lat, 6), round(lon, 6))
-                            location_data[coord_key]['home'] += 1
-                            location_data[coord_key]['home_reportids'].append(str(reporid))
-                            valid_locations.append([lat, lon])
-                            
-                            # Add to plottable addresses
-                            if ha_address:
-                                plottable_addresses['Home Address'].append({
-                                    'address': ha_address,
-                                    'report_id': str(reporid),
-                                    'coordinates': f"{lat:.6f}, {lon:.6f}"
-                                })
-                        else:
-                            # Coordinates are None - address couldn't be plotted
-                            if ha_address :
-                                unplottable_addresses['Home Address'].append({
-                                    'address': ha_address,
-                                    'report_id': str(reporid)
-                                })
-                    else:
-                        # Invalid location - address couldn't be plotted
-                        if ha_address :
-                            unplottable_addresses['Home Address'].append({
-                                'address': ha_address,
-                                'report_id': str(reporid)
-                            })
-                except (ValueError, SyntaxError):
-                    # Failed to parse location - address couldn't be plotted
-                    if ha_address :
-                        unplottable_addresses['Home Address'].append({
-                            'address': ha_address,
-                            'report_id': str(reporid)
-                        })
-            else:
-                # No location string - address couldn't be plotted
-                if ha_address :
-                    unplottable_addresses['Home Address'].append({
-                        'address': ha_address,
-                        'report_id': str(reporid)
-                    })
-        
-        # Create polyline connection if both locations exist
-        if missing_location and tl_location:
-            polylines.append(
-                dl.Polyline(
-                    positions=[missing_location, tl_location],
-                    color="purple",
-                    weight=2,
-                    opacity=0.5,
-                    dashArray="5, 10",
-                    children=[
-                        dl.Tooltip(f"Connection for Report ID: {reporid}")
-                    ]
-                )
-            )
+    # Create polyline connection for the reports with both locations
+    polylines = [
+        dl.Polyline(
+            positions=[missing_location, tl_location],
+            color="purple",
+            weight=2,
+            opacity=0.5,
+            dashArray="5, 10",
+            children=[
+                dl.Tooltip(f"Connection for Report ID: {reporid}")
+            ]
+        )
+        for missing_location, tl_location, reporid in connections
+    ]
     
     # Create markers based on frequency
     markers = []
     home_markers = []
     
-    for (lat, lon), data in location_data.items():
+    for data in location_data.to_dict('records'):
+        lat, lon = data['lat'], data['lon']
         missing_count = data['missing']
         found_count = data['found']
         home_count = data['home']
@@ -411,7 +334,7 @@ def create_summ_mp_missing_from_found_locations_map(df, locations):
             )
     
     # Calculate optimal center and zoom
-    center, zoom = get_optimal_map_center_and_zoom(valid_locations)
+    center, zoom = get_optimal_map_center_and_zoom(lats, lons)
     
     # Create size legend
     def create_size_example(radius, count):
@@ -719,7 +642,7 @@ def create_summ_mp_missing_from_found_locations_map(df, locations):
     # Calculate statistics
     connection_count = len(polylines)
     unique_locations = len(location_data)
-    total_occurrences = sum(data['missing'] + data['found'] + data['home'] for data in location_data.values())
+    total_occurrences = int(location_data[['missing', 'found', 'home']].to_numpy().sum())
     
     # Create the main content
     main_content = [map_component]
@@ -0,0 +1,17 @@
+import os
+from flask import request
+
+
+# Simple password protection, registered on the Flask server of each dashboard
+def require_password():
+    auth = request.authorization
+    username = os.environ.get('AUTH_USERNAME', 'adsssmin')
+    password = os.environ.get('AUTH_PASSWORD', 'secret123')
+    
+    print(f"Using username: {username}")
+    print(f"Using password: {password}")
+    
+    if not auth or auth.username != username or auth.password != password:
+        return ('Please enter username and password', 401, {
+            'WWW-Authenticate': 'Basic realm="Protected Site"'
+        })
@@ -0,0 +1,266 @@
+import os
+import numpy as np
+import pandas as pd
+
+from utils.geocoding import parse_coordinates
+
+# Shared store of the case data used by the dashboards.
+# Every dataframe is built from its CSV once, saved as Parquet (typed columns,
+# parsed dates) next to the data and afterwards loaded from there. A loaded frame
+# is reloaded when its CSV changes.
+# Frames are shared by all modules of the process, so callers must not modify
+# them in place (filter, or copy first).
+
+STORE_DIR = os.getenv("CASE_STORE_DIR", "DATA/.case_store")
+# bump when a builder below changes, so stale stored frames are rebuilt
+STORE_VERSION = 2
+
+_frames = {}
+# dataset name -> mtime of its CSV when the frame was loaded
+_source_mtimes = {}
+# (dataset name, key column) -> (row positions sorted by the key, {key value: (start, stop)})
+_partitions = {}
+
+
+# same cleaning as the df.clean accessor of create_rule_based_summary, which itself uses this store
+def _lowercase_headers(df):
+    columns = df.columns.str.strip().str.lower()
+    columns = columns.str.replace(".", "_")
+    df.columns = columns
+    return df
+
+
+def _strip_strings(df):
+    return df.apply(
+        lambda col: col.str.strip() if col.dtype == "object" or pd.api.types.is_string_dtype(col) else col
+    )
+
+
+def _build_mp_geolocations(path):
+    df_mp = pd.read_csv(path)
+    df_mp['dob'] = pd.to_datetime(df_mp['dob'])
+    df_mp['missing_since'] = pd.to_datetime(df_mp['missing_since'])
+    df_mp['date_reported_missing'] = pd.to_datetime(df_mp['date_reported_missing'])
+    df_mp['whentraced'] = pd.to_datetime(df_mp['whentraced'])
+    df_mp.loc[:, 'source'] = 'mp'
+    # the "(lon, lat)" strings parsed once into float columns, e.g. missing_from_lon / missing_from_lat
+    for column in ['missing_from_latlong', 'tl_latlong', 'home_latlong']:
+        if column in df_mp.columns:
+            prefix = column[:-len('_latlong')]
+            df_mp[f'{prefix}_lon'], df_mp[f'{prefix}_lat'] = parse_coordinates(df_mp[column])
+    return df_mp
+
+
+def _build_vp_new(path):
+    df_vp = pd.read_csv(path)
+    df_vp.rename(columns={"VPD_NOMINALINCIDENTID_PK": "reportid"}, inplace=True)
+    df_vp.columns = df_vp.columns.str.replace('.', '_', regex=False).str.lower()
+    return df_vp
+
+
+def _build_mp(path):
+    mp_df = pd.read_csv(path, encoding='utf-8')
+    mp_df = _strip_strings(_lowercase_headers(mp_df))
+
+    mp_df['dob'] = pd.to_datetime(mp_df['dob'])
+    mp_df['missing_since'] = pd.to_datetime(mp_df['missing_since'])
+    mp_df['date_reported_missing'] = pd.to_datetime(mp_df['date_reported_missing'])
+    mp_df['whentraced'] = pd.to_datetime(mp_df['whentraced'])
+    mp_df.loc[:, 'source'] = 'mp'
+    return mp_df
+
+
+def _build_vp(path):
+    vp_df = pd.read_csv(path, encoding='utf-8')
+    vp_df = _strip_strings(_lowercase_headers(vp_df))
+    vp_df.loc[:, 'source'] = 'vp'
+    for col in ['vpd_createdon', 'vpd_createdon_1', 'vpd_lastupdatedon_1']:
+        vp_df[col] = pd.to_datetime(
+            vp_df[col].str.replace(r'Z\[UTC\]', '', regex=True), format='mixed'
+        )
+    return vp_df
+
+
+def _build_chr(path):
+    chr_df = pd.read_csv(path)
+    # only the headers are cleaned, ReadCsvFiles never kept the stripped copy
+    _lowercase_headers(chr_df)
+    chr_df['contactdate'] = pd.to_datetime(
+        chr_df['contactdate'], format='mixed'
+    )
+    return chr_df
+
+
+def _build_lowercased(path):
+    df = pd.read_csv(path)
+    _lowercase_headers(df)
+    return df
+
+
+# name -> (source csv, builder)
+DATASETS = {
+    # as used by the dashboards
+    "mp_geolocations": ("DATA/mp_new_geolocations.csv", _build_mp_geolocations),
+    "vp_new": ("DATA/vp_new.csv", _build_vp_new),
+    "mp_new": ("DATA/mp_new.csv", pd.read_csv),
+    # cleaned as in ReadCsvFiles
+    "mp": ("DATA/mp.csv", _build_mp),
+    "vp": ("DATA/vp.csv", _build_vp),
+    "chr": ("DATA/chr_.csv", _build_chr),
+    "phys": ("DATA/phys.csv", _build_lowercased),
+    "qs_comments": ("DATA/qs_comments.csv", _build_lowercased),
+    # unmodified CSVs
+    "mp_raw": ("DATA/mp.csv", pd.read_csv),
+    "vp_raw": ("DATA/vp.csv", pd.read_csv),
+    "chr_raw": ("DATA/chr_.csv", pd.read_csv),
+    "phys_raw": ("DATA/phys.csv", pd.read_csv),
+}
+
+
+def _stored_path(name, extension):
+    return os.path.join(STORE_DIR, f"{name}.v{STORE_VERSION}.{extension}")
+
+
+def _is_fresh(stored, source):
+    return os.path.exists(stored) and os.path.getmtime(stored) >= os.path.getmtime(source)
+
+
+def _restore_missing(df):
+    # Parquet keeps a missing string as null, read back as None where the CSV gave NaN,
+    # which str(x) == 'nan' checks of the callers rely on
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+def _read_stored(name, source):
+    parquet_path = _stored_path(name, "parquet")
+    pickle_path = _stored_path(name, "pkl")
+    if _is_fresh(parquet_path, source):
+        try:
+            return _restore_missing(pd.read_parquet(parquet_path))
+        except ImportError:
+            pass
+    if _is_fresh(pickle_path, source):
+        return pd.read_pickle(pickle_path)
+    return None
+
+
+def _write_stored(name, df):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    parquet_path = _stored_path(name, "parquet")
+    # one temporary file per process, the workers may rebuild a changed dataset at the same time
+    tmp_suffix = f".{os.getpid()}.tmp"
+    try:
+        df.to_parquet(parquet_path + tmp_suffix)
+        os.replace(parquet_path + tmp_suffix, parquet_path)
+        return
+    except Exception as e:
+        # pyarrow not installed, or columns Parquet cannot type (e.g. mixed objects)
+        print(f"Storing {name} as pickle instead of parquet ({type(e).__name__})")
+        if os.path.exists(parquet_path + tmp_suffix):
+            os.remove(parquet_path + tmp_suffix)
+    pickle_path = _stored_path(name, "pkl")
+    df.to_pickle(pickle_path + tmp_suffix)
+    os.replace(pickle_path + tmp_suffix, pickle_path)
+
+
+def source_mtime(name):
+    """
+    mtime of the CSV of a dataset, or None if it does not exist.
+    """
+    source = DATASETS[name][0]
+    return os.path.getmtime(source) if os.path.exists(source) else None
+
+
+def load_frame(name):
+    """
+    Shared dataframe of a dataset in DATASETS, built from its CSV only when the stored copy is missing or older.
+    A frame loaded before is returned as long as its CSV is unchanged, and reloaded once it changed.
+
+    Parameters:
+    - name: dataset name, e.g. "mp_geolocations" or "vp"
+
+    Returns:
+    - pandas DataFrame shared with every other caller in the process; do not modify it in place
+    """
+    mtime = source_mtime(name)
+    if name in _frames and _source_mtimes[name] == mtime:
+        return _frames[name]
+    if name in _frames:
+        print(f"Reloading {name}, its CSV changed")
+        # the case indexes of the old frame
+        for partition in [partition for partition in _partitions if partition[0] == name]:
+            _partitions.pop(partition, None)
+    source, build = DATASETS[name]
+    df = _read_stored(name, source)
+    if df is None:
+        df = build(source)
+        _write_stored(name, df)
+    _frames[name] = df
+    _source_mtimes[name] = mtime
+    return df
+
+
+def preload(names=None):
+    """
+    Load the given datasets (all whose CSV exists by default), e.g. before the server forks its workers.
+    """
+    for name in names if names is not None else DATASETS:
+        if names is not None or os.path.exists(DATASETS[name][0]):
+            load_frame(name)
+
+
+def _partition(name, key):
+    df = load_frame(name)
+    codes, uniques = pd.factorize(df[key])
+    # stable sort keeps the original row order within each case
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.searchsorted(sorted_codes, np.arange(len(uniques)), side="left")
+    stops = np.searchsorted(sorted_codes, np.arange(len(uniques)), side="right")
+    offsets = {value: (int(start), int(stop)) for value, start, stop in zip(uniques.tolist(), starts, stops)}
+    return order, offsets
+
+
+def case_rows(name, key, value):
+    """
+    Rows of a dataset whose key column equals value, like df[df[key]==value] without scanning the table.
+
+    Parameters:
+    - name: dataset name in DATASETS
+    - key: person key column, e.g. 'misperid', 'misper_misperid' or 'nominalid_fk'
+    - value: key value of the case
+
+    Returns:
+    - pandas DataFrame (same rows, order and index as the boolean filter)
+    """
+    # reloads a changed frame first, which drops its old partitions
+    df = load_frame(name)
+    if (name, key) not in _partitions:
+        _partitions[(name, key)] = _partition(name, key)
+    order, offsets = _partitions[(name, key)]
+    start, stop = offsets.get(value, (0, 0))
+    return df.iloc[order[start:stop]]
+
+
+def preload_partitions(keys):
+    """
+    Build the case_rows indexes of (dataset name, key column) pairs up front, e.g. before the server forks its workers.
+    """
+    for name, key in keys:
+        if (name, key) not in _partitions and os.path.exists(DATASETS[name][0]):
+            _partitions[(name, key)] = _partition(name, key)
+
+
+def loaded_frames():
+    """
+    Names of the datasets loaded in this process.
+    """
+    return sorted(_frames)
+
+
+def clear():
+    _frames.clear()
+    _source_mtimes.clear()
+    _partitions.clear()
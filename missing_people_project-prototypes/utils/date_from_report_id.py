@@ -1,27 +1,62 @@
 import pandas as pd
 from functools import lru_cache
-import datetime
-import re
 from dash import dcc, html
+from utils.case_store import load_frame, source_mtime
+
+# file type -> dataset of case_store the report dates are taken from
+DATE_DATASETS = {"vp": "vp_new", "mp": "mp_new"}
+
+
+def _source_mtime(file_type):
+    # part of the cache keys below, so a changed CSV is read again
+    return source_mtime(DATE_DATASETS[file_type]) if file_type in DATE_DATASETS else None
 
-# Cache to store loaded CSV data to avoid repeated file reads
-_csv_cache = {}
 
 @lru_cache(maxsize=2)
-def load_csv_data(file_type):
-    """Load and cache CSV data for the specified file type."""
+def _load_csv_data(file_type, mtime):
     if file_type == "vp":
-        csv_path = "DATA/vp_new.csv"
-        df = pd.read_csv(csv_path)
-        df = df.rename(columns={"VPD_NOMINALINCIDENTID_PK": "reportid", "VPD_CREATEDON": "date_report"})
+        # the dashboard's vp frame, whose headers are already lowercased with reportid renamed
+        df = load_frame("vp_new")
+        df = df.rename(columns={"vpd_createdon": "date_report"})
     elif file_type == "mp":
-        csv_path = "DATA/mp_new.csv"
-        df = pd.read_csv(csv_path)
+        df = load_frame("mp_new")
         df = df.rename(columns={"missing_since": "date_report"})
     else: 
         return pd.DataFrame()
     return df 
 
+
+def load_csv_data(file_type):
+    """Load and cache CSV data for the specified file type, again once its CSV changed."""
+    return _load_csv_data(file_type, _source_mtime(file_type))
+
+
+DATE_PATTERN = r'(\d{1,2}-[A-Za-z]{3}-\d{4}|\d{4}-\d{2}-\d{2})'
+
+
+def load_date_index(file_type):
+    """
+    Date string of every report id of the file type, taken from its first row like the per-report lookup did.
+    Rebuilt when the CSV of the file type changed.
+
+    Returns:
+    - dict of report id -> date string, or None when the first row has no date in a known format
+    """
+    return _date_index(file_type, _source_mtime(file_type))
+
+
+@lru_cache(maxsize=2)
+def _date_index(file_type, mtime):
+    df = _load_csv_data(file_type, mtime)
+    if df.empty:
+        return {}
+    df = df[df['reportid'].notna()].drop_duplicates('reportid', keep='first')
+    # Extract date using regex pattern, for all rows at once
+    dates = df['date_report'].astype(str).str.extract(f'^{DATE_PATTERN}', expand=False)
+    dates = dates.astype(object).where(dates.notna(), None)
+    return dict(zip(df['reportid'].tolist(), dates.tolist()))
+
+
 def date_from_reportid_extract(report_id, file_type):
     """
     Look up the date for a given report_id in the specified file_type CSV.
@@ -40,33 +75,8 @@ def date_from_reportid_extract(report_id, file_type):
     except (ValueError, TypeError):
         return str(report_id)
     
-    def extract_date_from_df(df, report_id_int):
-        """Helper function to extract date from dataframe."""
-        if df.empty:
-            return None
-            
-        matching_rows = df[df['reportid'] == report_id_int]
-        
-        if not matching_rows.empty:
-            date_value = matching_rows.iloc[0]['date_report']
-            
-            # Handle different date formats
-            if pd.isna(date_value):
-                return None
-            
-            try:
-                # Extract date using regex pattern
-                match = re.match(r'(\d{1,2}-[A-Za-z]{3}-\d{4}|\d{4}-\d{2}-\d{2})', str(date_value))
-                if match:
-                    return match.group(0)
-            except Exception:
-                pass
-        
-        return None
-    
     # First, try the specified file_type
-    df = load_csv_data(file_type)
-    date_result = extract_date_from_df(df, report_id_int)
+    date_result = load_date_index(file_type).get(report_id_int) if file_type in ("mp", "vp") else None
     
     if date_result:
         return date_result
@@ -74,8 +84,7 @@ def date_from_reportid_extract(report_id, file_type):
     # If not found, search in both data sources
     for search_type in ["mp", "vp"]:
         if search_type != file_type:  # Don't search the same type twice
-            df_search = load_csv_data(search_type)
-            date_result = extract_date_from_df(df_search, report_id_int)
+            date_result = load_date_index(search_type).get(report_id_int)
             if date_result:
                 return date_result
     
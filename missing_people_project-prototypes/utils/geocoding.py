@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+# Geocoding of the missing from / traced / home addresses of the MP reports.
+# Addresses are normalised and resolved locally first: a gazetteer of known
+# addresses (e.g. the OpenStreetMap addresses the synthetic data was generated
+# from, with their coordinates), then a postcode table, then the postcode
+# district. Only when enabled are the remaining addresses sent to Nominatim, as
+# utils/preprocess_add_long_addresses.ipynb did. Every online answer is kept in
+# a persistent cache, so an address is looked up online at most once.
+#
+# Coordinates are (longitude, latitude), stored as "(lon, lat)" strings in the
+# *_latlong columns of DATA/mp_new_geolocations.csv, which is what the map reads.
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "DATA/gazetteer.csv")
+POSTCODES_PATH = os.getenv("POSTCODES_PATH", "DATA/postcodes.csv")
+CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "DATA/.case_store/geocode_cache.json")
+ONLINE = os.getenv("GEOCODER_ONLINE", "0") == "1"
+
+# address column -> coordinates column
+ADDRESS_COLUMNS = {
+    "mf_address": "missing_from_latlong",
+    "tl_address": "tl_latlong",
+    "ha_address": "home_latlong",
+}
+
+POSTCODE_PATTERN = re.compile(r'\b([A-Z]{1,2}\d[A-Z\d]?)\s*(\d[A-Z]{2})\b')
+MISSING = (None, None)
+
+
+def normalise_address(address):
+    """
+    Lowercased address without punctuation and repeated spaces, for matching addresses written differently.
+    """
+    if address is None or pd.isna(address):
+        return ""
+    address = re.sub(r"[^\w\s]", " ", str(address).lower())
+    return re.sub(r"\s+", " ", address).strip()
+
+
+def extract_postcode(address):
+    """
+    UK postcode of an address as "AB1 2CD", or None.
+    """
+    if address is None or pd.isna(address):
+        return None
+    match = POSTCODE_PATTERN.search(str(address).upper())
+    return f"{match.group(1)} {match.group(2)}" if match else None
+
+
+def format_coordinates(coordinates):
+    lon, lat = coordinates
+    return f"({lon}, {lat})"
+
+
+NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+COORDINATES_PATTERN = rf"^\s*[\(\[]\s*({NUMBER})\s*,\s*({NUMBER})\s*[\)\]]\s*$"
+
+
+def parse_coordinates(values):
+    """
+    (lon, lat) float arrays of "(lon, lat)" values, NaN where there are no coordinates.
+    """
+    parts = pd.Series(values, dtype=object).astype(str).str.extract(COORDINATES_PATTERN)
+    # astype(float) parses like float(), pd.to_numeric can be off in the last digit
+    return parts[0].astype(float).to_numpy(), parts[1].astype(float).to_numpy()
+
+
+def has_coordinates(value):
+    """
+    Whether a *_latlong value holds coordinates, i.e. is not empty or "(None, None)".
+    """
+    if value is None or pd.isna(value):
+        return False
+    return "None" not in str(value) and str(value).strip() not in ("", "()", "[]")
+
+
+def _read_gazetteer(path):
+    # address, latitude, longitude; or OpenStreetMap address columns with latitude and longitude
+    # as text, so house numbers stay "12" rather than 12.0
+    df = pd.read_csv(path, dtype=str)
+    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
+    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
+    if "address" not in df.columns:
+        parts = [df.get(column, pd.Series("", index=df.index)).fillna("").astype(str) for column in ["addr:housenumber", "addr:street", "addr:city", "addr:postcode"]]
+        # same layout as generate_sceleton.load_addresses_from_csv
+        df["address"] = parts[0] + " " + parts[1] + ", " + parts[2] + ", " + parts[3]
+    df = df.dropna(subset=["latitude", "longitude"])
+    keys = [normalise_address(address) for address in df["address"].tolist()]
+    return dict(zip(keys, zip(df["longitude"].tolist(), df["latitude"].tolist())))
+
+
+def _read_postcodes(path):
+    # postcode, latitude, longitude (e.g. the ONS postcode directory); districts get the mean of their postcodes
+    df = pd.read_csv(path, usecols=["postcode", "latitude", "longitude"]).dropna()
+    postcodes = df["postcode"].astype(str).str.upper().str.replace(r"\s+", "", regex=True)
+    df = df.assign(postcode=postcodes.str[:-3] + " " + postcodes.str[-3:], district=postcodes.str[:-3])
+    by_postcode = dict(zip(df["postcode"].tolist(), zip(df["longitude"].tolist(), df["latitude"].tolist())))
+    districts = df.groupby("district")[["longitude", "latitude"]].mean()
+    by_district = dict(zip(districts.index.tolist(), zip(districts["longitude"].tolist(), districts["latitude"].tolist())))
+    return by_postcode, by_district
+
+
+class Geocoder:
+    """
+    Address -> (longitude, latitude) through the local tables, the cache and optionally Nominatim.
+
+    Parameters:
+    - gazetteer_path, postcodes_path: local tables, skipped when the file does not exist
+    - cache_path: JSON file with the answers of earlier online lookups
+    - online: look addresses that are not found locally up with Nominatim
+    """
+
+    def __init__(self, gazetteer_path=GAZETTEER_PATH, postcodes_path=POSTCODES_PATH, cache_path=CACHE_PATH, online=ONLINE):
+        self.gazetteer = _read_gazetteer(gazetteer_path) if os.path.exists(gazetteer_path) else {}
+        self.by_postcode, self.by_district = _read_postcodes(postcodes_path) if os.path.exists(postcodes_path) else ({}, {})
+        self.cache_path = cache_path
+        self.cache = {}
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                self.cache = {key: tuple(value) for key, value in json.load(f).items()}
+        self.online = online
+        self._geocode_online = None
+        self.new_cache_entries = 0
+
+    def geocode_locally(self, address):
+        key = normalise_address(address)
+        if not key:
+            return MISSING
+        if key in self.gazetteer:
+            return self.gazetteer[key]
+        if key in self.cache:
+            return self.cache[key]
+        postcode = extract_postcode(address)
+        if postcode is not None:
+            if postcode in self.by_postcode:
+                return self.by_postcode[postcode]
+            if postcode.split(" ")[0] in self.by_district:
+                return self.by_district[postcode.split(" ")[0]]
+        return None
+
+    def _lookup_online(self, address):
+        if self._geocode_online is None:
+            from geopy.geocoders import Nominatim
+            from geopy.extra.rate_limiter import RateLimiter
+            geolocator = Nominatim(user_agent=os.getenv("GEOCODER_USER_AGENT", "missing-people-dashboard"))
+            # Nominatim's usage policy allows one request per second
+            self._geocode_online = RateLimiter(geolocator.geocode, min_delay_seconds=1)
+        try:
+            location = self._geocode_online(address)
+        except Exception as e:
+            print(f"Error geocoding '{address}': {e}")
+            # not cached, so it is tried again next time
+            return MISSING
+        coordinates = (location.longitude, location.latitude) if location else MISSING
+        self.cache[normalise_address(address)] = coordinates
+        self.new_cache_entries += 1
+        return coordinates
+
+    def geocode(self, address):
+        """
+        (longitude, latitude) of an address, or (None, None) if it cannot be resolved.
+        """
+        coordinates = self.geocode_locally(address)
+        if coordinates is not None:
+            return coordinates
+        if self.online:
+            return self._lookup_online(address)
+        return MISSING
+
+    def geocode_many(self, addresses):
+        """
+        Coordinates of every address; each distinct normalised address is resolved once.
+
+        Returns:
+        - dict of address -> (longitude, latitude) or (None, None)
+        """
+        unique = {}
+        for address in addresses:
+            unique.setdefault(normalise_address(address), address)
+        resolved = {key: self.geocode(address) for key, address in unique.items()}
+        self.save_cache()
+        return {address: resolved[normalise_address(address)] for address in addresses}
+
+    def save_cache(self):
+        if self.new_cache_entries == 0:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        with open(self.cache_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.cache, f)
+        os.replace(self.cache_path + ".tmp", self.cache_path)
+        self.new_cache_entries = 0
+
+
+def fill_missing_coordinates(df, geocoder=None):
+    """
+    Fill the *_latlong columns of the rows whose address has no coordinates yet.
+
+    Parameters:
+    - df: MP data with the address columns of ADDRESS_COLUMNS; the *_latlong columns are added when missing
+    - geocoder: Geocoder, a new one by default
+
+    Returns:
+    - copy of df with the coordinates filled in where the address could be resolved
+    """
+    geocoder = geocoder or Geocoder()
+    df = df.copy()
+    for address_column, coordinates_column in ADDRESS_COLUMNS.items():
+        if address_column not in df.columns:
+            continue
+        if coordinates_column not in df.columns:
+            df[coordinates_column] = None
+        df[coordinates_column] = df[coordinates_column].astype(object)
+        todo = df[address_column].notna() & ~df[coordinates_column].map(has_coordinates)
+        if not todo.any():
+            continue
+        resolved = geocoder.geocode_many(df.loc[todo, address_column].tolist())
+        df.loc[todo, coordinates_column] = df.loc[todo, address_column].map(lambda address: format_coordinates(resolved[address]))
+        print(f"{address_column}: {sum(value != MISSING for value in resolved.values())} of {len(resolved)} addresses without coordinates resolved")
+    return df
+
+
+def geolocations_outdated(input_path="DATA/mp_new.csv", output_path="DATA/mp_new_geolocations.csv"):
+    return os.path.exists(input_path) and (not os.path.exists(output_path) or os.path.getmtime(output_path) < os.path.getmtime(input_path))
+
+
+def update_geolocations(input_path="DATA/mp_new.csv", output_path="DATA/mp_new_geolocations.csv", geocoder=None):
+    """
+    Pipeline stage: rewrite the geolocated MP data from the MP data, keeping the coordinates of known reports
+    and geocoding the addresses of new reports (and earlier failures).
+    """
+    start = time.time()
+    df = pd.read_csv(input_path)
+    if os.path.exists(output_path):
+        known = pd.read_csv(output_path)
+        columns = [column for column in ADDRESS_COLUMNS.values() if column in known.columns]
+        if "reportid" in known.columns and columns:
+            known = known[["reportid"] + columns].drop_duplicates("reportid")
+            df = df.drop(columns=[column for column in columns if column in df.columns]).merge(known, on="reportid", how="left")
+    df = fill_missing_coordinates(df, geocoder)
+    df.to_csv(output_path + ".tmp", index=False)
+    os.replace(output_path + ".tmp", output_path)
+    print(f"Geolocations of {len(df)} reports written to {output_path} in {time.time() - start:.1f}s")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the coordinates of the MP addresses that have none.")
+    parser.add_argument("--input", default="DATA/mp_new.csv")
+    parser.add_argument("--output", default="DATA/mp_new_geolocations.csv")
+    parser.add_argument("--online", action="store_true", help="look addresses that are not found locally up with Nominatim")
+    args = parser.parse_args()
+    update_geolocations(args.input, args.output, Geocoder(online=args.online or ONLINE))
@@ -0,0 +1,256 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from utils.case_store import STORE_DIR
+
+# Layout helpers shared by the association graph (src/assograph.py) and the
+# location graph (src/locgraph.py): overlap removal, and a per-case cache of
+# layouts so a case's graph keeps the same layout between visits and restarts.
+
+LAYOUT_DIR = os.path.join(STORE_DIR, "layouts")
+# stored layouts per case and graph name
+MAX_LAYOUTS = 8
+# cases whose layouts are kept in memory, the least recently used are dropped (they stay on disk)
+MAX_CASES = 64
+# a graph with at most this many nodes (or a tenth of its nodes) not in the latest layout is laid out incrementally
+MAX_NEW_NODES = 5
+
+# up to this many nodes every pair is checked at once, above it only the pairs in neighbouring grid cells
+DENSE_LIMIT = 100
+# half of the 3x3 neighbourhood of a grid cell, so every pair of cells is visited once
+NEIGHBOUR_CELLS = [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]
+
+
+def _grid_pairs(coords, cell_size):
+    """
+    (i, j) index arrays of the node pairs in the same or neighbouring cells of a grid with cells of cell_size.
+    Nodes closer than cell_size are always in the same or neighbouring cells.
+    """
+    cells = np.floor((coords - coords.min(axis=0)) / cell_size).astype(np.int64) + 1
+    width = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * width + cells[:, 1]
+    order = np.argsort(keys, kind="stable")
+    cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    pairs_i, pairs_j = [], []
+    for dx, dy in NEIGHBOUR_CELLS:
+        # cells a with a neighbouring cell b = a + (dx, dy) that holds nodes
+        targets = cell_keys + dx * width + dy
+        b = np.searchsorted(cell_keys, targets)
+        b[b == len(cell_keys)] = 0
+        a = np.flatnonzero(cell_keys[b] == targets)
+        b = b[a]
+        # every node of cell a with every node of cell b
+        sizes = counts[a] * counts[b]
+        pair = np.repeat(np.arange(len(a)), sizes)
+        k = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        i = starts[a][pair] + k // counts[b][pair]
+        j = starts[b][pair] + k % counts[b][pair]
+        if dx == 0 and dy == 0:
+            keep = i < j
+            i, j = i[keep], j[keep]
+        pairs_i.append(order[i])
+        pairs_j.append(order[j])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def separate_overlapping_nodes(pos, nodes, min_distance=0.3, step=0.1, max_iterations=50, fixed=()):
+    """
+    Push nodes closer than min_distance apart, all pairs at once per iteration.
+
+    Parameters:
+    - pos: dictionary of node -> (x, y)
+    - nodes: nodes to separate, the others keep their position
+    - fixed: nodes among nodes that push the others away but do not move themselves
+    - min_distance: distance below which two nodes repel each other
+    - step: share of the overlap a pair is pushed apart by per iteration
+    - max_iterations: upper bound of iterations; stops earlier once no pair overlaps
+
+    Returns:
+    - dictionary of node -> (x, y) with the adjusted positions
+    """
+    adjusted_pos = dict(pos)
+    nodes = list(nodes)
+    n = len(nodes)
+    if n < 2:
+        return adjusted_pos
+
+    coords = np.array([pos[node] for node in nodes], dtype=float).reshape(n, 2)
+    fixed = set(fixed)
+    movable = np.array([node not in fixed for node in nodes])
+    if n <= DENSE_LIMIT:
+        all_i, all_j = np.triu_indices(n, 1)
+
+    for iteration in range(max_iterations):
+        i, j = (all_i, all_j) if n <= DENSE_LIMIT else _grid_pairs(coords, min_distance)
+        diff = coords[i] - coords[j]
+        distance = np.hypot(diff[:, 0], diff[:, 1])
+        close = (distance < min_distance) & (distance > 0) & (movable[i] | movable[j])
+        if not close.any():
+            break
+        i, j, diff, distance = i[close], j[close], diff[close], distance[close]
+
+        # push proportional to the overlap, along the line between the two nodes
+        force = diff * ((min_distance - distance) * step / distance)[:, None]
+        for axis in range(2):
+            coords[:, axis] += (np.bincount(i, force[:, axis], n) - np.bincount(j, force[:, axis], n)) * movable
+
+    for node, (x, y) in zip(nodes, coords.tolist()):
+        adjusted_pos[node] = (x, y)
+    return adjusted_pos
+
+
+def graph_hash(G, name="layout"):
+    """
+    Hash of the nodes and the weighted edges of G, independent of the order they were added in.
+    """
+    nodes = sorted(repr(node) for node in G.nodes())
+    if G.is_directed():
+        edges = sorted((repr(u), repr(v), repr(w)) for u, v, w in G.edges(data="weight"))
+    else:
+        edges = sorted(tuple(sorted((repr(u), repr(v)))) + (repr(w),) for u, v, w in G.edges(data="weight"))
+    canonical = repr((name, G.is_directed(), nodes, edges))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def _initial_position(G, node, pos, rng):
+    # next to the laid out neighbours of a new node, or next to a random laid out node
+    neighbours = [pos[other] for other in nx.all_neighbors(G, node) if other in pos] if node in G else []
+    anchors = neighbours or [pos[rng.choice(list(pos))]]
+    x, y = np.mean(anchors, axis=0)
+    return (x + rng.normal(0, 0.1), y + rng.normal(0, 0.1))
+
+
+def incremental_layout(G, previous_pos, seed=42):
+    """
+    Layout of G that keeps the nodes of previous_pos where they were and only places the new nodes.
+
+    Parameters:
+    - G: graph to lay out
+    - previous_pos: dictionary of node -> (x, y) of an earlier layout; nodes no longer in G are dropped
+
+    Returns:
+    - dictionary of node -> (x, y)
+    """
+    pinned = {node: tuple(previous_pos[node]) for node in G.nodes() if node in previous_pos}
+    new_nodes = [node for node in G.nodes() if node not in pinned]
+    if not new_nodes:
+        return pinned
+
+    rng = np.random.default_rng(seed)
+    initial = dict(pinned)
+    for node in new_nodes:
+        initial[node] = _initial_position(G, node, initial, rng)
+
+    # spring length of the existing layout, the fixed nodes are not rescaled
+    lengths = [np.hypot(*np.subtract(pinned[u], pinned[v])) for u, v in G.edges() if u in pinned and v in pinned]
+    k = float(np.median(lengths)) if lengths else None
+    pos = nx.spring_layout(G.to_undirected(), pos=initial, fixed=list(pinned), k=k, iterations=50, seed=seed)
+    pos.update(pinned)
+    # the new nodes are also pushed off the pinned ones, which stay where they were
+    return separate_overlapping_nodes(pos, list(G.nodes()), fixed=pinned)
+
+
+class LayoutCache:
+    """
+    Node positions of the graphs of a case, stored on disk under LAYOUT_DIR/<case_id>.pkl.
+
+    A graph seen before gets its stored layout back. A graph that differs from the
+    latest stored layout of the same name by at most MAX_NEW_NODES nodes (or a tenth of
+    the graph) is laid out incrementally, so the nodes an analyst has already seen stay put.
+    """
+
+    def __init__(self, layout_dir=None, max_layouts=MAX_LAYOUTS, max_cases=MAX_CASES):
+        self.layout_dir = layout_dir or LAYOUT_DIR
+        self.max_layouts = max_layouts
+        self.max_cases = max_cases
+        # case_id -> {name: OrderedDict of graph hash -> positions, most recent last}, most recent case last
+        self.layouts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _path(self, case_id):
+        # the case id names a file, it must not lead out of layout_dir
+        case_id = str(case_id)
+        if case_id in ("", ".", "..") or os.path.basename(case_id) != case_id:
+            raise ValueError(f"Invalid case id for a layout file: {case_id!r}")
+        return os.path.join(self.layout_dir, f"{case_id}.pkl")
+
+    def _case_layouts(self, case_id):
+        if case_id not in self.layouts:
+            layouts = {}
+            if case_id is not None and os.path.exists(self._path(case_id)):
+                try:
+                    layouts = pd.read_pickle(self._path(case_id))
+                except Exception as e:
+                    print(f"Layouts of case {case_id} could not be read: {e}")
+            self._keep(case_id, layouts)
+        self.layouts.move_to_end(case_id)
+        return self.layouts[case_id]
+
+    def _keep(self, case_id, layouts):
+        self.layouts[case_id] = layouts
+        self.layouts.move_to_end(case_id)
+        while len(self.layouts) > self.max_cases:
+            self.layouts.popitem(last=False)
+
+    def _save(self, case_id, layouts):
+        if case_id is None:
+            return
+        os.makedirs(self.layout_dir, exist_ok=True)
+        path = self._path(case_id)
+        pd.to_pickle(layouts, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def get(self, G, layout_fn, case_id=None, name="layout", incremental=True):
+        """
+        Positions of the nodes of G.
+
+        Parameters:
+        - G: networkx graph
+        - layout_fn: full layout of a graph, function of G returning node -> (x, y)
+        - case_id: case the graph belongs to; without one the layouts are only kept in memory
+        - name: kind of graph and layout settings, layouts of different names are kept apart
+        - incremental: place only the new nodes of a slightly changed graph; off for layouts
+          such as circular ones that are not force-directed
+
+        Returns:
+        - dictionary of node -> (x, y)
+        """
+        start = time.time()
+        key = graph_hash(G, name)
+        with self.lock:
+            case_layouts = self._case_layouts(case_id)
+            stored = case_layouts.setdefault(name, OrderedDict())
+            if key in stored:
+                stored.move_to_end(key)
+                return dict(stored[key])
+            previous = next(reversed(stored.values())) if stored else None
+
+        new_nodes = len([node for node in G.nodes() if node not in previous]) if incremental and previous is not None else None
+        if new_nodes is not None and new_nodes <= max(MAX_NEW_NODES, len(G) // 10) and len(previous) > 0:
+            pos = incremental_layout(G, previous)
+            how = f"incrementally ({new_nodes} new nodes)"
+        else:
+            pos = layout_fn(G)
+            how = "from scratch"
+        pos = {node: (float(x), float(y)) for node, (x, y) in pos.items()}
+
+        with self.lock:
+            stored[key] = pos
+            while len(stored) > self.max_layouts:
+                stored.popitem(last=False)
+            # the case may have been dropped from memory while its layout was computed
+            self._keep(case_id, case_layouts)
+            self._save(case_id, case_layouts)
+        print(f"Layout {name} of case {case_id} computed {how} in {time.time() - start:.2f}s")
+        return dict(pos)
+
+
+layout_cache = LayoutCache()
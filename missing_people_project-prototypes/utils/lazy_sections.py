@@ -0,0 +1,102 @@
+import time
+import dash
+from dash import html, Input, Output, State, MATCH
+
+# Collapsible summary sections whose content is only built when they are opened.
+# The page ships a placeholder per section, and a pattern-matching callback fills
+# it in with the section's builder once the html.Details is expanded (straight
+# after the first paint for sections that start open).
+
+# section name -> builder(case_id) returning the section's children
+SECTION_BUILDERS = {}
+
+PLACEHOLDER_CLASS = "lazy-placeholder"
+
+
+def register_section(name, builder):
+    """
+    Register the builder of a lazy section.
+
+    Parameters:
+    - name: section name, unique per app
+    - builder: function of the case id (string) returning the Dash children of the section
+    """
+    SECTION_BUILDERS[name] = builder
+    return builder
+
+
+def _placeholder():
+    return html.Div("Loading…", className=PLACEHOLDER_CLASS)
+
+
+def lazy_section(name, case_id, title, icon=None, header_class="column-header-people", open=False):
+    """
+    html.Details dropdown section like the summary pages use, with the content built on first expand.
+
+    Parameters:
+    - name: registered section name
+    - case_id: case shown on the page
+    - title: section title
+    - icon: optional icon shown before the title
+    - header_class: header style, e.g. "column-header-people" or "column-header-locations"
+    - open: whether the section starts expanded (its content then loads right after the page)
+    """
+    section_id = {"section": name, "case": str(case_id)}
+    return html.Details([
+        html.Summary([
+            html.Div(([html.H2(icon)] if icon else []) + [
+                html.H2(title, className="column-title-main")
+            ], className="dropdown-summary-content"),
+            html.Span("▼", className="dropdown-arrow")
+        ], className=f"{header_class} dropdown-summary"),
+        html.Div(_placeholder(), id={"type": "lazy-content", **section_id}, className="dropdown-content")
+    ], id={"type": "lazy-section", **section_id}, className="dropdown-section", open=open)
+
+
+def lazy_block(name, case_id):
+    """
+    Placeholder for a component that brings its own collapsible header; it is built right after the page is shown.
+    """
+    return html.Div(_placeholder(), id={"type": "lazy-block", "section": name, "case": str(case_id)})
+
+
+def _is_placeholder(children):
+    return isinstance(children, dict) and children.get("props", {}).get("className") == PLACEHOLDER_CLASS
+
+
+def build_section(name, case_id):
+    """
+    Children of a registered section for the case, with the build time logged; errors are shown in the section.
+    """
+    start = time.time()
+    try:
+        children = SECTION_BUILDERS[name](case_id)
+    except Exception as e:
+        print(f"Section {name} of case {case_id} failed: {e}")
+        return html.P(f"Error loading section: {str(e)}", className="error-message")
+    print(f"Section {name} of case {case_id} built in {time.time() - start:.3f}s")
+    return children
+
+
+def register_lazy_callbacks(app):
+    """
+    Add the callbacks that fill lazy sections and blocks in to the Dash app.
+    """
+    @app.callback(
+        Output({"type": "lazy-content", "section": MATCH, "case": MATCH}, "children"),
+        Input({"type": "lazy-section", "section": MATCH, "case": MATCH}, "open"),
+        State({"type": "lazy-section", "section": MATCH, "case": MATCH}, "id"),
+        State({"type": "lazy-content", "section": MATCH, "case": MATCH}, "children"),
+    )
+    def load_lazy_section(is_open, section_id, children):
+        # built once, collapsing and expanding again keeps the content
+        if not is_open or not _is_placeholder(children):
+            return dash.no_update
+        return build_section(section_id["section"], section_id["case"])
+
+    @app.callback(
+        Output({"type": "lazy-block", "section": MATCH, "case": MATCH}, "children"),
+        Input({"type": "lazy-block", "section": MATCH, "case": MATCH}, "id"),
+    )
+    def load_lazy_block(block_id):
+        return build_section(block_id["section"], block_id["case"])
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.case_store import DATASETS
+
+# In-process cache of rendered case pages.
+# An entry is reused while the data behind it is unchanged: the fingerprint of a
+# case is the mtimes of the shared data files plus those of its NEW/<case_id> folder.
+# A changed DATA csv is reloaded by utils.case_store the next time a page reads it.
+
+
+def path_mtimes(path):
+    """
+    (path, mtime) of a file, or of every file below a folder; empty if the path does not exist.
+    """
+    if os.path.isfile(path):
+        return ((path, os.path.getmtime(path)),)
+    mtimes = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            mtimes.append((file_path, os.path.getmtime(file_path)))
+    return tuple(sorted(mtimes))
+
+
+class RenderCache:
+    """
+    LRU cache of render_fn(case_id), invalidated when the case's data files change.
+
+    Parameters:
+    - render_fn: function of the case id returning the page; exceptions are not cached
+    - data_paths: files every case page depends on (e.g. the DATA csvs)
+    - case_paths_fn: function of the case id returning the files/folders of that case
+    - max_entries: number of rendered pages kept
+    - recent: number of recently opened cases re-rendered in the background after a data change
+    - name: what is rendered, for the log
+    """
+
+    def __init__(self, render_fn, data_paths=(), case_paths_fn=None, max_entries=64, recent=16, name="page"):
+        self.render_fn = render_fn
+        self.name = name
+        self.data_paths = list(data_paths)
+        self.case_paths_fn = case_paths_fn
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # case id -> (fingerprint, page)
+        self.recent = OrderedDict()  # case id -> None, most recently opened last
+        self.max_recent = recent
+        self.lock = threading.Lock()
+        self.prewarm_thread = None
+
+    def fingerprint(self, case_id):
+        paths = self.data_paths + (list(self.case_paths_fn(case_id)) if self.case_paths_fn else [])
+        return tuple(path_mtimes(path) for path in paths)
+
+    def _store(self, case_id, fingerprint, page):
+        with self.lock:
+            self.entries[case_id] = (fingerprint, page)
+            self.entries.move_to_end(case_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _render_if_stale(self, case_id):
+        fingerprint = self.fingerprint(case_id)
+        with self.lock:
+            entry = self.entries.get(case_id)
+        if entry is not None and entry[0] == fingerprint:
+            with self.lock:
+                self.entries.move_to_end(case_id)
+            return entry[1], True
+        page = self.render_fn(case_id)
+        self._store(case_id, fingerprint, page)
+        return page, False
+
+    def get(self, case_id):
+        case_id = str(case_id)
+        with self.lock:
+            self.recent[case_id] = None
+            self.recent.move_to_end(case_id)
+            while len(self.recent) > self.max_recent:
+                self.recent.popitem(last=False)
+        start = time.time()
+        page, hit = self._render_if_stale(case_id)
+        print(f"Case {case_id} {self.name} {'from cache' if hit else 'rendered'} in {time.time() - start:.3f}s")
+        return page
+
+    def prewarm(self, case_ids):
+        """
+        Render the pages of case_ids that are missing or stale.
+        """
+        for case_id in case_ids:
+            try:
+                self._render_if_stale(str(case_id))
+            except Exception as e:
+                print(f"Prewarming case {case_id} failed: {e}")
+
+    def start_prewarming(self, interval=30):
+        """
+        Re-render the recently opened cases in a background thread whenever their data changes.
+        """
+        if self.prewarm_thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                with self.lock:
+                    case_ids = list(self.recent.keys())
+                self.prewarm(reversed(case_ids))
+
+        self.prewarm_thread = threading.Thread(target=loop, daemon=True, name="render-cache-prewarm")
+        self.prewarm_thread.start()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def case_data_paths(case_id):
+    return [f"NEW/{str(case_id)}"]
+
+
+def case_render_cache(render_fn, name):
+    """
+    RenderCache of a part of the case pages, reused until the DATA csvs or the case's NEW/ folder change.
+    """
+    return RenderCache(
+        render_fn,
+        data_paths=sorted({source for source, _ in DATASETS.values()}),
+        case_paths_fn=case_data_paths,
+        name=name,
+    )
@@ -1,13 +1,12 @@
 import dash
 from dash import html, dcc, Input, Output
 import dash_bootstrap_components as dbc
-import pandas as pd
 from rule_based.create_rule_based_summary import CreateSummary, ReadCsvFiles
-df_mp = pd.read_csv('DATA/mp.csv')
-df_vp = pd.read_csv('DATA/vp.csv')
-df_vp.rename(columns={"VPD_NOMINALINCIDENTID_PK": "reportid"}, inplace=True)
-df_phys = pd.read_csv('DATA/phys.csv')
-df_chr = pd.read_csv('DATA/chr_.csv')
+from utils.case_store import load_frame
+df_mp = load_frame("mp_raw")
+df_vp = load_frame("vp_raw").rename(columns={"VPD_NOMINALINCIDENTID_PK": "reportid"})
+df_phys = load_frame("phys_raw")
+df_chr = load_frame("chr_raw")
 read_csv_files = ReadCsvFiles()
 
 qs_comments_df = read_csv_files.qs_comments_df
@@ -0,0 +1,98 @@
+import gc
+import importlib
+import os
+
+from flask import jsonify, request
+
+from utils import case_store
+from utils.date_from_report_id import load_date_index
+from src.case_data import build_entity_tables
+from src.case_index import build_case_index, case_index_outdated, load_case_index
+from utils.geocoding import geolocations_outdated, update_geolocations
+
+# Production entry point of the dashboards, served by gunicorn instead of the Dash dev server:
+#   gunicorn -c gunicorn.conf.py
+#   DASH_APP=all DASH_WORKERS=8 DASH_THREADS=4 gunicorn -c gunicorn.conf.py
+# gunicorn.conf.py sets preload_app, so create_app() loads the data once in the
+# master process and the forked workers share those pages copy-on-write.
+
+# DASH_APP value -> module defining the Dash `app`
+APPS = {
+    "app": "app",
+    "concept2": "app_concept2",
+    "concept3": "app_concept3",
+    "combined": "app_concept_combined",
+    # every concept in one app (dashboards.py), one copy of the data for all of them
+    "all": "dashboards",
+}
+
+# indexes used by case_rows on every summary page
+CASE_KEYS = [
+    ("mp_geolocations", "misperid"),
+    ("vp_new", "misper_misperid"),
+    ("mp", "misperid"),
+    ("vp", "misper_misperid"),
+    ("phys", "misperid"),
+    ("qs_comments", "misperid"),
+    ("chr", "nominalid_fk"),
+]
+
+HEALTH_PATH = "/health"
+
+
+def preload_data():
+    """
+    Load every dataset, case index and report date lookup into this process, and compile outdated entity tables
+    and the cross-case entity index. New MP reports are geocoded first, so they show on the map without a separate run.
+    """
+    if geolocations_outdated():
+        update_geolocations()
+    case_store.preload()
+    build_entity_tables()
+    if case_index_outdated():
+        build_case_index()
+    load_case_index()
+    case_store.preload_partitions(CASE_KEYS)
+    for file_type in ["mp", "vp"]:
+        load_date_index(file_type)
+
+
+def add_health_endpoint(server, name):
+    """
+    Unauthenticated health check at HEALTH_PATH for the load balancer, answered before the password check.
+    """
+    def health_check():
+        if request.path != HEALTH_PATH:
+            return None
+        return jsonify(status="ok", app=name, pid=os.getpid(), datasets=case_store.loaded_frames())
+
+    # run ahead of the apps' require_password hook
+    server.before_request_funcs.setdefault(None, []).insert(0, health_check)
+
+
+def create_app(name=None):
+    """
+    WSGI application of one dashboard, with its data loaded up front.
+
+    Parameters:
+    - name: key of APPS, defaults to the DASH_APP environment variable or "app"
+
+    Returns:
+    - the Flask server of the Dash app
+    """
+    name = name or os.getenv("DASH_APP", "app")
+    # before the app module is imported, since it loads its frames at import time
+    # and they have to include the MP reports geocoded by preload_data
+    preload_data()
+    dash_app = importlib.import_module(APPS[name]).app
+    add_health_endpoint(dash_app.server, name)
+    # keep the loaded objects out of the garbage collector's reach, so collections
+    # in the workers do not touch (and copy) the pages shared with the master
+    gc.collect()
+    gc.freeze()
+    return dash_app.server
+
+
+if __name__ == "__main__":
+    # without gunicorn, e.g. on a laptop: threaded Flask server, no debug reloader
+    create_app().run(host=os.getenv("DASH_HOST", "127.0.0.1"), port=int(os.getenv("DASH_PORT", "8051")), threaded=True)
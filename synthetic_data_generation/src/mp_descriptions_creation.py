@@ -8,6 +8,7 @@ from utils.serialize import serialize_for_llm, serialize_row
 from utils.question_list import vul_questions
 from utils.parsing_responses import parse_api_response_just_narrative
 from utils.regex_find_entitites import regex_find_people_locations
+from utils.async_openai import AsyncOpenAIScheduler
 from openai import OpenAI
 import os
 from dotenv import load_dotenv
@@ -141,6 +142,7 @@ class OpenAIGeneration:
     def __init__(self):
         load_dotenv()
         self.client =  OpenAI(api_key=os.getenv("OPEN_API_KEY"))
+        self.scheduler = AsyncOpenAIScheduler(os.getenv("OPEN_API_KEY"))
         self.prompt_questions = create_question_prompt()
     
     
@@ -162,7 +164,11 @@ class OpenAIGeneration:
         entities_people_relat = []
         entities_pattern_types = []
         
-            
+        
+        # sample the entities and build the prompts for every row first, then
+        # send all rows to the API concurrently
+        generation_inputs = []
+        generation_requests = []
         for i, row in df.iterrows():
             serialized = serialize_row(row, misperid) 
             
@@ -234,8 +240,18 @@ class OpenAIGeneration:
             prompt = create_prompt(locations_in, location_types, pattern_types, people_in, ENTITIES_EXTRACTION, char_no)
             print("LISTS:", people_in,  locations_in, location_types, pattern_types)
             print("INDIV:", people_desc,people_names, people_relat,  landmarks, addresses, pattern_types)
+            generation_inputs.append((serialized, people_names, people_desc, people_relat, landmarks, addresses, location_types, pattern_types))
+            generation_requests.append({
+                "prompt": f'{prompt} {serialized}',
+                "maxtokens": char_no//2,  # "1 token ~= 4 chars in English" from https://help.openai.com/en/articles/4936856-what-are-tokens-and-how-to-count-them
+                "model": "gpt-4o",
+            })
 
-            response = self.generate_description_make_api_call(prompt, serialized, i, char_no)
+        generated = self.scheduler.ask_many(generation_requests)
+
+        question_requests = []
+        for i, (response, inputs) in enumerate(zip(generated, generation_inputs)):
+            serialized, people_names, people_desc, people_relat, landmarks, addresses, location_types, pattern_types = inputs
             print(response)
             # raise ValueError
             responses.append({
@@ -290,9 +306,11 @@ class OpenAIGeneration:
             
            
             
-            question_responses = self.generate_vul_questions_api_call(serialized + f'\n Circumstances: {narrative}')
-            questions_row = self.parse_api_response_vul_questions(question_responses)
-            vul_questions_df_list.append(questions_row)
+            question_requests.append({
+                "prompt": f'{self.prompt_questions}{serialized}' + f'\n Circumstances: {narrative}',
+                "model": "gpt-4o-mini",
+                "system_prompt": "You are a careful reasoning assistant who answers missing person risk questions.",
+            })
             narratives.append(narrative)
             
             entities_landmarks.append(landmarks_used_str)
@@ -304,6 +322,9 @@ class OpenAIGeneration:
             entities_pattern_types.append(entities_pattern_types_str)
                         
             
+        for question_responses in self.scheduler.ask_many(question_requests):
+            questions_row = self.parse_api_response_vul_questions(question_responses)
+            vul_questions_df_list.append(questions_row)
             
         df['circumstances'] = narratives
         
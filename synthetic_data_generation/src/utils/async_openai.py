@@ -0,0 +1,117 @@
+import asyncio
+import concurrent.futures
+import random
+import time
+from collections import deque
+
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+class RateBudget:
+    """
+    Sliding one-minute window of requests and tokens sent to the API.
+    """
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.sent = deque()  # (timestamp, tokens)
+        self.tokens_in_window = 0
+
+    async def acquire(self, tokens, lock):
+        # a single request larger than the whole budget still has to go through eventually
+        tokens = min(tokens, self.tokens_per_minute)
+        async with lock:
+            while True:
+                now = time.monotonic()
+                while self.sent and now - self.sent[0][0] >= 60:
+                    _, t = self.sent.popleft()
+                    self.tokens_in_window -= t
+                if len(self.sent) < self.requests_per_minute and self.tokens_in_window + tokens <= self.tokens_per_minute:
+                    self.sent.append((now, tokens))
+                    self.tokens_in_window += tokens
+                    return
+                await asyncio.sleep(60 - (now - self.sent[0][0]))
+
+
+class AsyncOpenAIScheduler:
+    """
+    Sends chat completions concurrently while staying within the account rate limits.
+
+    - at most max_concurrency requests are in flight
+    - requests and (estimated) tokens per minute are budgeted over a sliding window
+    - rate limit, timeout and server errors are retried with exponential backoff
+    - ask_many returns the answers in the order of the requests
+    """
+    def __init__(self, api_key, max_concurrency=8, requests_per_minute=500, tokens_per_minute=30000, max_retries=6):
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.budget = RateBudget(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.client = None
+
+    async def ask(self, prompt, maxtokens=None, model="gpt-4o-mini", system_prompt=None):
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+
+        # "1 token ~= 4 chars in English" from https://help.openai.com/en/articles/4936856-what-are-tokens-and-how-to-count-them
+        estimated_tokens = sum(len(m["content"]) for m in messages) // 4 + (maxtokens or 1000)
+
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.budget.acquire(estimated_tokens, self.lock)
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=maxtokens
+                    )
+                    print(response.choices[0].message.content)
+                    return response.choices[0].message.content
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    wait = min(60, 2 ** attempt) + random.random()
+                    retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+                    if retry_after:
+                        try:
+                            wait = max(wait, float(retry_after))
+                        except ValueError:
+                            pass
+                    print(f"Attempt {attempt + 1} failed: {e}. Retrying in {wait:.1f}s.")
+                    await asyncio.sleep(wait)
+
+    def run(self, coroutine_function, *args):
+        """
+        Run coroutine_function(*args), which may await self.ask, and return its result.
+        """
+        async def main():
+            # the client, semaphore and lock belong to the event loop of this run
+            self.client = AsyncOpenAI(api_key=self.api_key)
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.lock = asyncio.Lock()
+            try:
+                return await coroutine_function(*args)
+            finally:
+                await self.client.close()
+                self.client = None
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(main())
+        # already inside an event loop (e.g. a notebook), so run on a separate thread
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, main()).result()
+
+    def ask_many(self, requests):
+        """
+        Ask all requests (dicts of ask keyword arguments) concurrently; answers are in request order.
+        """
+        async def ask_all():
+            return await asyncio.gather(*[self.ask(**request) for request in requests])
+        return list(self.run(ask_all))
@@ -1,4 +1,5 @@
 import pandas as pd
+import asyncio
 import json
 import random
 from datetime import datetime, timedelta, date
@@ -13,6 +14,7 @@ from utils import parsing_responses
 from utils import random_generators
 from utils import question_list
 from utils.regex_find_entitites import regex_find_people_locations
+from utils.async_openai import AsyncOpenAIScheduler
 
 
 
@@ -44,6 +46,7 @@ class GenerateInitialDF_VP():
         self.dir_path.mkdir(parents=False, exist_ok=True)
         
         self.client =  OpenAI(api_key=os.getenv("OPEN_API_KEY"))
+        self.scheduler = AsyncOpenAIScheduler(os.getenv("OPEN_API_KEY"))
         
         
         
@@ -89,7 +92,7 @@ class GenerateInitialDF_VP():
         
         
         # Generate vp records
-        vp_data = []
+        record_inputs = []
 
         
         vp_created_on = self.first_vp_record
@@ -99,6 +102,7 @@ class GenerateInitialDF_VP():
         repeated_victim = False
         repeated_perpetrator = False 
         for i in range(1, n+1):
+            record_no = i
                         
             # TODO: This is a quick fix, if neecessary think of a simpler approach. -- This is fixed later.
             try:
@@ -197,7 +201,54 @@ class GenerateInitialDF_VP():
             no_consent_reason = ""
             if consent_name != self.person['forenames'] + ' ' + self.person['surname']:
                 no_consent_reason= random.choices(['No consent was given for information to be shared.', 'Unable to locate', 'Would not engage with police', ''], weights=[0.2, 0.2, 0.2, 0.4], k=1)[0]
+
+            missing_record = False
+            if random.random() < 0.1:
+                missing_record = True
+            char_no = random.choice(characted_count)
+            # drawn here rather than in the concurrent API calls, so a seed gives the same records
+            gp_consent = random.choice([1,2,4,100])
+            three_point_test = random.choice([1,2])
+
+            record_inputs.append(dict(
+                i=record_no, vp_created_on=vp_created_on, last_updated_on=last_updated_on, incidentid=incidentid,
+                consent_name=consent_name, no_consent_reason=no_consent_reason,
+                gp_consent=gp_consent, three_point_test=three_point_test,
+                repeated_victim=repeated_victim, repeated_perpetrator=repeated_perpetrator,
+                missing_record=missing_record, char_no=char_no,
+                people_in=people_in, locations_in=locations_in, location_types=location_types, pattern_types=pattern_types,
+                people_names=people_names, people_desc=people_desc, people_relat=people_relat,
+                landmarks=landmarks, addresses=addresses,
+            ))
+
+        # the API calls of all records run concurrently, records keep their order
+        vp_data = self.scheduler.run(self._complete_vp_records, record_inputs)
+            
+        df =  pd.DataFrame(vp_data)
+    
+        pickle_path = os.path.join(self.dir_path, "vpd_full_data.pkl")
+        df.to_pickle(pickle_path)
+    
+
+        csv_path_vul_full_data = os.path.join(self.dir_path, "vpd_full_data.csv")
+        df.to_csv(csv_path_vul_full_data)
+            
             
+            
+            
+        return df
+
+    async def _complete_vp_records(self, record_inputs):
+        return await asyncio.gather(*[self._complete_vp_record(**inputs) for inputs in record_inputs])
+
+    async def _complete_vp_record(self, i, vp_created_on, last_updated_on, incidentid, consent_name, no_consent_reason,
+                                  gp_consent, three_point_test, repeated_victim, repeated_perpetrator, missing_record, char_no,
+                                  people_in, locations_in, location_types, pattern_types,
+                                  people_names, people_desc, people_relat, landmarks, addresses):
+        """
+        Generate the free text fields of one vp record with the API and return the record.
+        """
+        async def attitudes():
             # attitude
             youthattitude = ""
             parentattitude = ""
@@ -212,17 +263,18 @@ class GenerateInitialDF_VP():
                             Repeated perpetrator: {repeated_perpetrator}
                             Was the consent given for input the database: {"Yes" if no_consent_reason=='' else "No" + '-' + no_consent_reason}
                         '''
-                youthattitude = self.ask_open_ai(prompt,50).split('.', 1)[0] + '.' # SAVE ONLY UNTIL FIRST SENTENCEs
+                youthattitude = (await self.ask_open_ai_async(prompt,50)).split('.', 1)[0] + '.' # SAVE ONLY UNTIL FIRST SENTENCEs
                 
                 
                 prompt = f'''
                 Given that this was the youth attitude towards engagement with police {youthattitude}, state what could have been the parents attitude. Do not repeat the information from the youth attitude. Keep the language very fatual.
                 
                 '''
-                parentattitude = self.ask_open_ai(prompt, 50).split('.', 1)[0] + '.'
+                parentattitude = (await self.ask_open_ai_async(prompt, 50)).split('.', 1)[0] + '.'
                 # raise NameError(youthattitude)
-            
-            
+            return youthattitude, parentattitude
+
+        async def view():
             # Nominals View
             prompt = f'''You are asked to create a fake record for a vulnerable person. Given the following details, in maximum 10 words state could be the view of the person regarding the situation. For example,
                             `[Name] deemed not to have capacity to fully understand due to dementia.` or `None` or `[Name] satisfied with police forwarding details'.
@@ -234,10 +286,10 @@ class GenerateInitialDF_VP():
                             Repeated perpetrator: {repeated_perpetrator}
                             Was the consent given for input the database: {"Yes" if no_consent_reason=='' else "No" + '-' + no_consent_reason}
                             {"Disability: " + self.person['disability_desc'] if self.person['disability_desc']!="" else ""}'''
-            nominalsview = self.ask_open_ai(prompt, 50).split('.', 1)[0] + '.'
+            nominalsview = (await self.ask_open_ai_async(prompt, 50)).split('.', 1)[0] + '.'
+            return nominalsview
 
-            
-            
+        async def wellbeing():
             # Wellbeing Comment
             prompt = f'''You are asked to create a fake record for a vulnerable person. Given the following details, in maximum 10 words come up with a wellbeing comment for the individual. For example,
                             `[Name] is safe and well in the care of the school.` or `has been involved in criminal activity and has committed a crime.` or `[Name]has frequent panic attacks'.
@@ -250,212 +302,194 @@ class GenerateInitialDF_VP():
                             Repeated perpetrator: {repeated_perpetrator}
                             Was the consent given for input the database: {"Yes" if no_consent_reason=='' else "No" + '-' + no_consent_reason}
                             {"Disability: " + self.person['disability_desc'] if self.person['disability_desc']!="" else ""}'''
-            wellbeing_commment = self.ask_open_ai(prompt, 50).split('.', 1)[0] + '.'
-            
+            wellbeing_commment = (await self.ask_open_ai_async(prompt, 50)).split('.', 1)[0] + '.'
+            return wellbeing_commment
 
-            missing_record = False
-            if random.random() < 0.1:
-                missing_record = True
+        (youthattitude, parentattitude), nominalsview, wellbeing_commment = await asyncio.gather(attitudes(), view(), wellbeing())
+
+        GENERATE_ENTITIES = False
+
+        prompt = f'''
+            You are an assistant that helps with generating fake vulnerable person reports.
+            1. Based on the information provided, generate a short narrative (approximately {char_no} characters) describing why the report has been created. 
+                The description should include:
+            {f"- SOME of the following people that are connected to the person (these people are not the main character): {people_in};" if people_in else ""}
+            {f"- ALL of the following location type(s): {location_types};" if location_types else ""}{f" with SOME of the specific locations mentioned: {location_types};" if location_types and locations_in else f"- The specific locations mentioned: {locations_in};" if locations_in else ""}
+            {f"- ALL of the following behavioral pattern(s): {pattern_types};" if pattern_types else ""}
+        
             
+            For example,
+            location types: not specified
+            locations: not specified
+            people: not specified
+            patterns: self harm
             
-            GENERATE_ENTITIES = False
-            char_no = random.choice(characted_count)
+            then an example response might be:
+
+            narrative=[Name] was feeling low and self harmed.
             
-            prompt = f'''
-                You are an assistant that helps with generating fake vulnerable person reports.
-                1. Based on the information provided, generate a short narrative (approximately {char_no} characters) describing why the report has been created. 
-                    The description should include:
-                {f"- SOME of the following people that are connected to the person (these people are not the main character): {people_in};" if people_in else ""}
-                {f"- ALL of the following location type(s): {location_types};" if location_types else ""}{f" with SOME of the specific locations mentioned: {location_types};" if location_types and locations_in else f"- The specific locations mentioned: {locations_in};" if locations_in else ""}
-                {f"- ALL of the following behavioral pattern(s): {pattern_types};" if pattern_types else ""}
+            or 
             
-                
-                For example,
-                location types: not specified
-                locations: not specified
-                people: not specified
-                patterns: self harm
-                
-                then an example response might be:
-
-                narrative=[Name] was feeling low and self harmed.
-                
-                or 
-                
-                Second example - if  
-                location types: schools
-                locations:  Castleview
-                people: friend
-                patterns: getting confused
-                
-                then an example response might be:
-
-                narrative=[Name] left his home after speaking on a phone with a friend and walked into  primary school near Castleview in a confused state'.
-                
-                
-                Note: 
-                Keep the language very factual, do not repeat the information below.                
-                Make sure this is {"not a" if not missing_record else ""} a missing person record.
-                Make sure the length of your response is approximately {char_no} characters long.
-                
-                Output the narrative without any additional text, just like:
-                narrative=...
-                
-                Replace the '...' with the relevant output.
-                
-                        
-                Details:
-                Name: { self.person['forenames']}
-                Age: { self.person['age']}
-                Repeated victim: {repeated_victim}
-                Repeated perpetrator: {repeated_perpetrator}
-                Wellbeing commment: {wellbeing_commment}
-                Was the consent given for input the database: {"Yes" if no_consent_reason=='' else "No" + '-' + no_consent_reason}
-                {"Disability: " + self.person['disability_desc'] if self.person['disability_desc']!="" else ""}'''
-
-           
-            # try generation max 5 times
-            nominal_synopsis = ""
-            landmarks_used_str = ""
-            entities_addresses_str = ""
-            entities_location_str = ""
-            entities_people_names_str = ""
-            entities_people_desc_str = ""
-            entities_people_relat_str = ""
-            entities_pattern_types_str =""
+            Second example - if  
+            location types: schools
+            locations:  Castleview
+            people: friend
+            patterns: getting confused
             
-            if char_no == 0:
-                nominal_synopsis = ""
-            else:
-                for attempt in range(1, 5):
-                    try:
-                        print(f"Attempt {attempt}")
-                        if GENERATE_ENTITIES:
-                            nominal_synopsis, people, places = parsing_responses.parse_api_response_narrative_people_places(self.ask_open_ai(prompt, 250, "gpt-4o"))
-                            people.append(consent_name)
-                        else:
-                            output = self.ask_open_ai(prompt, int(char_no//2), "gpt-4o")  # https://help.openai.com/en/articles/4936856-what-are-tokens-and-how-to-count-them
-                            
-                            
-                            nominal_synopsis = parsing_responses.parse_api_response_just_narrative(output)
-                            
-                            print("IN:", nominal_synopsis, people_names, people_desc, people_relat, landmarks, addresses)
-                            people_names_used, people_desc_used, people_relat_used, landmarks_used, addresses_used, location_types_used = regex_find_people_locations(nominal_synopsis, people_names, people_desc, people_relat, landmarks, addresses, location_types)
-                            print("OUT:",  people_names_used, people_desc_used, people_relat_used, landmarks_used, addresses_used, location_types_used)
-                            landmarks_used_str = ','.join(landmarks_used)
-                            entities_addresses_str = ','.join(addresses_used)
-                            entities_location_str = ','.join(location_types_used)
-                            entities_people_names_str = ','.join(people_names_used)
-                            entities_people_desc_str = ','.join(people_desc_used)
-                            entities_people_relat_str = ','.join(people_relat_used)
-                            entities_pattern_types_str = ','.join(pattern_types)
-                            
-                            
-                            # print(output)
-                        break
-                    except Exception as e:
-                        print(f"Attempt {attempt} failed: {e}")
-                        if attempt < 5:
-                            print(f"Retrying...")
-                        else:
-                            print(f"All 5 attempts failed. Raising the last error.")
-                            raise ValueError("couldn't parse")
+            then an example response might be:
+
+            narrative=[Name] left his home after speaking on a phone with a friend and walked into  primary school near Castleview in a confused state'.
             
-    
-            prompt = f''' 
-    
-            1. Based on the information regarding a missing person case below, answer the following 25 questions. Please answer 1 if the answer is "yes" and 0 if the answer in "no".
             
-            Question list:
-            {question_list.vpd_mapping.values()}
+            Note: 
+            Keep the language very factual, do not repeat the information below.                
+            Make sure this is {"not a" if not missing_record else ""} a missing person record.
+            Make sure the length of your response is approximately {char_no} characters long.
             
+            Output the narrative without any additional text, just like:
+            narrative=...
             
-            2. Output the answers in the following format:
-            q_(question_number);(boolean answer)
-            Do not add any other text. Just start from q_1 and finish on line starting with q_42. Do not add any extra interpunction or lines.
+            Replace the '...' with the relevant output.
             
-            The information regarding the case:
-
-            Name: {self.person['forenames']}
-            Age: {self.person['age']}
+                    
+            Details:
+            Name: { self.person['forenames']}
+            Age: { self.person['age']}
             Repeated victim: {repeated_victim}
             Repeated perpetrator: {repeated_perpetrator}
             Wellbeing commment: {wellbeing_commment}
-            Description of the incident: {nominal_synopsis}
             Was the consent given for input the database: {"Yes" if no_consent_reason=='' else "No" + '-' + no_consent_reason}
-            {"Disability: " + self.person['disability_desc'] if self.person['disability_desc']!="" else ""}    
+            {"Disability: " + self.person['disability_desc'] if self.person['disability_desc']!="" else ""}'''
 
-            '''
-            
-            questions_answers = self.ask_open_ai(prompt, 300)
-            
-            questions_answers_parsed = parsing_responses.parse_api_response_vdp_questions(questions_answers)
-            # raise NameError(questions_answers_parsed)
-    
-            record = {
-                "VPD_NOMINALINCIDENTID_PK": 30000 + int(str(self.person['nominalid']) + str(self.person['misperid']) + str(i)),
-                "VPD_CONSENTNAME": consent_name,
-                "VPD_NOCONSENTREASON": no_consent_reason,
-                "VPD_CREATEDON": vp_created_on,
-                "VPD_LASTUPDATEDON": last_updated_on,
-                "VPD_NOMINALSYNOPSIS": nominal_synopsis,
-                "VPD_GPCONSENT": random.choice([1,2,4,100]),
-                "VPD_VPTYPEID_FK": 1,
-                "VPD_INCIDENTID_FK": incidentid,
-                "VPD_WELLBEINGCOMMENTS": wellbeing_commment,
-                "VPD_NOTINFORMEDREASON": no_consent_reason,
-                "VPD_NOGPCONSENTREASON": no_consent_reason,
-                "VPD_SCRA": 100,
-                "VPD_THREEPOINTTEST": random.choice([1,2]),
-                "VPD_YOUTHATTITUDE": youthattitude,
-                "VPD_PARENTATTITUDE": parentattitude,
-                "VPD_NOMINALSVIEW": nominalsview,
-                "VPD_CHILDPROTECTION": None if self.person['age']>=18 else self.person['child_protection'] if self.person['child_protection'] else None,
-                "VPD_RECORD_START_DATE": self.record_start_date,
-                "VPD_FORENAME": self.person['forenames'],
-                "VPD_SURNAME":  self.person['surname'],
-                "VPD_MAIDEN_NAME": self.person['maidenname'],
-                "VPD_CREATEDON_1": self.first_vp_record,
-                "VPD_PLACEOFBIRTH": self.person['place_of_birth'],
-                "VPD_PERSONLANGUAGE": self.person['person_language'],
-                "VPD_INTERPRETERREQID_FK": 1,
-                "VPD_DISABILITY": self.person['disability_status'],
-                "VPD_DISABILITYDESC": self.person['disability_desc'],
-                "VPD_PERSONETHNICAPPEARANCE": self.person['ethnical_appearance'],
-                "VPD_PERSONGENDER": self.person['sex'],
-                "VPD_KNOWNAS": self.person['nickname'] if self.person['nickname'] else "",
-                "VPD_REPEATVICTIM": "N" if not repeated_victim else "Y",
-                "VPD_REPEATPERPETRATOR": "N" if not repeated_perpetrator else "Y",
-                "misper_misperid": self.person['misperid'],
-                'entities_landmarks': landmarks_used_str,
-                'entities_addresses': entities_addresses_str,
-                'entities_location_types': entities_location_str,
-                'entities_people_names': entities_people_names_str,
-                'entities_people_desc': entities_people_desc_str,
-                'entities_people_relat':  entities_people_relat_str,
-                'entities_pattern_types': entities_pattern_types_str,
-            
-            }
-            
-            
-            for key in questions_answers_parsed.keys():
-                record[key] = questions_answers_parsed[key]
-            
-            vp_data.append(record)
-            
-        df =  pd.DataFrame(vp_data)
-    
-        pickle_path = os.path.join(self.dir_path, "vpd_full_data.pkl")
-        df.to_pickle(pickle_path)
-    
+       
+        # try generation max 5 times
+        nominal_synopsis = ""
+        landmarks_used_str = ""
+        entities_addresses_str = ""
+        entities_location_str = ""
+        entities_people_names_str = ""
+        entities_people_desc_str = ""
+        entities_people_relat_str = ""
+        entities_pattern_types_str =""
+        
+        if char_no == 0:
+            nominal_synopsis = ""
+        else:
+            for attempt in range(1, 5):
+                try:
+                    print(f"Attempt {attempt}")
+                    if GENERATE_ENTITIES:
+                        nominal_synopsis, people, places = parsing_responses.parse_api_response_narrative_people_places(await self.ask_open_ai_async(prompt, 250, "gpt-4o"))
+                        people.append(consent_name)
+                    else:
+                        output = await self.ask_open_ai_async(prompt, int(char_no//2), "gpt-4o")  # https://help.openai.com/en/articles/4936856-what-are-tokens-and-how-to-count-them
+                        
+                        
+                        nominal_synopsis = parsing_responses.parse_api_response_just_narrative(output)
+                        
+                        print("IN:", nominal_synopsis, people_names, people_desc, people_relat, landmarks, addresses)
+                        people_names_used, people_desc_used, people_relat_used, landmarks_used, addresses_used, location_types_used = regex_find_people_locations(nominal_synopsis, people_names, people_desc, people_relat, landmarks, addresses, location_types)
+                        print("OUT:",  people_names_used, people_desc_used, people_relat_used, landmarks_used, addresses_used, location_types_used)
+                        landmarks_used_str = ','.join(landmarks_used)
+                        entities_addresses_str = ','.join(addresses_used)
+                        entities_location_str = ','.join(location_types_used)
+                        entities_people_names_str = ','.join(people_names_used)
+                        entities_people_desc_str = ','.join(people_desc_used)
+                        entities_people_relat_str = ','.join(people_relat_used)
+                        entities_pattern_types_str = ','.join(pattern_types)
+                        
+                        
+                        # print(output)
+                    break
+                except Exception as e:
+                    print(f"Attempt {attempt} failed: {e}")
+                    if attempt < 5:
+                        print(f"Retrying...")
+                    else:
+                        print(f"All 5 attempts failed. Raising the last error.")
+                        raise ValueError("couldn't parse")
+        
 
-        csv_path_vul_full_data = os.path.join(self.dir_path, "vpd_full_data.csv")
-        df.to_csv(csv_path_vul_full_data)
-            
-            
-            
-            
-        return df
+        prompt = f''' 
+
+        1. Based on the information regarding a missing person case below, answer the following 25 questions. Please answer 1 if the answer is "yes" and 0 if the answer in "no".
+        
+        Question list:
+        {question_list.vpd_mapping.values()}
+        
+        
+        2. Output the answers in the following format:
+        q_(question_number);(boolean answer)
+        Do not add any other text. Just start from q_1 and finish on line starting with q_42. Do not add any extra interpunction or lines.
+        
+        The information regarding the case:
+
+        Name: {self.person['forenames']}
+        Age: {self.person['age']}
+        Repeated victim: {repeated_victim}
+        Repeated perpetrator: {repeated_perpetrator}
+        Wellbeing commment: {wellbeing_commment}
+        Description of the incident: {nominal_synopsis}
+        Was the consent given for input the database: {"Yes" if no_consent_reason=='' else "No" + '-' + no_consent_reason}
+        {"Disability: " + self.person['disability_desc'] if self.person['disability_desc']!="" else ""}    
+
+        '''
+        
+        questions_answers = await self.ask_open_ai_async(prompt, 300)
+        
+        questions_answers_parsed = parsing_responses.parse_api_response_vdp_questions(questions_answers)
+        # raise NameError(questions_answers_parsed)
+
+        record = {
+            "VPD_NOMINALINCIDENTID_PK": 30000 + int(str(self.person['nominalid']) + str(self.person['misperid']) + str(i)),
+            "VPD_CONSENTNAME": consent_name,
+            "VPD_NOCONSENTREASON": no_consent_reason,
+            "VPD_CREATEDON": vp_created_on,
+            "VPD_LASTUPDATEDON": last_updated_on,
+            "VPD_NOMINALSYNOPSIS": nominal_synopsis,
+            "VPD_GPCONSENT": gp_consent,
+            "VPD_VPTYPEID_FK": 1,
+            "VPD_INCIDENTID_FK": incidentid,
+            "VPD_WELLBEINGCOMMENTS": wellbeing_commment,
+            "VPD_NOTINFORMEDREASON": no_consent_reason,
+            "VPD_NOGPCONSENTREASON": no_consent_reason,
+            "VPD_SCRA": 100,
+            "VPD_THREEPOINTTEST": three_point_test,
+            "VPD_YOUTHATTITUDE": youthattitude,
+            "VPD_PARENTATTITUDE": parentattitude,
+            "VPD_NOMINALSVIEW": nominalsview,
+            "VPD_CHILDPROTECTION": None if self.person['age']>=18 else self.person['child_protection'] if self.person['child_protection'] else None,
+            "VPD_RECORD_START_DATE": self.record_start_date,
+            "VPD_FORENAME": self.person['forenames'],
+            "VPD_SURNAME":  self.person['surname'],
+            "VPD_MAIDEN_NAME": self.person['maidenname'],
+            "VPD_CREATEDON_1": self.first_vp_record,
+            "VPD_PLACEOFBIRTH": self.person['place_of_birth'],
+            "VPD_PERSONLANGUAGE": self.person['person_language'],
+            "VPD_INTERPRETERREQID_FK": 1,
+            "VPD_DISABILITY": self.person['disability_status'],
+            "VPD_DISABILITYDESC": self.person['disability_desc'],
+            "VPD_PERSONETHNICAPPEARANCE": self.person['ethnical_appearance'],
+            "VPD_PERSONGENDER": self.person['sex'],
+            "VPD_KNOWNAS": self.person['nickname'] if self.person['nickname'] else "",
+            "VPD_REPEATVICTIM": "N" if not repeated_victim else "Y",
+            "VPD_REPEATPERPETRATOR": "N" if not repeated_perpetrator else "Y",
+            "misper_misperid": self.person['misperid'],
+            'entities_landmarks': landmarks_used_str,
+            'entities_addresses': entities_addresses_str,
+            'entities_location_types': entities_location_str,
+            'entities_people_names': entities_people_names_str,
+            'entities_people_desc': entities_people_desc_str,
+            'entities_people_relat':  entities_people_relat_str,
+            'entities_pattern_types': entities_pattern_types_str,
+        
+        }
+        
+        
+        for key in questions_answers_parsed.keys():
+            record[key] = questions_answers_parsed[key]
+        
+        return record
 
     def print_all_attributes(self):
         """
@@ -470,6 +504,9 @@ class GenerateInitialDF_VP():
                 print(f"  {attr}: {value}")
         print("---------------------------------------")
     
+    async def ask_open_ai_async(self, prompt, maxtokens, model="gpt-4o-mini"):
+        return await self.scheduler.ask(prompt, maxtokens, model)
+
     def ask_open_ai(self, prompt, maxtokens, model="gpt-4o-mini"):
         response = self.client.chat.completions.create(
             model=model,